@@ -6,7 +6,9 @@ The main application class for the viewer.
 """
 
 # Library imports
+import os
 import sys
+import datetime
 from argparse import ArgumentParser, Namespace
 from textual import __version__ as textual_version  # pylint: disable=no-name-in-module
 from textual.app import App, ComposeResult
@@ -14,17 +16,33 @@ from textual.binding import Binding
 from textual.widgets import Header, Footer, RichLog
 
 import pytest
+from loguru import logger
 
 # Module imports
 from .. import __version__
 from ..utility.info import APP_TITLE, APP_NAME, APP_DESC
 from ..tui.screens.entry_book import AuthorEntry, BookEntry
+from ..tui.screens.note_view import NoteScreen
+from ..tui.screens.entry_reading import ReadingScreen
 from ..journals.book import Author
+from ..journals import book, session
 
 from ..database.config import DBCfg
+from ..database.export import export, EXPORT_FORMATS
+from ..database.schema import create_all, data_tables, table_name
+from ..database.migrate import migrate_schema, plan_migration, MIGRATE_MEMORY_BUDGET
+from ..database.writer import WriteBehind
+from ..database.sync import sync
+from ..database.maintenance import Maintenance, enable_incremental_vacuum, MAINTENANCE_TASKS
+from ..database.compress import compressed_fields, compress_rows, compression_stats
+from ..journals.dedupe import dedupe, merge_clusters, DEDUPE_THRESHOLD
 from icecream import ic
         
 test_db = DBCfg("./db/test.db")
+backup_dir = "./db/backups"
+
+# Creator tables that can be deduped, by command line name
+DEDUPE_TABLES = {"authors": Author}
 
 class AnthologyTUI(App[None]):
     """The main TUI application class."""
@@ -38,12 +56,58 @@ class AnthologyTUI(App[None]):
     
     BINDINGS = [
         Binding("ctrl+q", "app.quit", "Quit"),
+        Binding("ctrl+b", "maintain", "Back up"),
+        Binding("ctrl+n", "open_note", "Last note"),
+        Binding("ctrl+r", "read", "Read"),
         ]
     
+    def __init__(self):
+        super().__init__()
+        self.writer = WriteBehind(test_db)
+        self.maintenance = Maintenance(test_db, backup_dir)
+    
     def compose(self) -> ComposeResult:
         yield Header()
-        yield BookEntry(test_db)
+        yield BookEntry(test_db, self.writer)
         yield Footer()
+    
+    def on_mount(self) -> None:
+        self.maintenance.start()
+    
+    def action_maintain(self) -> None:
+        """Back up, vacuum and analyze the database in the background."""
+        self.notify("Backing up the database...")
+        self.run_worker(self._maintain, thread=True, exclusive=True, group="maintenance")
+    
+    def action_read(self) -> None:
+        """Open the live reading session screen."""
+        self.push_screen(ReadingScreen(test_db))
+    
+    def action_open_note(self) -> None:
+        """Open the most recently saved note."""
+        notes = session.Note.load_list(
+            test_db, "id = (SELECT id FROM Notes ORDER BY updated DESC LIMIT 1)")
+        if not notes:
+            self.notify("No notes yet.")
+            return
+        self.push_screen(NoteScreen(notes[0]))
+    
+    def _maintain(self) -> None:
+        try:
+            report = self.maintenance.run()
+        except Exception as e:
+            self.call_from_thread(self.notify, f"Maintenance failed: {e}", severity="error")
+        else:
+            self.call_from_thread(self.notify, f"Maintenance done: {report}")
+    
+    async def action_quit(self) -> None:
+        """Commit any queued saves before quitting."""
+        self.writer.close()
+        self.exit()
+    
+    def on_unmount(self) -> None:
+        self.writer.close()
+        self.maintenance.stop()
 
 def get_args() -> Namespace:
     """Parse and return the command line arguments.
@@ -84,6 +148,134 @@ def get_args() -> Namespace:
         action="store_true",
     )
 
+    # Add sub-commands
+    subparsers = parser.add_subparsers(dest="command")
+
+    # Add export
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Export a table, or all tables, to JSON lines or CSV files.",
+    )
+    export_parser.add_argument(
+        "table",
+        help="The table to export, or 'all' to export every table.",
+    )
+    export_parser.add_argument(
+        "-f",
+        "--format",
+        help="The export file format.",
+        choices=EXPORT_FORMATS,
+        default="jsonl",
+    )
+    export_parser.add_argument(
+        "-o",
+        "--output",
+        help="The directory to write the exported files to.",
+        default="./export",
+    )
+    export_parser.add_argument(
+        "--since-id",
+        help="Only export rows with an ID greater than this.",
+        type=int,
+        default=0,
+    )
+    export_parser.add_argument(
+        "--since",
+        help="Only export rows changed since this ISO date and time (UTC).",
+        type=datetime.datetime.fromisoformat,
+        default=None,
+    )
+
+    # Add migrate
+    migrate_parser = subparsers.add_parser(
+        "migrate",
+        help="Bring existing tables up to date with the current fields.",
+    )
+    migrate_parser.add_argument(
+        "-n",
+        "--dry-run",
+        help="Only list the changes that would be made.",
+        action="store_true",
+    )
+    migrate_parser.add_argument(
+        "-m",
+        "--memory",
+        help="The MiB of rows to hold in memory at once when rebuilding a table.",
+        type=float,
+        default=MIGRATE_MEMORY_BUDGET / 2**20,
+    )
+
+    # Add maintain
+    maintain_parser = subparsers.add_parser(
+        "maintain",
+        help="Back up, vacuum and analyze the database.",
+    )
+    maintain_parser.add_argument(
+        "-t",
+        "--task",
+        help="A task to run. Repeat to run several. Defaults to all of them.",
+        choices=MAINTENANCE_TASKS,
+        action="append",
+        dest="tasks",
+    )
+    maintain_parser.add_argument(
+        "-b",
+        "--backup-dir",
+        help="The directory to write backups to.",
+        default=backup_dir,
+    )
+    maintain_parser.add_argument(
+        "--full",
+        help="Rewrite the database once so it can be vacuumed incrementally.",
+        action="store_true",
+    )
+
+    # Add sync
+    sync_parser = subparsers.add_parser(
+        "sync",
+        help="Exchange the changes made since the last sync with another library file.",
+    )
+    sync_parser.add_argument(
+        "other",
+        help="The other library's database file.",
+    )
+
+    # Add dedupe
+    dedupe_parser = subparsers.add_parser(
+        "dedupe",
+        help="Merge creators entered more than once under differently written names.",
+    )
+    dedupe_parser.add_argument(
+        "creators",
+        help="The creators to dedupe.",
+        choices=DEDUPE_TABLES,
+    )
+    dedupe_parser.add_argument(
+        "-n",
+        "--dry-run",
+        help="Only list the creators that would be merged.",
+        action="store_true",
+    )
+    dedupe_parser.add_argument(
+        "-t",
+        "--threshold",
+        help="The name similarity (0 to 1) above which names match.",
+        type=float,
+        default=DEDUPE_THRESHOLD,
+    )
+
+    # Add compression
+    compression_parser = subparsers.add_parser(
+        "compression",
+        help="Report how well compressed text fields compress.",
+    )
+    compression_parser.add_argument(
+        "-c",
+        "--compress",
+        help="First compress large text stored before its field was compressed.",
+        action="store_true",
+    )
+
     # Finally, parse the command line.
     return parser.parse_args()
 
@@ -98,6 +290,80 @@ def main(cl_args:Namespace) -> None:
     if cl_args.debug:
         sys.exit(pytest.main(["./anthology/test","-s"]))
     
+    # bring existing tables up to date with their fields
+    if cl_args.command == "migrate":
+        steps = migrate_schema(
+            test_db, dry_run=cl_args.dry_run, memory_budget=int(cl_args.memory * 2**20),
+            progress=lambda name, done, total: print(f"{name}: {done}/{total} rows"))
+        for step in steps:
+            print(step)
+        print(f"{len(steps)} changes {'to make' if cl_args.dry_run else 'made'}")
+        sys.exit(0)
+    
+    # back up, vacuum and analyze the database
+    if cl_args.command == "maintain":
+        if cl_args.full and enable_incremental_vacuum(test_db):
+            print("Switched to incremental vacuum")
+        maintenance = Maintenance(test_db, cl_args.backup_dir)
+        report = maintenance.run(
+            cl_args.tasks or None,
+            progress=lambda status, remaining, total: print(f"backup: {total - remaining}/{total} pages"))
+        maintenance.stop()
+        print(f"Maintenance done: {report}")
+        sys.exit(0)
+    
+    # warn about tables that are out of date, then create every table's
+    # schema once, up front
+    for step in plan_migration(test_db):
+        logger.warning(f"Table out of date, run 'migrate': {step}")
+    create_all(test_db)
+    
+    # exchange changes with another library
+    if cl_args.command == "sync":
+        if not os.path.exists(cl_args.other):
+            sys.exit(f"No library at {cl_args.other}")
+        other = DBCfg(cl_args.other)
+        report = sync(test_db, other,
+                      progress=lambda name, done, total: print(f"{name}: {done}/{total} tables"))
+        other.close()
+        print(f"Synced: {report}")
+        sys.exit(0)
+    
+    # merge duplicate creators
+    if cl_args.command == "dedupe":
+        creator = DEDUPE_TABLES[cl_args.creators]
+        report = dedupe(test_db, creator, cl_args.threshold, dry_run=True)
+        for cluster in report.clusters:
+            names = [str(creator.load(test_db, i)) for i in cluster]
+            print(f"{names[0]} <- {'; '.join(names[1:])}")
+        if not cl_args.dry_run:
+            report.merged, report.links = merge_clusters(
+                test_db, creator, report.clusters,
+                progress=lambda name, done, total: print(f"{name}: {done}/{total} tables"))
+        print(f"Dedupe {'found' if cl_args.dry_run else 'done'}: {report}")
+        sys.exit(0)
+    
+    # report (and catch up on) compression
+    if cl_args.command == "compression":
+        for table in data_tables():
+            cols = compressed_fields(table)
+            if not cols:
+                continue
+            if cl_args.compress:
+                compress_rows(test_db.conn, table_name(table), cols,
+                              progress=lambda name, done: print(f"{name}: {done} compressed"))
+            for stats in compression_stats(test_db.conn, table_name(table), cols):
+                print(stats)
+        sys.exit(0)
+    
+    # export tables to files
+    if cl_args.command == "export":
+        counts = export(test_db, cl_args.table, cl_args.output,
+                        cl_args.format, cl_args.since_id, cl_args.since)
+        for name, count in counts.items():
+            print(f"{name}: {count} rows")
+        sys.exit(0)
+    
     # run the TUI
     sys.exit(AnthologyTUI().run())
 
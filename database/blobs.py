@@ -0,0 +1,151 @@
+"""
+Blobs Module
+
+Incremental reads and writes of large BLOB values.
+
+Binary data such as scanned pages and PDFs is copied between files and
+the database a block at a time through SQLite's incremental BLOB I/O,
+so memory use stays at one block no matter how large a value is. A
+value is written by first storing a zeroblob of its size, then filling
+it in place from a reusable buffer.
+
+"""
+
+# Library imports
+from typing      import BinaryIO, Iterator
+from loguru      import logger
+import hashlib
+import os
+import sqlite3
+
+# Constants
+BLOB_BLOCK_SIZE = 1 << 16
+BLOB_HASH = "sha256"
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def file_size(fp : BinaryIO) -> int:
+    """Get the bytes from a seekable file's position to its end."""
+    pos = fp.tell()
+    size = fp.seek(0, os.SEEK_END) - pos
+    fp.seek(pos)
+    return size
+
+def hash_file(fp : BinaryIO, block_size : int=BLOB_BLOCK_SIZE) -> tuple[str, int]:
+    """Hash a seekable file from its position, then return to it.
+
+    Parameters
+    ----------
+    fp : binary file
+        The open file.
+    block_size : int, optional(default=BLOB_BLOCK_SIZE)
+        The bytes to read at a time.
+
+    Returns
+    -------
+    tuple : The hex digest and the number of bytes hashed.
+    """
+    pos = fp.tell()
+    digest = hashlib.new(BLOB_HASH)
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    size = 0
+    while n := fp.readinto(buf):
+        digest.update(view[:n])
+        size += n
+    fp.seek(pos)
+    return digest.hexdigest(), size
+
+def write_blob(
+    conn : sqlite3.Connection,
+    table : str,
+    col : str,
+    rowid : int,
+    fp : BinaryIO,
+    block_size : int=BLOB_BLOCK_SIZE
+    ) -> int:
+    """Store a file in a row's BLOB column, a block at a time.
+
+    The column is resized to the file's size, then filled in place. The
+    caller commits.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        The database connection.
+    table : str
+        The name of the table.
+    col : str
+        The BLOB column.
+    rowid : int
+        The row to write.
+    fp : binary file
+        The open, seekable file, read from its position.
+    block_size : int, optional(default=BLOB_BLOCK_SIZE)
+        The bytes to copy at a time.
+
+    Returns
+    -------
+    int : The number of bytes written.
+    """
+    size = file_size(fp)
+    conn.execute(f"UPDATE {table} SET {col} = zeroblob(?) WHERE rowid = ?", (size, rowid))
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    written = 0
+    with conn.blobopen(table, col, rowid) as blob:
+        while written < size and (n := fp.readinto(view[:size - written])):
+            blob.write(view[:n])
+            written += n
+    logger.debug(f"Wrote {written} bytes to {table}.{col} {rowid}.")
+    return written
+
+def iter_blob(
+    conn : sqlite3.Connection,
+    table : str,
+    col : str,
+    rowid : int,
+    block_size : int=BLOB_BLOCK_SIZE
+    ) -> Iterator[bytes]:
+    """Yield a row's BLOB value a block at a time.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        The database connection.
+    table : str
+        The name of the table.
+    col : str
+        The BLOB column.
+    rowid : int
+        The row to read.
+    block_size : int, optional(default=BLOB_BLOCK_SIZE)
+        The bytes to read at a time.
+
+    Returns
+    -------
+    iterator of bytes : The blocks of the value, in order.
+    """
+    with conn.blobopen(table, col, rowid, readonly=True) as blob:
+        while block := blob.read(block_size):
+            yield block
+
+def copy_blob(
+    conn : sqlite3.Connection,
+    table : str,
+    col : str,
+    rowid : int,
+    out : BinaryIO,
+    block_size : int=BLOB_BLOCK_SIZE
+    ) -> int:
+    """Copy a row's BLOB value to a file, a block at a time.
+
+    Returns
+    -------
+    int : The number of bytes copied.
+    """
+    copied = 0
+    for block in iter_blob(conn, table, col, rowid, block_size):
+        copied += out.write(block)
+    return copied
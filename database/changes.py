@@ -0,0 +1,143 @@
+"""
+Changes Module
+
+Track when rows were last written so readers can ask for only the rows
+changed since a point in time.
+
+Each entry also logs the row's key as a JSON array, so a row can still
+be matched in another library after it has been deleted.
+
+"""
+
+# Library imports
+from typing      import Iterable
+from loguru      import logger
+import datetime
+
+# Module imports
+from .config     import DBCfg
+
+# Constants
+CHANGES_TABLE = "row_changes"
+CHANGES_DATE_FORMAT = '%Y-%m-%d %H:%M:%f'
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def key_sql(cols : Iterable[str], ref : str) -> str:
+    """Get the SQL for a row's key as a JSON array.
+
+    BLOBs can't be held in JSON, so they are logged as hex text.
+
+    Parameters
+    ----------
+    cols : iterable of str
+        The key columns.
+    ref : str
+        The row reference, such as NEW or OLD.
+
+    Returns
+    -------
+    str : A SQL expression.
+    """
+    return "json_array(" + ", ".join(
+        [f"CASE WHEN typeof({ref}.{c}) = 'blob' THEN hex({ref}.{c}) ELSE {ref}.{c} END"
+         for c in cols]) + ")"
+
+def track_changes(db : DBCfg, table : str, key : Iterable[str]=("rowid",)) -> None:
+    """Install triggers that stamp every write to a table.
+
+    Each table row keeps a single entry in the changes table holding
+    the last operation and the time it happened, so the changes table
+    grows with the number of rows and not the number of writes.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the table to track.
+    key : iterable of str, optional(default=("rowid",))
+        The columns that identify a row across libraries.
+
+    Returns
+    -------
+    None
+    """
+    key = list(key)
+
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (
+            tbl TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed TEXT NOT NULL,
+            row_key TEXT,
+            PRIMARY KEY (tbl, row_id)
+            ) WITHOUT ROWID;""")
+    cols = [i[1] for i in db.cursor.execute(f"PRAGMA table_info({CHANGES_TABLE})")]
+    if "row_key" not in cols:
+        db.cursor.execute(f"ALTER TABLE {CHANGES_TABLE} ADD COLUMN row_key TEXT")
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {CHANGES_TABLE}_changed
+            ON {CHANGES_TABLE}(tbl, changed);""")
+
+    for op, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        trigger = f"{table}_{op.lower()}_changes"
+        old = db.cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+            (trigger,)).fetchone()
+        if old and "ON CONFLICT" not in old[0]:
+            # Written before row keys were logged, or as a REPLACE, which
+            # an outer INSERT OR IGNORE (as in a sync) turns into an IGNORE.
+            db.cursor.execute(f"DROP TRIGGER {trigger}")
+        db.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {trigger}
+            AFTER {op} ON {table}
+            BEGIN
+                INSERT INTO {CHANGES_TABLE}(tbl, row_id, op, changed, row_key)
+                VALUES ('{table}', {ref}.rowid, '{op}',
+                        strftime('{CHANGES_DATE_FORMAT}', 'now'), {key_sql(key, ref)})
+                ON CONFLICT(tbl, row_id) DO UPDATE
+                SET op = excluded.op, changed = excluded.changed, row_key = excluded.row_key;
+            END;""")
+
+    logger.debug(f"Tracking changes to {table}.")
+
+def changed_since_sql(table : str, key : str="id") -> str:
+    """Get a SQL condition matching rows changed since a timestamp.
+
+    The returned condition takes a single parameter: the timestamp
+    formatted by `changes_timestamp`.
+
+    Parameters
+    ----------
+    table : str
+        The name of the tracked table.
+    key : str, optional(default="id")
+        The column of the table holding the row ID.
+
+    Returns
+    -------
+    str : A SQL condition to use in a WHERE clause.
+    """
+    return (f"{key} IN (SELECT row_id FROM {CHANGES_TABLE} "
+            f"WHERE tbl = '{table}' AND changed >= ?)")
+
+def changes_timestamp(when : datetime.datetime) -> str:
+    """Format a datetime the way the changes table stores it.
+
+    Naive datetimes are taken to be UTC, like SQLite's 'now'.
+
+    Parameters
+    ----------
+    when : datetime
+        The point in time to format.
+
+    Returns
+    -------
+    str : The formatted timestamp.
+    """
+    if when.tzinfo is not None:
+        when = when.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return when.strftime('%Y-%m-%d %H:%M:%S.') + f"{when.microsecond // 1000:03d}"
@@ -0,0 +1,364 @@
+"""
+Codecs Module
+
+Convert field values to and from the values stored in SQL columns.
+
+Each dataclass field type maps to a codec with a SQL column type, an
+encoder and a decoder. Collections are stored as compact JSON, and
+bytes as BLOBs. Nothing is ever passed to eval. Sets, tuples, bytes,
+datetimes and complex numbers nested in a collection are tagged, so
+they come back as the same types.
+
+"""
+
+# Library imports
+from typing      import Any, Callable, Iterable, Union, get_args, get_origin
+from dataclasses import dataclass
+from loguru      import logger
+import ast
+import base64
+import datetime
+import json
+import timeit
+import types
+
+# Constants
+SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+SQL_EPOCH = datetime.datetime(1970, 1, 1)
+ERROR_UNSUPPORTED_TYPE = "Unsupported data type for SQL translation! {KEY_TYPE} : {KEY_VAR}"
+TAG = "$t"
+
+# ---------------------------------------------------------------------
+# Datetime helpers ----------------------------------------------------
+
+def to_epoch(var : datetime.datetime) -> int:
+    """Convert a datetime to integer seconds since the epoch.
+
+    Naive datetimes are converted as they are, without a time zone, so
+    they read back exactly as they were written.
+
+    Parameters
+    ----------
+    var : datetime
+        The datetime to convert.
+
+    Returns
+    -------
+    int : The whole seconds since 1970-01-01 00:00:00.
+    """
+    if var.tzinfo is not None:
+        var = var.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (var - SQL_EPOCH) // datetime.timedelta(seconds=1)
+
+def from_sql_datetime(val : Any) -> datetime.datetime | None:
+    """Convert a stored datetime back into a datetime.
+
+    Integers are epoch seconds, strings are SQL_DATE_FORMAT text. The
+    storage format is read from the value itself, so tables part way
+    through a migration load correctly.
+
+    Parameters
+    ----------
+    val : int, str or None
+        The stored value.
+
+    Returns
+    -------
+    datetime : The decoded datetime, or None if nothing was stored.
+    """
+    if val is None:
+        return None
+    if isinstance(val, (int, float)):
+        return SQL_EPOCH + datetime.timedelta(seconds=val)
+    try:
+        return datetime.datetime.strptime(val, SQL_DATE_FORMAT)
+    except ValueError:
+        return datetime.datetime.fromisoformat(val)
+
+# ---------------------------------------------------------------------
+# JSON helpers --------------------------------------------------------
+
+def _tag(var : Any) -> Any:
+    """Tag a value JSON can't represent itself (json.dumps default hook)."""
+    if isinstance(var, (set, frozenset)):
+        return {TAG: type(var).__name__, "v": [_wrap(i) for i in var]}
+    if isinstance(var, (bytes, bytearray, memoryview)):
+        return {TAG: "bytes", "v": base64.b64encode(bytes(var)).decode("ascii")}
+    if isinstance(var, datetime.datetime):
+        return {TAG: "datetime", "v": var.isoformat()}
+    if isinstance(var, complex):
+        return {TAG: "complex", "v": [var.real, var.imag]}
+    if isinstance(var, range):
+        return {TAG: "range", "v": [var.start, var.stop, var.step]}
+    # Imported here, as the data tables are built on these codecs.
+    from .datatable import DataTable, RelTable
+    if isinstance(var, (DataTable, RelTable)):
+        # Saved rows, like the quotes of a reading, are stored as links.
+        return var.id
+    raise TypeError(ERROR_UNSUPPORTED_TYPE.format(KEY_TYPE=type(var), KEY_VAR=var))
+
+def _wrap(var : Any) -> Any:
+    """Tag the tuples and non-string keyed dicts json.dumps would change."""
+    if isinstance(var, tuple):
+        return {TAG: "tuple", "v": [_wrap(i) for i in var]}
+    if isinstance(var, list):
+        return [_wrap(i) for i in var]
+    if isinstance(var, dict):
+        if all(isinstance(k, str) for k in var):
+            return {k: _wrap(i) for k, i in var.items()}
+        return {TAG: "dict", "v": [[_wrap(k), _wrap(i)] for k, i in var.items()]}
+    return var
+
+_UNTAG: dict[str, Callable[[Any], Any]] = {
+    "set": set,
+    "frozenset": frozenset,
+    "tuple": tuple,
+    "dict": dict,
+    "bytes": base64.b64decode,
+    "datetime": datetime.datetime.fromisoformat,
+    "complex": lambda v: complex(*v),
+    "range": lambda v: range(*v),
+    }
+
+def _untag(obj : dict) -> Any:
+    """Restore a tagged value (json.loads object hook)."""
+    if len(obj) == 2 and TAG in obj and obj[TAG] in _UNTAG:
+        return _UNTAG[obj[TAG]](obj["v"])
+    return obj
+
+def dump_json(var : Any) -> str:
+    """Serialize a value to compact, type-tagged JSON."""
+    # Flat lists of plain values, like synonyms, need no tagging.
+    if not (type(var) is list and all(type(i) in (str, int, float, bool) for i in var)):
+        var = _wrap(var)
+    return json.dumps(var, separators=(",", ":"), ensure_ascii=False, default=_tag)
+
+def load_json(val : str) -> Any:
+    """Deserialize type-tagged JSON.
+
+    Text written by earlier versions with str() is read with
+    ast.literal_eval, which only accepts literals.
+    """
+    try:
+        return json.loads(val, object_hook=_untag)
+    except ValueError:
+        logger.debug(f"Reading legacy literal: {val[:40]}")
+        return ast.literal_eval(val)
+
+# ---------------------------------------------------------------------
+# Codec Class ---------------------------------------------------------
+
+@dataclass(frozen=True)
+class Codec():
+    """How one type of field is stored in a SQL column.
+
+    Attributes
+    ----------
+    sql_type : str
+        The column type keyword.
+    encode : callable
+        Convert a field value to the stored value.
+    decode : callable
+        Convert a stored value back to a field value. It is never given
+        None, which always decodes to None.
+    """
+    sql_type: str
+    encode: Callable[[Any], Any]
+    decode: Callable[[Any], Any]
+
+def _as(cls : type) -> Callable[[Any], Any]:
+    """Get a JSON decoder that converts the top level to a collection type."""
+    def decode(val : Any) -> Any:
+        obj = load_json(val) if isinstance(val, str) else val
+        return obj if isinstance(obj, cls) else cls(obj)
+    return decode
+
+def _decode_bytes(val : Any) -> bytes:
+    return bytes(val) if not isinstance(val, str) else val.encode()
+
+def _decode_complex(val : Any) -> complex:
+    return complex(val.replace(" ", "")) if isinstance(val, str) else complex(val)
+
+def _decode_bool(val : Any) -> bool:
+    return bool(int(val))
+
+INTEGER = Codec("INTEGER", int, int)
+BOOLEAN = Codec("INTEGER", int, _decode_bool)
+REAL = Codec("REAL", float, float)
+TEXT = Codec("TEXT", str, str)
+BLOB = Codec("BLOB", bytes, _decode_bytes)
+COMPLEX = Codec("TEXT", str, _decode_complex)
+DATETIME = Codec("DATETIME", str, from_sql_datetime)
+DATETIME_EPOCH = Codec("INTEGER", to_epoch, from_sql_datetime)
+JSON = Codec("TEXT", dump_json, load_json)
+
+# Python type -> codec. Register custom field types with add_codec.
+CODECS: dict[type, Codec] = {
+    bool: BOOLEAN,
+    int: INTEGER,
+    float: REAL,
+    str: TEXT,
+    bytes: BLOB,
+    bytearray: Codec("BLOB", bytes, lambda v: bytearray(_decode_bytes(v))),
+    memoryview: Codec("BLOB", bytes, lambda v: memoryview(_decode_bytes(v))),
+    complex: COMPLEX,
+    datetime.datetime: DATETIME,
+    list: Codec("TEXT", dump_json, _as(list)),
+    tuple: Codec("TEXT", dump_json, _as(tuple)),
+    set: Codec("TEXT", dump_json, _as(set)),
+    frozenset: Codec("TEXT", dump_json, _as(frozenset)),
+    dict: Codec("TEXT", dump_json, _as(dict)),
+    range: Codec("TEXT", dump_json, _as(range)),
+    }
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def add_codec(cls : type, codec : Codec) -> None:
+    """Register the codec for a field type.
+
+    Parameters
+    ----------
+    cls : type
+        The field type, such as an Enum or a custom value class.
+    codec : Codec
+        How to store it.
+
+    Returns
+    -------
+    None
+    """
+    CODECS[cls] = codec
+
+def base_type(tp : Any) -> Any:
+    """Strip generics and Optional from a field annotation.
+
+    For example, list[str] is list and datetime | None is datetime.
+    """
+    origin = get_origin(tp)
+    if origin in (Union, types.UnionType):
+        args = [i for i in get_args(tp) if i is not type(None)]
+        return base_type(args[0]) if len(args) == 1 else tp
+    return origin or tp
+
+def codec_for(tp : Any, epoch : bool=False) -> Codec | None:
+    """Get the codec for a field annotation or value type.
+
+    Parameters
+    ----------
+    tp : type
+        The field annotation or the type of a value.
+    epoch : bool, optional(default=False)
+        If true, datetimes are stored as integer epoch seconds.
+
+    Returns
+    -------
+    Codec : The codec, or None if the type has none.
+    """
+    tp = base_type(tp)
+    if tp is datetime.datetime and epoch:
+        return DATETIME_EPOCH
+    if not isinstance(tp, type):
+        return None
+    for cls in tp.__mro__:
+        if cls in CODECS:
+            return CODECS[cls]
+    return None
+
+def encode(var : Any, tp : Any=None, epoch : bool=False) -> Any:
+    """Encode a value for storage.
+
+    Parameters
+    ----------
+    var : any
+        The value to store.
+    tp : type, optional(default=None)
+        The field annotation. Defaults to the type of the value.
+    epoch : bool, optional(default=False)
+        If true, datetimes are stored as integer epoch seconds.
+
+    Returns
+    -------
+    any : The value to write to the database.
+
+    Raises
+    ------
+    ValueError if there is no codec for the type.
+    """
+    if var is None:
+        return None
+    codec = codec_for(type(var) if tp is None else tp, epoch) or codec_for(type(var), epoch)
+    if codec is None:
+        error_msg = ERROR_UNSUPPORTED_TYPE.format(KEY_TYPE=type(var), KEY_VAR=var)
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    return codec.encode(var)
+
+def decode(val : Any, tp : Any) -> Any:
+    """Decode a stored value for a field.
+
+    Parameters
+    ----------
+    val : any
+        The value read from the database.
+    tp : type
+        The field annotation.
+
+    Returns
+    -------
+    any : The field value. Values of types without a codec, or that the
+    codec can't read, are returned as they were read.
+    """
+    if val is None:
+        return None
+    codec = codec_for(tp)
+    if codec is None:
+        return val
+    try:
+        return codec.decode(val)
+    except (ValueError, TypeError, SyntaxError) as e:
+        logger.warning(f"Could not decode {val!r} as {tp}: {e}")
+        return val
+
+# ---------------------------------------------------------------------
+# Benchmark -----------------------------------------------------------
+
+def benchmark(
+    values : Iterable[Any] | None=None,
+    number : int=2000
+    ) -> dict[str, float]:
+    """Time round trips through the JSON codec against str() and eval().
+
+    Parameters
+    ----------
+    values : iterable, optional(default=None)
+        The collections to round trip. Defaults to a synonym list,
+        a tuple and a nested dictionary.
+    number : int, optional(default=2000)
+        The round trips to time per value.
+
+    Returns
+    -------
+    dict : Seconds taken by the 'codec' and by 'str_eval'.
+    """
+    if values is None:
+        values = [
+            ["physics", "mechanics", "dynamics", "kinematics", "statics"],
+            (1, 2, 3, 4, 5, 6, 7, 8),
+            {"tags": ["a", "b"], "pages": 320, "rating": 4.5},
+            ]
+    values = list(values)
+    codecs = [codec_for(type(v)) for v in values]
+
+    def codec_trip():
+        for v, c in zip(values, codecs):
+            c.decode(c.encode(v))
+
+    def str_eval_trip():
+        for v in values:
+            eval(str(v))
+
+    return {
+        "codec": timeit.timeit(codec_trip, number=number),
+        "str_eval": timeit.timeit(str_eval_trip, number=number),
+        }
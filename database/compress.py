@@ -0,0 +1,268 @@
+"""
+Compress Module
+
+Transparent compression of large text fields.
+
+A str field opts in with 'compress' in its metadata: True for the
+default size threshold, or the threshold in bytes. Values at least that
+large are stored as zlib compressed BLOBs in the field's TEXT column
+when that saves space, and shorter ones as plain text, so a column can
+hold both. The BLOB type marks a value as compressed.
+
+Compressed values are only decompressed when the field is first read,
+so listing or filtering items never pays for text it doesn't show. SQL
+reads the text through the decompress_text function, registered on
+every database connection, which the full-text index uses too.
+
+"""
+
+# Library imports
+from typing      import Any, Callable, Iterable
+from dataclasses import dataclass, fields
+from loguru      import logger
+import sqlite3
+import time
+import zlib
+
+# Constants
+COMPRESS_THRESHOLD = 256
+COMPRESS_LEVEL = 6
+COMPRESS_FUNCTION = "decompress_text"
+COMPRESS_SAMPLE = 1000
+COMPRESS_BATCH_SIZE = 500
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def compress(val : Any, threshold : int=COMPRESS_THRESHOLD) -> Any:
+    """Get the value to store for a compressed field.
+
+    Parameters
+    ----------
+    val : str, bytes or None
+        The field value. Bytes are taken to be compressed already, as
+        read from the database and never decompressed.
+    threshold : int, optional(default=COMPRESS_THRESHOLD)
+        The size in bytes from which text is compressed.
+
+    Returns
+    -------
+    bytes or str : The compressed text, or the text if it is short or
+    doesn't compress.
+    """
+    if val is None or isinstance(val, bytes):
+        return val
+    text = str(val)
+    data = text.encode()
+    if len(data) < threshold:
+        return text
+    packed = zlib.compress(data, COMPRESS_LEVEL)
+    return packed if len(packed) < len(data) else text
+
+def decompress(val : Any) -> Any:
+    """Get the text of a stored value. Values that are not BLOBs are returned as is."""
+    if isinstance(val, bytes):
+        return zlib.decompress(val).decode()
+    return val
+
+def text_sql(col : str) -> str:
+    """Get the SQL for the text of a column that may hold compressed values."""
+    return f"{COMPRESS_FUNCTION}({col})"
+
+def register(conn : sqlite3.Connection) -> None:
+    """Add the decompress_text SQL function to a connection."""
+    conn.create_function(COMPRESS_FUNCTION, 1, decompress, deterministic=True)
+
+# ---------------------------------------------------------------------
+# LazyText Class ------------------------------------------------------
+
+class LazyText():
+    """A compressed field, decompressed the first time it is read.
+
+    The stored value is kept in the instance dictionary under the
+    field's own name, so saving an item that was never read writes its
+    compressed value back as it is.
+    """
+
+    def __init__(self, name : str):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        try:
+            val = obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+        if isinstance(val, bytes):
+            val = obj.__dict__[self.name] = decompress(val)
+        return val
+
+    def __set__(self, obj, val):
+        obj.__dict__[self.name] = val
+
+# Class -> {field name: threshold} of its compressed fields
+_compressed: dict[type, dict[str, int]] = {}
+
+def compressed_fields(cls : type) -> dict[str, int]:
+    """Get the compressed fields of a data table class and their thresholds.
+
+    Their lazy accessors are added to the class the first time it is
+    asked about.
+
+    Parameters
+    ----------
+    cls : type
+        The DataTable class.
+
+    Returns
+    -------
+    dict : Field name -> the size in bytes from which it is compressed.
+    """
+    if cls not in _compressed:
+        found = {}
+        for f in fields(cls):
+            opt = f.metadata.get('compress') if f.metadata else None
+            if opt:
+                found[f.name] = COMPRESS_THRESHOLD if opt is True else int(opt)
+                # Deferred fields decompress in their own accessors.
+                if not isinstance(vars(cls).get(f.name), LazyText):
+                    setattr(cls, f.name, LazyText(f.name))
+        _compressed[cls] = found
+    return _compressed[cls]
+
+def compress_rows(
+    conn : sqlite3.Connection,
+    table : str,
+    cols : dict[str, int],
+    batch_size : int=COMPRESS_BATCH_SIZE,
+    progress : Callable[[str, int], None] | None=None
+    ) -> int:
+    """Compress the large text already stored in a table, in batches.
+
+    Text written before its field was compressed stays as it is until
+    the item is saved again. This rewrites it, committing each batch.
+    The rows' triggers run as for any update, so they are logged as
+    changed.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        A connection with the decompress_text function.
+    table : str
+        The name of the table.
+    cols : dict
+        Column name -> the size in bytes from which it is compressed.
+    batch_size : int, optional(default=COMPRESS_BATCH_SIZE)
+        The rows to rewrite per transaction.
+    progress : callable, optional(default=None)
+        Called with (table name, values compressed) after each batch.
+
+    Returns
+    -------
+    int : The number of values compressed.
+    """
+    cols = dict(cols)
+    large = " OR ".join([f"(typeof({c}) = 'text' AND length(CAST({c} AS BLOB)) >= {t})"
+                         for c, t in cols.items()])
+    select = (f"SELECT id, {', '.join(cols)} FROM {table} "
+              f"WHERE id > ? AND ({large}) ORDER BY id LIMIT {int(batch_size)}")
+    update = f"UPDATE {table} SET {', '.join([f'{c} = ?' for c in cols])} WHERE id = ?"
+    done, last = 0, -1
+    while rows := conn.execute(select, (last,)).fetchall():
+        values = [tuple(compress(v, t) for v, t in zip(row[1:], cols.values())) + row[:1]
+                  for row in rows]
+        conn.executemany(update, values)
+        conn.commit()
+        done += sum(isinstance(new, bytes) and not isinstance(old, bytes)
+                    for row, vals in zip(rows, values) for old, new in zip(row[1:], vals))
+        last = rows[-1][0]
+        if progress:
+            progress(table, done)
+    logger.debug(f"Compressed {done} values in {table}.")
+    return done
+
+# ---------------------------------------------------------------------
+# Statistics ----------------------------------------------------------
+
+@dataclass
+class CompressionStats():
+    """How well one compressed column compresses.
+
+    Attributes
+    ----------
+    table : str
+        The name of the table.
+    column : str
+        The name of the column.
+    rows : int
+        The number of rows with a value.
+    compressed : int
+        The number of those stored compressed.
+    text_bytes : int
+        The size of the column's text.
+    stored_bytes : int
+        The size the column is stored in.
+    decode_us : float
+        The average microseconds to decompress one compressed value.
+    """
+    table: str
+    column: str
+    rows: int
+    compressed: int
+    text_bytes: int
+    stored_bytes: int
+    decode_us: float
+
+    @property
+    def ratio(self) -> float:
+        """The text size over the stored size."""
+        return self.text_bytes / self.stored_bytes if self.stored_bytes else 1.0
+
+    def __str__(self):
+        """Formatted as <table>.<column>: <ratio>x, <compressed>/<rows> rows, <decode> us/row"""
+        return (f"{self.table}.{self.column}: {self.ratio:.2f}x "
+                f"({self.text_bytes} -> {self.stored_bytes} bytes), "
+                f"{self.compressed}/{self.rows} rows compressed, "
+                f"{self.decode_us:.1f} us/row to decode")
+
+def compression_stats(
+    conn : sqlite3.Connection,
+    table : str,
+    cols : Iterable[str],
+    sample : int=COMPRESS_SAMPLE
+    ) -> list[CompressionStats]:
+    """Measure the compression ratio and decode cost of a table's columns.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        A connection with the decompress_text function.
+    table : str
+        The name of the table.
+    cols : iterable of str
+        The compressed columns.
+    sample : int, optional(default=COMPRESS_SAMPLE)
+        The compressed values to time decompressing.
+
+    Returns
+    -------
+    list : The statistics of each column.
+    """
+    stats = []
+    for col in cols:
+        rows, packed, text_bytes, stored_bytes = conn.execute(f"""
+            SELECT count({col}), count(CASE WHEN typeof({col}) = 'blob' THEN 1 END),
+                   coalesce(sum(length(CAST({text_sql(col)} AS BLOB))), 0),
+                   coalesce(sum(length(CAST({col} AS BLOB))), 0)
+            FROM {table}""").fetchone()
+        values = [i[0] for i in conn.execute(
+            f"SELECT {col} FROM {table} WHERE typeof({col}) = 'blob' LIMIT ?", (sample,))]
+        start = time.perf_counter()
+        for val in values:
+            decompress(val)
+        decode_us = (time.perf_counter() - start) * 1e6 / len(values) if values else 0.0
+        stats.append(CompressionStats(table, col, rows, packed, text_bytes, stored_bytes,
+                                      decode_us))
+        logger.debug(f"Compression of {stats[-1]}")
+    return stats
@@ -1,13 +1,153 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Any, Callable
+from loguru import logger
 import sqlite3
+import os
+
+# Module imports
+from .compress import register
+
+# Constants
+MEMORY_DB = ":memory:"
+MAIN_DB = "main"
+TEMP_DB = "temp"
+ERROR_BAD_ALIAS = "Cannot attach a database as {KEY_ALIAS}!"
 
 @dataclass
 class DBCfg():
     """Database configuration object.
-    
+
+    Each configuration opens its own connection, so tests and scratch
+    sessions are isolated from each other.
+
     User-defined parameters:
-    :db: the database location.
+    :db: the database location, or ":memory:" for a private in-memory database.
+    :epoch_datetimes: store datetimes as integer epoch seconds instead of text.
+    :snapshot: load the database file into memory and work there. Nothing
+        is written to the file until persist() is called.
+
+    Other libraries can be attached under an alias with attach(), so
+    queries can read across them. The main database is 'main'.
+
+    Results that modules cache for this connection are kept in cache,
+    under the module's name, so they are dropped with the configuration.
     """
     db: str = "./db/test.db"
-    conn = sqlite3.connect(db)
-    cursor = conn.cursor()
\ No newline at end of file
+    epoch_datetimes: bool = False
+    snapshot: bool = False
+    conn: sqlite3.Connection = field(init=False, repr=False, compare=False)
+    cursor: sqlite3.Cursor = field(init=False, repr=False, compare=False)
+    attached: dict[str, str] = field(init=False, repr=False, compare=False,
+                                     default_factory=dict)
+    cache: dict[str, Any] = field(init=False, repr=False, compare=False,
+                                  default_factory=dict)
+
+    def __post_init__(self):
+        if self.snapshot and self.db != MEMORY_DB:
+            self.conn = sqlite3.connect(MEMORY_DB)
+            if os.path.exists(self.db):
+                source = sqlite3.connect(self.db)
+                source.backup(self.conn)
+                source.close()
+                logger.debug(f"Loaded {self.db} into memory.")
+        else:
+            if self.db != MEMORY_DB:
+                os.makedirs(os.path.dirname(self.db) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.db)
+        # Compressed text is read through a SQL function.
+        register(self.conn)
+        self.cursor = self.conn.cursor()
+
+    @property
+    def in_memory(self) -> bool:
+        """Whether the connection is to an in-memory database."""
+        return self.db == MEMORY_DB or self.snapshot
+
+    @property
+    def sources(self) -> list[str]:
+        """The aliases of the main database and every attached library."""
+        return [MAIN_DB] + list(self.attached)
+
+    def attach(self, path : str, alias : str) -> None:
+        """Attach another library's database file under an alias.
+
+        Parameters
+        ----------
+        path : str
+            The database file to attach.
+        alias : str
+            The name to query it by. It must be a valid identifier.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError if the alias is not an identifier or is already used.
+        """
+        if not alias.isidentifier() or alias.lower() in (MAIN_DB, TEMP_DB) \
+                or alias in self.attached:
+            raise ValueError(ERROR_BAD_ALIAS.format(KEY_ALIAS=alias))
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        self.conn.commit()
+        self.conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        self.attached[alias] = path
+        logger.debug(f"Attached {path} as {alias}.")
+
+    def detach(self, alias : str) -> None:
+        """Detach a library attached with attach().
+
+        Parameters
+        ----------
+        alias : str
+            The name it was attached under.
+
+        Returns
+        -------
+        None
+        """
+        self.conn.commit()
+        self.conn.execute(f"DETACH DATABASE {alias}")
+        del self.attached[alias]
+
+    def persist(
+        self,
+        path : str | None=None,
+        pages : int=256,
+        progress : Callable[[int, int, int], None] | None=None
+        ) -> None:
+        """Write the database to a file with the SQLite backup API.
+
+        Pages are copied in steps, so other connections to the file are
+        only locked out for one step at a time.
+
+        Parameters
+        ----------
+        path : str, optional(default=None)
+            The file to write. Defaults to the configured database file.
+        pages : int, optional(default=256)
+            The pages to copy per step, or -1 to copy them all at once.
+        progress : callable, optional(default=None)
+            Called with (status, remaining pages, total pages) after each step.
+
+        Returns
+        -------
+        None
+        """
+        path = path or self.db
+        if path == MEMORY_DB:
+            raise ValueError("Persist needs a file to write to.")
+        # Commit first, as the backup only copies committed pages.
+        self.conn.commit()
+        target = sqlite3.connect(path)
+        try:
+            self.conn.backup(target, pages=pages, progress=progress)
+        finally:
+            target.close()
+        logger.debug(f"Persisted {self.db} to {path}.")
+
+    def close(self) -> None:
+        """Close the connection. In snapshot mode, unsaved work is lost."""
+        self.conn.close()
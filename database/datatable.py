@@ -4,7 +4,7 @@ Data Table Module
 """
 
 # Library imports
-from typing      import List, Any, Iterable
+from typing      import List, Any, Iterable, Iterator
 from dataclasses import dataclass, field, fields
 from abc         import ABC, abstractmethod
 from loguru      import logger
@@ -12,75 +12,41 @@ import datetime
 
 # Module imports
 from .config     import DBCfg
+from .codecs     import (SQL_DATE_FORMAT, SQL_EPOCH, ERROR_UNSUPPORTED_TYPE,
+                         codec_for, encode, decode, to_epoch, from_sql_datetime)
+from .changes    import track_changes
+from .events     import bus, Change, INSERT, UPDATE, DELETE
+from .search     import index_search
+from .compress   import compressed_fields, compress, decompress, text_sql
+from .deferred   import deferred_fields, DEFERRED
 
 # Constants
-SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
-ERROR_UNSUPPORTED_TYPE = "Unsupported data type for SQL translation! {KEY_TYPE} : {KEY_VAR}"
+UNDEFER_BATCH_SIZE = 500
 
 # ---------------------------------------------------------------------
 # Helper functions ----------------------------------------------------
 
-def is_date(
-    string : str,
-    date_format : str | Iterable[str]=('%Y-%m-%d %H:%M:%S')
-    ) -> bool:
-    """Check if a string is formatted as a valid date.
+def sql_epoch(col : str) -> str:
+    """Get a SQL expression for a datetime column in epoch seconds."""
+    return (f"(CASE WHEN typeof({col}) = 'integer' THEN {col} "
+            f"ELSE CAST(strftime('%s', {col}) AS INTEGER) END)")
 
-    Parameters
-    ----------
-    string : str
-        The string to check for dateness.
-    date_format : hashable, optional(default=('%Y-%m-%d %H:%M:%S'))
-        A iterable of strings containing the date formats to check for.
-    
-    Returns
-    -------
-    bool: True if the string is in a valid date format.
-    """
- 
-    for format in date_format:
-        try: 
-            datetime.datetime.strptime(string, format)
-            return True
-        except ValueError:
-            pass
-        
-    # If this is reached, the string could not be converted to a date
-    return False
-
-def params_to_str(params : dict) -> str:
-    """Convert a parameters dictionary to a SQL row string.
+def sql_datetime(col : str) -> str:
+    """Get a SQL expression for a datetime column as SQL_DATE_FORMAT text."""
+    return (f"(CASE WHEN typeof({col}) = 'integer' THEN datetime({col}, 'unixepoch') "
+            f"ELSE {col} END)")
 
-    Parameters
-    ----------
-    params : dict
-        A dictionary of parameters to convert to a string.
-    
-    Returns
-    -------
-    str: A string formated into a SQL data row.
-    """
-    
-    # Add each item to the returned string based on its type.
-    param_str = ""
-    for key, val in params.items():
-        param_str += f"{key} = "
-        if isinstance(val, (int, bool, float)):
-            param_str += f"{val}, "
-        elif isinstance(key, (datetime.datetime)):
-            param_str += f"\'{str(val)}\',"
-        else:
-            param_str += f"\'{val}\', "
-    
-    return param_str[:-2]
-
-def get_sql_type(var : Any) -> str:
+def get_sql_type(var : Any, epoch : bool=False, tp : Any=None) -> str:
     """Get the SQL data type keyword for a given variable.
     
     Parameters
     ----------
     var : any
         The variable to get the SQL data type keyword of.
+    epoch : bool, optional(default=False)
+        If true, datetimes are stored as integer epoch seconds.
+    tp : type, optional(default=None)
+        The field annotation. Defaults to the type of the variable.
     
     Returns
     -------
@@ -90,51 +56,38 @@ def get_sql_type(var : Any) -> str:
     ------
     ValueError if the variable is an unsupported type.
     """
-    
-    if isinstance(var, (int, bool)):
-        return "INTEGER"
-    elif isinstance(var, float):
-        return "REAL"
-    elif isinstance(var, (complex, str, list, dict, tuple,
-                            range, set, frozenset, bytes,
-                            bytearray, memoryview) ):
-        return "TEXT"
-    elif isinstance(var, (datetime.datetime)):
-        return "DATETIME"
-    else:
+    codec = (tp is not None and codec_for(tp, epoch)) or codec_for(type(var), epoch)
+    if codec is None:
         error_msg = ERROR_UNSUPPORTED_TYPE.format(KEY_TYPE=type(var), KEY_VAR=var)
         logger.error(error_msg)
         raise ValueError(error_msg)
+    return codec.sql_type
 
-def get_sql_value(var : Any) -> Any:
+def get_sql_value(var : Any, epoch : bool=False, tp : Any=None) -> Any:
     """Get the SQL data value for a given variable.
     
     Format values submitted to a SQL database in the applicable format.
-    For example, booleans should be 1 or 0. Dates and lists are formatted
-    as strings.
+    For example, booleans should be 1 or 0, lists are JSON text and
+    bytes are BLOBs. See the codecs module.
     
     Parameters
     ----------
     var : any
         The variable to get the formatted SQL value of.
+    epoch : bool, optional(default=False)
+        If true, datetimes are stored as integer epoch seconds.
+    tp : type, optional(default=None)
+        The field annotation. Defaults to the type of the variable.
         
     Returns
     ------
     any : The formatted SQL variable
-    
-    Input parameters:
-    :var:  Python variable whose SQL formatted value to return.
+
+    Raises
+    ------
+    ValueError if the variable is an unsupported type.
     """
-    if isinstance(var, (int, bool)):
-        return int(var)
-    elif isinstance(var, float):
-        return var
-    elif isinstance(var, (complex, str, Iterable, datetime.datetime)):
-        return str(var)
-    else:
-        error_msg = ERROR_UNSUPPORTED_TYPE.format(KEY_TYPE=type(var), KEY_VAR=var)
-        logger.error(error_msg)
-        raise ValueError(error_msg)
+    return encode(var, tp, epoch)
 
 # ---------------------------------------------------------------------
 # DataTable Class -----------------------------------------------------
@@ -153,6 +106,14 @@ class DataTable(ABC):
         Contains the SQL database interface.
     id : int
         An item in the DataTable's unique ID.
+    sql_label : str
+        A SQL expression over the table's columns that names an item,
+        used when a related table resolves its links to readable text.
+    search_fields : tuple
+        The text columns to keep in a full-text search index.
+    
+    Fields with 'deferred' in their metadata are left out when items
+    are loaded, and read when they are first accessed.
     
     Methods
     -------
@@ -162,10 +123,20 @@ class DataTable(ABC):
         List everything in the data table by its __str__ value.
     load
         Load an item from the data table.
+    load_list
+        Load the items matching a condition in one query.
+    undefer
+        Read deferred fields for a list of items in one query.
     load_column
         Load all values in a data table column
     load_table
         Load everything from the data table.
+    union_sql
+        Get a query over the table in the main and attached databases.
+    load_sources
+        Stream items from the main and attached databases.
+    shared
+        Find items kept in more than one of the databases.
     lut_aliases
         Get a list of formal print names for each parameter.
     lut_alias_to_desc
@@ -180,39 +151,75 @@ class DataTable(ABC):
         Get a dictionary of parameter names to object type.
     save
         Save an item to the data table.
+    delete
+        Delete an item from the data table.
     """
     
     db: DBCfg = field()
     id: int = field(init=False, default_factory=int)
+    sql_label = "id"
+    search_fields = ()
 
     def create(self) -> None:
         """Add table to the database if it does not exist.
         
-        Iterate through each parameter to define the table's columns.
-        Then, save the table to the database in db.
+        The schema is only created the first time the table is used with
+        a database. Later calls return immediately.
         
         Returns
         -------
         None
         """
+        # Imported here, as the schema registry imports this module.
+        from .schema import ensure_schema
+        ensure_schema(self.db, [self.__class__])
 
-        # Format all of the object's parameters into a string.
-        cols = ""
-        for i in self.__dict__:
-            if i == 'id':
-                cols += "id INTEGER PRIMARY KEY, "
-            elif i == 'db':
-                pass
-            else:
-                cols += f"{i} {get_sql_type(self.__dict__[i])}, "
-        if self.unique_ids[0][0]:
-            cols += f"{self.unique_str}, "
-
-        sql = f"""CREATE TABLE IF NOT EXISTS {self.__class__.__name__}s({cols[:-2]});"""
-
-        logger.debug(f"Creating {self.__class__.__name__}s table (if it doesn't exist).")
-        # Store in the SQL database.
-        self.db.cursor.execute(sql)
+    @classmethod
+    def table_sql(cls, epoch : bool=False, name : str | None=None) -> str:
+        """Get the CREATE TABLE statement built from the field types.
+        
+        Parameters
+        ----------
+        epoch : bool, optional(default=False)
+            If true, datetimes are stored as integer epoch seconds.
+        name : str, optional(default=None)
+            The table name. Defaults to the class's table.
+        
+        Returns
+        -------
+        str : The SQL statement.
+        """
+        cols = ["id INTEGER PRIMARY KEY"]
+        for f in fields(cls):
+            if f.name not in ('db', 'id'):
+                cols.append(f"{f.name} {get_sql_type(None, epoch, f.type)}")
+        unique = cls.unique_columns()
+        if unique:
+            cols.append(f"UNIQUE ({', '.join(unique)})")
+        return f"CREATE TABLE IF NOT EXISTS {name or cls.__name__ + 's'}({', '.join(cols)});"
+
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Create the table, its change triggers and its search index.
+        
+        Subclasses extend this to add their own indexes and triggers.
+        Use create() or the schema registry rather than calling this.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        
+        Returns
+        -------
+        None
+        """
+        logger.debug(f"Creating {cls.__name__}s table (if it doesn't exist).")
+        db.cursor.execute(cls.table_sql(db.epoch_datetimes))
+        track_changes(db, f"{cls.__name__}s", cls.unique_columns() or ["id"])
+        if cls.search_fields:
+            index_search(db, f"{cls.__name__}s", cls.search_fields,
+                         [c for c in cls.search_fields if c in compressed_fields(cls)])
 
     @classmethod
     def load(cls, db : DBCfg, val : Any, col : str="id"):
@@ -235,7 +242,7 @@ class DataTable(ABC):
         """
 
         # Format the SQL query to a string.
-        sql = f"SELECT * FROM {cls.__name__}s WHERE {col}=?"
+        sql = f"SELECT {cls.columns_sql()} FROM {cls.__name__}s WHERE {col}=?"
 
         # Query the database
         db.cursor.execute(sql, (val,))
@@ -246,22 +253,140 @@ class DataTable(ABC):
         else:
             logger.debug(f"Read {col}: {val} - {row}")
 
-        # Parse the row values into the object's fields.
-        params = []
-        for i in row:
-            if isinstance(i, str) and i[0] == '[':
-                params.append(eval(i))
-            elif isinstance(i, str) and is_date(i):
-                params.append(datetime.datetime.strptime(i, SQL_DATE_FORMAT))
-            else:
-                params.append(i)
-        obj = cls(*params[:])
-        obj.id = params[0]
-        obj.db = db
-        logger.debug(f"Successfully loaded {cls.__name__}: {obj}")
+        obj = cls.from_row(db, [i[0] for i in db.cursor.description], row)
+        # By ID, as the whole item would decompress its compressed fields.
+        logger.debug(f"Successfully loaded {cls.__name__} {obj.id}")
 
         return obj
 
+    @classmethod
+    def from_row(cls, db : DBCfg, cols : list[str], row : tuple):
+        """Build an object from a row read from its data table.
+        
+        Each column is decoded by the codec of the field it stores.
+        Compressed fields are kept as stored until they are first read,
+        and deferred fields missing from the row until they are accessed.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        cols : list of str
+            The column names of the row.
+        row : tuple
+            The row values.
+        
+        Returns
+        -------
+        An initialized object.
+        """
+        types = {f.name : f.type for f in fields(cls)}
+        compressed = compressed_fields(cls)
+        params = {col : decode(i, types[col]) if col in types and col not in compressed else i
+                  for col, i in zip(cols, row)}
+        for col in deferred_fields(cls):
+            params.setdefault(col, DEFERRED)
+        obj = cls(db, *[params[f.name] for f in fields(cls)
+                        if f.init and f.name != 'db'])
+        # Stored fields the constructor doesn't take, such as the ID.
+        for f in fields(cls):
+            if not f.init and f.name in params:
+                setattr(obj, f.name, params[f.name])
+
+        return obj
+
+    @classmethod
+    def columns_sql(cls, undefer : Iterable[str]=()) -> str:
+        """Get the columns to select when loading items.
+        
+        Parameters
+        ----------
+        undefer : iterable of str, optional(default=())
+            Deferred fields to select anyway.
+        
+        Returns
+        -------
+        str : The column list, or '*' if no field is deferred.
+        """
+        deferred = set(deferred_fields(cls)) - set(undefer)
+        if not deferred:
+            return "*"
+        return ", ".join(["id"] + [f.name for f in fields(cls)
+                                   if f.name not in ('db', 'id') and f.name not in deferred])
+
+    @classmethod
+    def load_list(
+        cls,
+        db : DBCfg,
+        where : str="",
+        params : tuple=(),
+        undefer : Iterable[str]=()
+        ) -> list[Any]:
+        """Load the items matching a condition in one query, in ID order.
+        
+        Deferred fields are left out, so a list view only reads the
+        columns it shows.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        where : str, optional(default="")
+            A condition to filter the rows by. Defaults to every row.
+        params : tuple, optional(default=())
+            The condition's parameters.
+        undefer : iterable of str, optional(default=())
+            Deferred fields to read with the rest, for a list that shows them.
+        
+        Returns
+        -------
+        list : The loaded items.
+        """
+        where = f" WHERE {where}" if where else ""
+        cursor = db.conn.execute(
+            f"SELECT {cls.columns_sql(undefer)} FROM {cls.__name__}s{where} ORDER BY id",
+            tuple(params))
+        cols = [i[0] for i in cursor.description]
+        items = [cls.from_row(db, cols, row) for row in cursor]
+        logger.debug(f"Loaded {len(items)} {cls.__name__}s.")
+        return items
+
+    @classmethod
+    def undefer(cls, items : list[Any], cols : Iterable[str] | None=None) -> list[Any]:
+        """Read deferred fields for a list of items, in one query per batch.
+        
+        Parameters
+        ----------
+        items : list
+            Items loaded from the same database.
+        cols : iterable of str, optional(default=None)
+            The deferred fields to read. Defaults to all of them.
+        
+        Returns
+        -------
+        list : The same items.
+        """
+        cols = list(deferred_fields(cls) if cols is None else cols)
+        pending = {i.id: i for i in items
+                   if any(i.__dict__.get(c) is DEFERRED for c in cols)}
+        if not cols or not pending:
+            return items
+        db = next(iter(pending.values())).db
+        accessors = [getattr(cls, c) for c in cols]
+        ids = list(pending)
+        for n in range(0, len(ids), UNDEFER_BATCH_SIZE):
+            batch = ids[n:n + UNDEFER_BATCH_SIZE]
+            rows = db.conn.execute(
+                f"SELECT id, {', '.join(cols)} FROM {cls.__name__}s "
+                f"WHERE id IN ({', '.join('?' * len(batch))})", batch)
+            for row in rows:
+                item = pending[row[0]]
+                for col, accessor, val in zip(cols, accessors, row[1:]):
+                    if item.__dict__.get(col) is DEFERRED:
+                        item.__dict__[col] = accessor.read(val)
+        logger.debug(f"Read {cols} of {len(ids)} {cls.__name__}s.")
+        return items
+
     @classmethod
     def load_table(cls, db : DBCfg) -> list[Any]:
         """Read an entire table from the database.
@@ -278,7 +403,13 @@ class DataTable(ABC):
         
         logger.debug(f"Reading entire {cls.__name__} table.")
         db.cursor.execute(f"SELECT * FROM {cls.__name__}s")
-        return db.cursor.fetchall()
+        rows = db.cursor.fetchall()
+        compressed = [i for i, c in enumerate(db.cursor.description)
+                      if c[0] in compressed_fields(cls)]
+        if compressed:
+            rows = [tuple(decompress(v) if i in compressed else v for i, v in enumerate(row))
+                    for row in rows]
+        return rows
     
     @classmethod
     def load_column(cls, db : DBCfg, col : str) -> list[Any]:
@@ -297,7 +428,8 @@ class DataTable(ABC):
         
         """
         logger.debug(f"Reading {col} from {cls.__name__} table.")
-        db.cursor.execute(f"SELECT DISTINCT {col} FROM {cls.__name__}s")
+        sql_col = text_sql(col) if col in compressed_fields(cls) else col
+        db.cursor.execute(f"SELECT DISTINCT {sql_col} FROM {cls.__name__}s")
         return [i[0] for i in db.cursor.fetchall()]
     
     @classmethod
@@ -317,7 +449,119 @@ class DataTable(ABC):
         logger.debug(f"Listing all items in {cls.__name__} table.")
         return [str(cls.load(db, i)) for i in cls.load_column(db, "id")]
  
-    def save(self, update=True) -> int:
+    @classmethod
+    def union_sql(
+        cls,
+        db : DBCfg,
+        cols : str="*",
+        where : str="",
+        sources : Iterable[str] | None=None
+        ) -> tuple[str, list[str]]:
+        """Get a query over the table in the main and attached databases.
+        
+        Each database's rows are selected with the same columns and
+        condition and combined with UNION ALL, after a 'source' column
+        holding the database's alias. Databases without the table are
+        left out.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        cols : str, optional(default="*")
+            The columns to select.
+        where : str, optional(default="")
+            A condition to filter each database's rows by.
+        sources : iterable of str, optional(default=None)
+            The aliases of the databases to query. Defaults to all of them.
+        
+        Returns
+        -------
+        tuple : The SQL, and the aliases of the databases it queries, in
+        order. Repeat the condition's parameters once per alias.
+        """
+        name = f"{cls.__name__}s"
+        found = [src for src in (db.sources if sources is None else sources)
+                 if db.conn.execute(f"SELECT 1 FROM {src}.sqlite_master "
+                                    "WHERE type = 'table' AND name = ?", (name,)).fetchone()]
+        where = f" WHERE {where}" if where else ""
+        sql = " UNION ALL ".join(
+            [f"SELECT '{src}' AS source, {cols} FROM {src}.{name}{where}" for src in found])
+        return sql, found
+
+    @classmethod
+    def load_sources(
+        cls,
+        db : DBCfg,
+        where : str="",
+        params : tuple=(),
+        sources : Iterable[str] | None=None
+        ) -> Iterator[tuple[str, Any]]:
+        """Stream items from the main and attached databases.
+        
+        Rows are read as the cursor fetches them, so libraries are never
+        loaded into memory whole. Items from attached databases carry
+        that database's IDs, so treat them as read only.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        where : str, optional(default="")
+            A condition to filter the rows by.
+        params : tuple, optional(default=())
+            The condition's parameters.
+        sources : iterable of str, optional(default=None)
+            The aliases of the databases to query. Defaults to all of them.
+        
+        Yields
+        ------
+        tuple : The alias of the item's database and the loaded item.
+        """
+        sql, found = cls.union_sql(db, cls.columns_sql(), where, sources)
+        if not found:
+            return
+        logger.debug(f"Reading {cls.__name__}s from {', '.join(found)}.")
+        cursor = db.conn.execute(sql, tuple(params) * len(found))
+        cols = [i[0] for i in cursor.description][1:]
+        for row in cursor:
+            yield row[0], cls.from_row(db, cols, row[1:])
+
+    @classmethod
+    def shared(
+        cls,
+        db : DBCfg,
+        sources : Iterable[str] | None=None
+        ) -> Iterator[tuple[tuple, list[str]]]:
+        """Find items kept in more than one of the databases.
+        
+        Items are matched by their unique ID columns.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        sources : iterable of str, optional(default=None)
+            The aliases of the databases to compare. Defaults to all of them.
+        
+        Yields
+        ------
+        tuple : The item's unique column values, and the aliases of the
+        databases that keep it.
+        """
+        key = ", ".join(cls.unique_columns())
+        if not key:
+            return
+        sql, found = cls.union_sql(db, key, sources=sources)
+        if len(found) < 2:
+            return
+        cursor = db.conn.execute(f"""
+            SELECT {key}, group_concat(source, char(31)) FROM ({sql})
+            GROUP BY {key} HAVING count(DISTINCT source) > 1""")
+        for row in cursor:
+            yield row[:-1], row[-1].split("\x1f")
+
+    def save(self, update=True, commit=True) -> int:
         """Write an object's values to a SQL data table.
         
         Parameters
@@ -325,6 +569,9 @@ class DataTable(ABC):
         update : bool
             If true, updates all values of the item in the data table as
             opposed to adding a new instance to the data table.
+        commit : bool, optional(default=True)
+            If false, leave the write in the open transaction so the
+            caller can commit a batch of writes together.
         
         Returns
         -------
@@ -335,12 +582,19 @@ class DataTable(ABC):
         params = list(self.__dict__.keys())
         params.remove('db')
         params.remove('id')
+        # Deferred fields never read are left as they are stored.
+        params = [i for i in params if self.__dict__[i] is not DEFERRED]
         cols = ", ".join([str(s) for s in params])
         q = ("?,"*len(params))[:-1]
         
+        types = {f.name : f.type for f in fields(self)}
+        compressed = compressed_fields(self.__class__)
+        vals = tuple([compress(self.__dict__[i], compressed[i]) if i in compressed else
+                      get_sql_value(self.__dict__[i], self.db.epoch_datetimes, types.get(i))
+                      for i in params])
+        
         if self.id == 0:
             # Add new row to the table.
-            vals = tuple([get_sql_value(self.__dict__[i]) for i in params])
             logger.debug(f"Writing {self.__class__.__name__} table: {vals}")
             
             sql = f"""
@@ -355,36 +609,96 @@ class DataTable(ABC):
                 return 0
         elif update:
             # Update a row in the table.
+            sets = ", ".join([f"{i} = ?" for i in params])
             sql = f"""
                      UPDATE {self.__class__.__name__}s
-                     SET {params_to_str(self.__dict__)}
-                     WHERE id = {self.id}
+                     SET {sets}
+                     WHERE id = ?
                    """
-            self.db.cursor.execute(sql)
+            self.db.cursor.execute(sql, vals + (self.id,))
         else:
             logger.warning(f"Did not save {self.__class__.__name__}: {self}")
             return 0
         
         # store to database
-        self.db.conn.commit()
+        if commit:
+            self.db.conn.commit()
 
-        # Read and set the instance's ID.
-        self.id = self.db.cursor.execute(
-            f"SELECT last_insert_rowid() FROM {self.__class__.__name__}s"
-            ).fetchone()[0]
+        # Read and set a new instance's ID.
+        op = UPDATE
+        if self.id == 0:
+            op = INSERT
+            # Without a FROM clause, so no statement is left open on the table.
+            self.id = self.db.cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        
+        # Uncommitted writes are published by whoever commits them.
+        if commit:
+            bus.publish([Change(op, self.__class__, self.id)])
         
         return self.id
     
+    def delete(self, commit=True) -> bool:
+        """Delete an object's row from its SQL data table.
+        
+        Parameters
+        ----------
+        commit : bool, optional(default=True)
+            If false, leave the delete in the open transaction so the
+            caller can commit a batch of writes together.
+        
+        Returns
+        -------
+        bool : True if a row was deleted.
+        """
+        if not self.id:
+            return False
+        logger.debug(f"Deleting {self.__class__.__name__} {self.id}")
+        deleted = self.db.cursor.execute(
+            f"DELETE FROM {self.__class__.__name__}s WHERE id = ?", (self.id,)
+            ).rowcount > 0
+        if commit:
+            self.db.conn.commit()
+            if deleted:
+                bus.publish([Change(DELETE, self.__class__, self.id)])
+        return deleted
+    
     @abstractmethod
     def unique_ids(self) -> list[tuple]:
         """Unique constraints to avoid storing duplicate items to the database."""
         pass
     
+    @classmethod
+    def derived_values(cls, values : dict) -> dict:
+        """Compute the stored fields derived from an item's other fields.
+        
+        Used to fill derived columns, such as hashes, of rows already
+        stored when a migration adds them. Subclasses with derived
+        fields override this.
+        
+        Parameters
+        ----------
+        values : dict
+            Field name -> value of the item's other fields.
+        
+        Returns
+        -------
+        dict : Field name -> value of each derived field.
+        """
+        return {}
+    
     @property
     def unique_str(self) -> str:
         """A string of the unique IDs formatted for a SQL command."""
         return f"UNIQUE ({', '.join([i[0] for i in self.unique_ids])})"
     
+    @classmethod
+    def unique_columns(cls) -> list[str]:
+        """Get the unique ID column names without an instance."""
+        class _Blank():
+            def __getattr__(self, name):
+                return None
+        return [i[0] for i in cls.unique_ids.fget(_Blank()) if i[0]]
+    
     @classmethod
     def lut_aliases(cls) -> list:
         """Return a list of formal print names."""
@@ -440,6 +754,9 @@ class RelTable(ABC):
     def create(cls, db : DBCfg):
         """Create a many to many relational table if it does not exist.
         
+        The schema is only created the first time the table is used with
+        a database. Later calls return immediately.
+        
         Parameters
         ----------
         db : DBCfg (Database Config Object)
@@ -450,7 +767,25 @@ class RelTable(ABC):
         None
         
         """
+        # Imported here, as the schema registry imports this module.
+        from .schema import ensure_schema
+        ensure_schema(db, [cls])
+
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Create the table and its change triggers.
+        
+        Use create() or the schema registry rather than calling this.
         
+        Parameters
+        ----------
+        db : DBCfg (Database Config Object)
+            Contains the SQL database interface.
+        
+        Returns
+        -------
+        None
+        """
         sql = f""" CREATE TABLE IF NOT EXISTS {cls.table_name} (
                      {cls.a_name}_id integer NOT NULL,
                      {cls.b_name}_id integer NOT NULL,
@@ -462,6 +797,7 @@ class RelTable(ABC):
         
         # Store in the SQL database.
         db.cursor.execute(sql)
+        track_changes(db, cls.table_name, [f"{cls.a_name}_id", f"{cls.b_name}_id"])
 
     @classmethod
     def lookup_rel_ids(cls, db : DBCfg, id : int, x_in_y : tuple=("a", "b")) -> list:
@@ -523,13 +859,16 @@ class RelTable(ABC):
         db.cursor.execute(f"SELECT * FROM {cls.table_name}")
         return db.cursor.fetchall()
     
-    def save(self, row : tuple) -> int:
+    def save(self, row : tuple, commit : bool=True) -> int:
         """Add a row to the table.
         
         Parameters
         ----------
         row : tuple
             Define the row of mapped IDs to save.
+        commit : bool, optional(default=True)
+            If false, leave the write in the open transaction so the
+            caller can commit a batch of writes together.
             
         Returns
         -------
@@ -544,16 +883,17 @@ class RelTable(ABC):
               VALUES(?,?)"""
         try:
             self.db.cursor.execute(sql, (a_id, b_id))
-            self.db.conn.commit()
+            if commit:
+                self.db.conn.commit()
         except Exception as e:
             logger.error(f"Failed to save: {self.table_name}: {row}")
             logger.error(e)
             return 0
         
         # Read and set the instance's ID.
-        self.id = self.db.cursor.execute(
-            f"SELECT last_insert_rowid() FROM {self.table_name}"
-            ).fetchone()[0]
+        self.id = self.db.cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
         logger.debug(f"Saved {self.table_name} ID: {self.id}")
+        if commit:
+            bus.publish([Change(INSERT, self.__class__, self.id)])
         
         return self.id
\ No newline at end of file
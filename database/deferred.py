@@ -0,0 +1,93 @@
+"""
+Deferred Module
+
+Deferred loading of heavy columns.
+
+A field opts in with 'deferred' in its metadata. Deferred columns are
+left out of the queries that load items, and each is read from the
+database the first time it is accessed on an item. A list of items that
+will show a deferred field can have it read for all of them in a single
+query instead, with DataTable.undefer or the undefer option of
+DataTable.load_list.
+
+"""
+
+# Library imports
+from dataclasses import fields
+from loguru      import logger
+
+# Module imports
+from .codecs     import decode
+from .compress   import LazyText, compressed_fields, decompress
+
+# ---------------------------------------------------------------------
+# Deferred Class ------------------------------------------------------
+
+class _Deferred():
+    """The value of a field that has not been read yet."""
+
+    def __repr__(self):
+        return "<deferred>"
+
+DEFERRED = _Deferred()
+
+class Deferred(LazyText):
+    """A deferred field, read from the database the first time it is accessed."""
+
+    def __init__(self, name : str, tp : type, compressed : bool):
+        super().__init__(name)
+        self.tp = tp
+        self.compressed = compressed
+
+    def read(self, val):
+        """Get the value to keep on an item for a stored value.
+
+        Compressed text is kept compressed until it is accessed.
+        """
+        return val if self.compressed else decode(val, self.tp)
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        try:
+            val = obj.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name) from None
+        if val is DEFERRED:
+            logger.debug(f"Reading deferred {self.name} of {type(obj).__name__} {obj.id}")
+            row = obj.db.conn.execute(
+                f"SELECT {self.name} FROM {type(obj).__name__}s WHERE id = ?",
+                (obj.id,)).fetchone()
+            val = self.read(row[0] if row else None)
+        if self.compressed and isinstance(val, bytes):
+            val = decompress(val)
+        obj.__dict__[self.name] = val
+        return val
+
+# Class -> names of its deferred fields
+_deferred: dict[type, list[str]] = {}
+
+def deferred_fields(cls : type) -> list[str]:
+    """Get the deferred fields of a data table class.
+
+    Their accessors are added to the class the first time it is asked
+    about.
+
+    Parameters
+    ----------
+    cls : type
+        The DataTable class.
+
+    Returns
+    -------
+    list : The names of the deferred fields.
+    """
+    if cls not in _deferred:
+        compressed = compressed_fields(cls)
+        found = []
+        for f in fields(cls):
+            if f.metadata and f.metadata.get('deferred'):
+                found.append(f.name)
+                setattr(cls, f.name, Deferred(f.name, f.type, f.name in compressed))
+        _deferred[cls] = found
+    return _deferred[cls]
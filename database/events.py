@@ -0,0 +1,121 @@
+"""
+Events Module
+
+A change feed published after each committed write.
+
+Each insert, update or delete of a data table or relational table row
+is published as a Change naming the table's class and the row ID, once
+the transaction holding it has committed. Subscribers are called on the
+thread that committed, so user interfaces should hand the change over
+to their own thread (Textual's post_message is thread safe).
+
+"""
+
+# Library imports
+from typing      import Callable, Iterable
+from dataclasses import dataclass
+from loguru      import logger
+import threading
+
+# Constants
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+# ---------------------------------------------------------------------
+# Change Class --------------------------------------------------------
+
+@dataclass(frozen=True)
+class Change():
+    """A committed change to one row.
+
+    Attributes
+    ----------
+    op : str
+        INSERT, UPDATE or DELETE.
+    table : type
+        The DataTable or RelTable class of the row.
+    id : int
+        The ID (or rowid, for relational tables) of the row.
+    """
+    op: str
+    table: type
+    id: int
+
+# ---------------------------------------------------------------------
+# ChangeBus Class -----------------------------------------------------
+
+class ChangeBus():
+    """Deliver committed changes to subscribers.
+
+    Methods
+    -------
+    subscribe
+        Call a function with each change to some or all tables.
+    publish
+        Deliver committed changes to the subscribers.
+    """
+
+    def __init__(self):
+        self._subscribers: list[tuple[Callable[[Change], None], tuple[type, ...] | None]] = []
+        self._lock = threading.Lock()
+
+    def subscribe(
+        self,
+        callback : Callable[[Change], None],
+        tables : Iterable[type] | None=None
+        ) -> Callable[[], None]:
+        """Call a function with each change to some or all tables.
+
+        Parameters
+        ----------
+        callback : callable
+            Called with each Change, on the thread that committed it.
+        tables : iterable of type, optional(default=None)
+            The classes to follow, including their subclasses. Defaults
+            to every table.
+
+        Returns
+        -------
+        callable : Call to unsubscribe.
+        """
+        entry = (callback, tuple(tables) if tables is not None else None)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def publish(self, changes : Iterable[Change]) -> None:
+        """Deliver committed changes to the subscribers.
+
+        A failing subscriber is logged and does not stop delivery to the
+        others.
+
+        Parameters
+        ----------
+        changes : iterable of Change
+            The changes, in the order they were made.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        for change in changes:
+            for callback, tables in subscribers:
+                if tables is not None and not issubclass(change.table, tables):
+                    continue
+                try:
+                    callback(change)
+                except Exception as e:
+                    logger.error(f"Change subscriber failed on {change}: {e}")
+
+# The change feed shared by the data layer.
+bus = ChangeBus()
@@ -0,0 +1,316 @@
+"""
+Export Module
+
+Stream data tables and relational tables out of the database to JSON
+lines or CSV files.
+
+Rows are written as the cursor fetches them, so memory use stays
+constant no matter how large a table grows. Links stored in relational
+tables are resolved with joins in the same query that reads the rows.
+
+"""
+
+# Library imports
+from typing      import Any, Iterator, TextIO
+from loguru      import logger
+import datetime
+import json
+import csv
+import os
+
+# Module imports
+from .config     import DBCfg
+from .datatable  import DataTable, RelTable
+from .schema     import data_tables, rel_tables, table_name
+from .changes    import changed_since_sql, changes_timestamp
+from .compress   import compressed_fields, decompress
+
+# Constants
+EXPORT_FORMATS = ("jsonl", "csv")
+EXPORT_BATCH_SIZE = 500
+ERROR_UNKNOWN_TABLE = "Unknown table to export! {KEY_NAME}"
+ERROR_UNKNOWN_FORMAT = "Unsupported export format! {KEY_FMT}"
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def existing_tables(db : DBCfg) -> set[str]:
+    """Get the names of all tables stored in the database."""
+    rows = db.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    return {i[0] for i in rows}
+
+def resolve_table(name : str) -> type:
+    """Find the DataTable or RelTable class matching a name.
+
+    Parameters
+    ----------
+    name : str
+        A class name or SQL table name, in any case.
+
+    Returns
+    -------
+    type : The matching DataTable or RelTable class.
+
+    Raises
+    ------
+    ValueError if no class matches the name.
+    """
+    name = name.lower()
+    for table in data_tables() + rel_tables():
+        if name in (table.__name__.lower(), table_name(table).lower()):
+            return table
+    error_msg = ERROR_UNKNOWN_TABLE.format(KEY_NAME=name)
+    logger.error(error_msg)
+    raise ValueError(error_msg)
+
+def _class_named(name : str) -> type | None:
+    """Get the DataTable class stored under a RelTable column name."""
+    for table in data_tables():
+        if table.__name__.lower() == name:
+            return table
+    return None
+
+def _labels_sql(table : type) -> str:
+    """Get a sub-query of IDs and labels for a DataTable class."""
+    return f"(SELECT id AS _id, {table.sql_label} AS _label FROM {table_name(table)})"
+
+def _since_sql(
+    table : str,
+    key : str,
+    since_id : int,
+    since : datetime.datetime | None
+    ) -> tuple[str, list]:
+    """Get the WHERE clause and parameters for an incremental export."""
+    conds = [f"{key} > ?"]
+    params = [since_id]
+    if since is not None:
+        conds.append(changed_since_sql(table, key))
+        params.append(changes_timestamp(since))
+    return " AND ".join(conds), params
+
+def export_query(
+    db : DBCfg,
+    table : type,
+    since_id : int=0,
+    since : datetime.datetime | None=None
+    ) -> tuple[str, list, list[str]]:
+    """Build the query that reads a table with its resolved links.
+
+    A DataTable gets one JSON array column per relational table that
+    links to it, holding the labels of the linked items. A RelTable
+    gets the labels of both of its linked items.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : type
+        The DataTable or RelTable class to export.
+    since_id : int, optional(default=0)
+        Only export rows with an ID greater than this.
+    since : datetime, optional(default=None)
+        Only export rows changed at or after this time.
+
+    Returns
+    -------
+    tuple : The SQL query, its parameters, and the names of the
+    columns holding JSON arrays.
+    """
+    tables = existing_tables(db)
+    name = table_name(table)
+
+    if issubclass(table, RelTable):
+        cols = [f"r.{table.a_name}_id", f"r.{table.b_name}_id"]
+        joins = ""
+        for i, end in enumerate((table.a_name, table.b_name)):
+            other = _class_named(end)
+            if other and table_name(other) in tables:
+                cols.append(f"o{i}._label AS {end}")
+                joins += (f" LEFT JOIN {_labels_sql(other)} o{i}"
+                          f" ON o{i}._id = r.{end}_id")
+        where, params = _since_sql(name, "r.rowid", since_id, since)
+        sql = (f"SELECT {', '.join(cols)} FROM {name} r{joins}"
+               f" WHERE {where} ORDER BY r.rowid")
+        return sql, params, []
+
+    cols = ["t.*"]
+    joins = ""
+    arrays = []
+    this = table.__name__.lower()
+    for i, rel in enumerate(rel_tables()):
+        if rel.table_name not in tables:
+            continue
+        if rel.b_name == this:
+            key, end = rel.b_name, rel.a_name
+        elif rel.a_name == this:
+            key, end = rel.a_name, rel.b_name
+        else:
+            continue
+        other = _class_named(end)
+        if not other or table_name(other) not in tables:
+            continue
+        col = f"{end}s"
+        cols.append(f"coalesce(j{i}.{col}, '[]') AS {col}")
+        arrays.append(col)
+        joins += f"""
+            LEFT JOIN (
+                SELECT r.{key}_id AS _key, json_group_array(o._label) AS {col}
+                FROM {rel.table_name} r
+                JOIN {_labels_sql(other)} o ON o._id = r.{end}_id
+                GROUP BY r.{key}_id
+                ) j{i} ON j{i}._key = t.id"""
+    where, params = _since_sql(name, "t.id", since_id, since)
+    sql = (f"SELECT {', '.join(cols)} FROM {name} t{joins}"
+           f" WHERE {where} ORDER BY t.id")
+    return sql, params, arrays
+
+def iter_rows(
+    db : DBCfg,
+    sql : str,
+    params : list,
+    batch : int=EXPORT_BATCH_SIZE
+    ) -> Iterator[tuple[list[str], tuple]]:
+    """Yield rows from a query a batch at a time.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    sql : str
+        The query to run.
+    params : list
+        The query's parameters.
+    batch : int, optional(default=EXPORT_BATCH_SIZE)
+        The number of rows to fetch from the cursor at once.
+
+    Returns
+    -------
+    Iterator : the column names and values of each row.
+    """
+    # Use a private cursor so other readers of db.cursor are unaffected.
+    cursor = db.conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        cols = [i[0] for i in cursor.description]
+        while rows := cursor.fetchmany(batch):
+            for row in rows:
+                yield cols, row
+    finally:
+        cursor.close()
+
+# ---------------------------------------------------------------------
+# Export functions ----------------------------------------------------
+
+def export_table(
+    db : DBCfg,
+    table : type,
+    fp : TextIO,
+    fmt : str="jsonl",
+    since_id : int=0,
+    since : datetime.datetime | None=None
+    ) -> int:
+    """Stream one table to an open text file.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : type
+        The DataTable or RelTable class to export.
+    fp : TextIO
+        The file to write to.
+    fmt : str, optional(default="jsonl")
+        The output format, either 'jsonl' or 'csv'.
+    since_id : int, optional(default=0)
+        Only export rows with an ID greater than this.
+    since : datetime, optional(default=None)
+        Only export rows changed at or after this time.
+
+    Returns
+    -------
+    int : The number of rows written.
+
+    Raises
+    ------
+    ValueError if the format is not supported.
+    """
+    if fmt not in EXPORT_FORMATS:
+        error_msg = ERROR_UNKNOWN_FORMAT.format(KEY_FMT=fmt)
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    sql, params, arrays = export_query(db, table, since_id, since)
+    logger.debug(f"Exporting {table_name(table)} as {fmt}.")
+
+    writer = csv.writer(fp) if fmt == "csv" else None
+    compressed = compressed_fields(table) if issubclass(table, DataTable) else {}
+    count = 0
+    for cols, row in iter_rows(db, sql, params):
+        if compressed:
+            row = tuple(decompress(v) if c in compressed else v for c, v in zip(cols, row))
+        if writer:
+            if not count:
+                writer.writerow(cols)
+            writer.writerow(row)
+        else:
+            item = dict(zip(cols, row))
+            for col in arrays:
+                item[col] = json.loads(item[col])
+            fp.write(json.dumps(item, default=str) + "\n")
+        count += 1
+
+    logger.debug(f"Exported {count} rows from {table_name(table)}.")
+    return count
+
+def export(
+    db : DBCfg,
+    target : str,
+    directory : str,
+    fmt : str="jsonl",
+    since_id : int=0,
+    since : datetime.datetime | None=None
+    ) -> dict[str, int]:
+    """Export one table, or every table, to files in a directory.
+
+    Each table is written to '<directory>/<table>.<fmt>'. Tables that
+    have not been created in the database are skipped.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    target : str
+        A table or class name, or 'all' to export every table.
+    directory : str
+        The directory to write the exported files to.
+    fmt : str, optional(default="jsonl")
+        The output format, either 'jsonl' or 'csv'.
+    since_id : int, optional(default=0)
+        Only export rows with an ID greater than this.
+    since : datetime, optional(default=None)
+        Only export rows changed at or after this time.
+
+    Returns
+    -------
+    dict : The number of rows written for each table name.
+    """
+    if target.lower() == "all":
+        targets = data_tables() + rel_tables()
+    else:
+        targets = [resolve_table(target)]
+
+    tables = existing_tables(db)
+    os.makedirs(directory, exist_ok=True)
+
+    counts = {}
+    for table in targets:
+        name = table_name(table)
+        if name not in tables:
+            logger.debug(f"Skipping export of missing table {name}.")
+            continue
+        path = os.path.join(directory, f"{name}.{fmt}")
+        with open(path, "w", newline="", encoding="utf-8") as fp:
+            counts[name] = export_table(db, table, fp, fmt, since_id, since)
+
+    return counts
@@ -0,0 +1,449 @@
+"""
+Maintenance Module
+
+Back up, compact and re-analyze the database while the app is running.
+
+Backups are copied a few pages at a time with the SQLite backup API,
+so writers are only locked out for one step at a time. Free pages are
+returned to the file system with incremental vacuum, which also only
+moves a bounded number of pages per run. Query planner statistics are
+refreshed with ANALYZE. A Maintenance object runs these tasks when they
+are due: after an interval, or once enough rows have changed since the
+last run. Changed rows are counted in the database's changes table, so
+writes from every connection are seen.
+
+"""
+
+# Library imports
+from typing      import Callable, Iterable
+from dataclasses import dataclass
+from loguru      import logger
+import datetime
+import threading
+import time
+import os
+
+# Module imports
+from .config     import DBCfg
+from .changes    import CHANGES_TABLE, changes_timestamp
+
+# Constants
+MAINTENANCE_TABLE = "maintenance_log"
+MAINTENANCE_TASKS = ("backup", "vacuum", "analyze")
+MAINTENANCE_INTERVAL = 24 * 60 * 60.0
+MAINTENANCE_CHURN = 1000
+MAINTENANCE_POLL = 60.0
+MAINTENANCE_TIMEOUT = 30.0
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.01
+VACUUM_PAGES = 1000
+ANALYSIS_LIMIT = 1000
+AUTO_VACUUM_INCREMENTAL = 2
+ERROR_UNKNOWN_TASK = "Unknown maintenance task! {KEY_TASK}"
+
+# ---------------------------------------------------------------------
+# MaintenanceReport Class ---------------------------------------------
+
+@dataclass
+class MaintenanceReport():
+    """What one maintenance run did.
+
+    Attributes
+    ----------
+    backup : str
+        The backup file written, or '' if there was no backup.
+    freed : int
+        The free pages returned to the file system.
+    analyzed : bool
+        Whether the statistics were refreshed.
+    churn : int
+        The rows changed since the previous run.
+    """
+    backup: str = ""
+    freed: int = 0
+    analyzed: bool = False
+    churn: int = 0
+
+    def __str__(self):
+        parts = []
+        if self.backup:
+            parts.append(f"backed up to {self.backup}")
+        parts.append(f"freed {self.freed} pages")
+        if self.analyzed:
+            parts.append("analyzed")
+        return ", ".join(parts)
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def backup(
+    db : DBCfg,
+    path : str,
+    pages : int=BACKUP_PAGES,
+    sleep : float=BACKUP_SLEEP,
+    progress : Callable[[int, int, int], None] | None=None
+    ) -> str:
+    """Copy the database to a file while it stays in use.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    path : str
+        The file to write, or an existing directory to write a
+        timestamped file into.
+    pages : int, optional(default=BACKUP_PAGES)
+        The pages to copy per step, or -1 to copy them all at once.
+    sleep : float, optional(default=BACKUP_SLEEP)
+        The seconds to pause between steps, letting writers in.
+    progress : callable, optional(default=None)
+        Called with (status, remaining pages, total pages) after each step.
+
+    Returns
+    -------
+    str : The backup file written.
+    """
+    if os.path.isdir(path):
+        stem = os.path.splitext(os.path.basename(db.db))[0]
+        if not stem or stem == ":memory:":
+            stem = "memory"
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(path, f"{stem}-{stamp}.db")
+    target = DBCfg(path)
+    try:
+        db.conn.backup(target.conn, pages=pages, progress=progress, sleep=sleep)
+    finally:
+        target.close()
+    logger.debug(f"Backed up {db.db} to {path}.")
+    return path
+
+def enable_incremental_vacuum(db : DBCfg) -> bool:
+    """Switch a database to incremental vacuum.
+
+    The switch only takes effect on a database with tables after a full
+    VACUUM, which rewrites the whole file, so run this once, offline.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    bool : Whether the database had to be switched.
+    """
+    if db.conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+        return False
+    db.conn.commit()
+    db.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    db.conn.execute("VACUUM")
+    logger.debug(f"Switched {db.db} to incremental vacuum.")
+    return True
+
+def incremental_vacuum(db : DBCfg, pages : int=VACUUM_PAGES) -> int:
+    """Return some free pages to the file system.
+
+    Does nothing unless the database uses incremental vacuum.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    pages : int, optional(default=VACUUM_PAGES)
+        The most pages to free, or 0 to free them all.
+
+    Returns
+    -------
+    int : The pages freed.
+    """
+    if db.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        logger.debug(f"{db.db} doesn't use incremental vacuum, skipping.")
+        return 0
+    before = db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # Each step of the pragma frees one page, and execute() only takes
+    # the first step, so run it as a script to step it to the end.
+    db.conn.commit()
+    db.conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return before - db.conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def analyze(db : DBCfg, limit : int=ANALYSIS_LIMIT) -> None:
+    """Refresh the query planner's statistics.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    limit : int, optional(default=ANALYSIS_LIMIT)
+        The rows to sample per index, or 0 to read every row.
+
+    Returns
+    -------
+    None
+    """
+    db.conn.execute(f"PRAGMA analysis_limit = {int(limit)}")
+    db.conn.execute("ANALYZE")
+    db.conn.commit()
+
+def optimize(db : DBCfg) -> None:
+    """Let SQLite re-analyze the tables this connection's queries used.
+
+    Cheap, and meant to be run before closing a connection.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    None
+    """
+    db.conn.execute("PRAGMA optimize")
+
+def churn(db : DBCfg, since : float) -> int:
+    """Count the rows written since a time.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    since : float
+        The epoch seconds to count from.
+
+    Returns
+    -------
+    int : The rows inserted, updated or deleted since then.
+    """
+    found = db.conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (CHANGES_TABLE,)).fetchone()
+    if not found:
+        return 0
+    when = datetime.datetime.fromtimestamp(since, datetime.timezone.utc)
+    return db.conn.execute(f"SELECT count(*) FROM {CHANGES_TABLE} WHERE changed >= ?",
+                           (changes_timestamp(when),)).fetchone()[0]
+
+def last_runs(db : DBCfg) -> dict[str, float]:
+    """Get when each maintenance task last ran, in epoch seconds."""
+    found = db.conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (MAINTENANCE_TABLE,)).fetchone()
+    if not found:
+        return {}
+    return dict(db.conn.execute(f"SELECT task, ran FROM {MAINTENANCE_TABLE}").fetchall())
+
+def _record(db : DBCfg, runs : dict[str, float]) -> None:
+    """Log when tasks ran."""
+    db.conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MAINTENANCE_TABLE} (
+            task TEXT PRIMARY KEY,
+            ran REAL NOT NULL
+            );""")
+    db.conn.executemany(
+        f"INSERT OR REPLACE INTO {MAINTENANCE_TABLE}(task, ran) VALUES (?, ?)",
+        runs.items())
+    db.conn.commit()
+
+# ---------------------------------------------------------------------
+# Maintenance Class ---------------------------------------------------
+
+class Maintenance():
+    """Run backups, vacuum and analyze when they are due.
+
+    File databases are maintained on a connection of the caller's own
+    thread, so run() can be called from a worker thread. In-memory
+    databases can only be maintained on their own connection, so they
+    have no scheduler thread.
+
+    Attributes
+    ----------
+    db : DBCfg (Database Config Object)
+        The database to maintain.
+    backup_dir : str
+        The directory to write backups to, or None for no backups.
+    interval : float
+        The seconds between runs of each task.
+    churn : int
+        The changed rows that make vacuum and analyze due early.
+    poll : float
+        The seconds between checks on the scheduler thread.
+
+    Methods
+    -------
+    churned
+        Get the rows changed since vacuum and analyze last ran.
+    due
+        Get the tasks that are due.
+    run
+        Run maintenance tasks now.
+    start
+        Run tasks as they fall due on a scheduler thread.
+    stop
+        Stop the scheduler thread.
+    """
+
+    def __init__(
+        self,
+        db : DBCfg,
+        backup_dir : str | None=None,
+        interval : float=MAINTENANCE_INTERVAL,
+        churn : int=MAINTENANCE_CHURN,
+        poll : float=MAINTENANCE_POLL
+        ):
+        self.db = db
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.churn = churn
+        self.poll = poll
+        self._last = last_runs(db)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def churned(self, db : DBCfg | None=None) -> int:
+        """Get the rows changed since vacuum and analyze last both ran.
+
+        Parameters
+        ----------
+        db : DBCfg (Database Config Object), optional(default=None)
+            A connection of the calling thread to count on. Defaults to
+            the maintained database's own.
+
+        Returns
+        -------
+        int : The rows changed.
+        """
+        since = min(self._last.get("vacuum", 0.0), self._last.get("analyze", 0.0))
+        return churn(db or self.db, since)
+
+    def due(self, now : float | None=None, db : DBCfg | None=None) -> list[str]:
+        """Get the tasks that are due.
+
+        Parameters
+        ----------
+        now : float, optional(default=None)
+            The epoch seconds to check at. Defaults to the current time.
+        db : DBCfg (Database Config Object), optional(default=None)
+            A connection of the calling thread to count changed rows on.
+            Defaults to the maintained database's own.
+
+        Returns
+        -------
+        list : The names of the due tasks.
+        """
+        now = time.time() if now is None else now
+        changed = None
+        tasks = []
+        for task in MAINTENANCE_TASKS:
+            if task == "backup" and not self.backup_dir:
+                continue
+            if now - self._last.get(task, 0.0) >= self.interval:
+                tasks.append(task)
+            elif task != "backup":
+                if changed is None:
+                    changed = self.churned(db)
+                if changed >= self.churn:
+                    tasks.append(task)
+        return tasks
+
+    def run(
+        self,
+        tasks : Iterable[str] | None=None,
+        progress : Callable[[int, int, int], None] | None=None
+        ) -> MaintenanceReport:
+        """Run maintenance tasks now.
+
+        Parameters
+        ----------
+        tasks : iterable of str, optional(default=None)
+            Any of 'backup', 'vacuum' and 'analyze'. Defaults to all of
+            them, with a backup only if there is a backup directory.
+        progress : callable, optional(default=None)
+            Called with (status, remaining pages, total pages) after each
+            backup step.
+
+        Returns
+        -------
+        MaintenanceReport : What was done.
+        """
+        if tasks is None:
+            tasks = [t for t in MAINTENANCE_TASKS if t != "backup" or self.backup_dir]
+        tasks = list(tasks)
+        for task in tasks:
+            if task not in MAINTENANCE_TASKS:
+                raise ValueError(ERROR_UNKNOWN_TASK.format(KEY_TASK=task))
+
+        with self._lock:
+            if self.db.in_memory:
+                db = self.db
+            else:
+                db = DBCfg(self.db.db, epoch_datetimes=self.db.epoch_datetimes)
+                db.conn.execute(f"PRAGMA busy_timeout = {int(MAINTENANCE_TIMEOUT * 1000)}")
+            report = MaintenanceReport(churn=self.churned(db))
+            try:
+                if "backup" in tasks:
+                    os.makedirs(self.backup_dir, exist_ok=True)
+                    report.backup = backup(db, self.backup_dir, progress=progress)
+                if "vacuum" in tasks:
+                    report.freed = incremental_vacuum(db)
+                if "analyze" in tasks:
+                    analyze(db)
+                    report.analyzed = True
+                runs = {task: time.time() for task in tasks}
+                _record(db, runs)
+            finally:
+                if db is not self.db:
+                    db.close()
+            self._last.update(runs)
+        logger.debug(f"Maintenance: {report}")
+        return report
+
+    def start(self) -> None:
+        """Run tasks as they fall due on a scheduler thread.
+
+        Returns
+        -------
+        None
+        """
+        if self._thread is not None:
+            return
+        if self.db.in_memory:
+            logger.debug("In-memory databases aren't maintained on a schedule.")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._schedule, name="anthology-maintenance", daemon=True)
+        self._thread.start()
+
+    def _schedule(self) -> None:
+        """Check for due tasks until stopped."""
+        db = DBCfg(self.db.db, epoch_datetimes=self.db.epoch_datetimes)
+        try:
+            while not self._stop.wait(self.poll):
+                tasks = self.due(db=db)
+                if not tasks:
+                    continue
+                try:
+                    self.run(tasks)
+                except Exception as e:
+                    logger.error(f"Scheduled maintenance failed: {e}")
+        finally:
+            db.close()
+
+    def stop(self, timeout : float | None=MAINTENANCE_TIMEOUT) -> None:
+        """Stop the scheduler thread and optimize the owner's connection.
+
+        Parameters
+        ----------
+        timeout : float, optional(default=MAINTENANCE_TIMEOUT)
+            The seconds to wait for a running task, or None to wait forever.
+
+        Returns
+        -------
+        None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        optimize(self.db)
@@ -0,0 +1,460 @@
+"""
+Migrate Module
+
+Bring existing tables up to date with their DataTable classes, and
+convert data already stored in the database to a new storage format.
+
+Each table's columns are compared with its class's fields. New columns
+are added in place with ALTER TABLE. Columns whose type changed, and
+new columns in a unique constraint, need the table rebuilt: the rows are
+copied into a new table in batches sized to a memory budget, converting
+values through the codecs and filling derived columns (such as hashes)
+from each row, before it replaces the old table. Rows that a new unique
+key makes duplicates are merged into the first of them: their links are
+moved onto it and its empty columns filled from them. Every migration run
+that changes anything raises the database's schema version and is
+logged in the migrations table.
+
+"""
+
+# Library imports
+from typing      import Any, Callable, Iterable
+from dataclasses import dataclass, fields, Field, MISSING
+from loguru      import logger
+import datetime
+
+# Module imports
+from .config     import DBCfg
+from .datatable  import DataTable, sql_epoch, get_sql_type
+from .codecs     import encode, decode
+from .compress   import compressed_fields, decompress
+from .schema     import (data_tables, table_name, ensure_schema, forget_schema,
+                         repoint_links)
+
+# Constants
+MIGRATE_BATCH_SIZE = 1000
+MIGRATE_MEMORY_BUDGET = 16 * 2**20
+MIGRATE_MAX_BATCH = 100_000
+MIGRATIONS_TABLE = "schema_migrations"
+REBUILD_SUFFIX = "_migrating"
+
+# ---------------------------------------------------------------------
+# MigrationStep Class -------------------------------------------------
+
+@dataclass
+class MigrationStep():
+    """One change needed to bring a table up to date with its class.
+    
+    Attributes
+    ----------
+    table : str
+        The name of the table to change.
+    action : str
+        'add' to add the column in place, or 'rebuild' to copy the
+        table into a new one.
+    column : str
+        The column added or changed.
+    old_type : str
+        The column's declared type, or '' if it is missing.
+    new_type : str
+        The column's type from the field.
+    """
+    table: str
+    action: str
+    column: str
+    old_type: str
+    new_type: str
+
+    def __str__(self):
+        """Formatted as <table>: <action> <column> <old type> -> <new type>"""
+        return (f"{self.table}: {self.action} {self.column} "
+                f"{self.old_type or '(missing)'} -> {self.new_type}")
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def datetime_fields(table : type[DataTable]) -> list[str]:
+    """Get the names of a DataTable's datetime fields."""
+    return [f.name for f in fields(table) if f.type is datetime.datetime]
+
+def migrate_datetimes(
+    db : DBCfg,
+    table : type[DataTable],
+    epoch : bool=True,
+    batch_size : int=MIGRATE_BATCH_SIZE,
+    progress : Callable[[int, int], None] | None=None
+    ) -> int:
+    """Convert a table's stored datetimes between text and epoch seconds.
+
+    Rows are converted in place, one ID range per transaction, so the
+    table is never copied and other connections are only blocked for
+    one batch at a time. Values already in the target format are left
+    alone, so an interrupted migration can simply be run again.
+
+    After converting to epoch seconds, open the database with
+    DBCfg(epoch_datetimes=True) so new rows are written the same way.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : type
+        The DataTable class whose datetime fields to convert.
+    epoch : bool, optional(default=True)
+        If true, convert text to epoch seconds. Otherwise convert epoch
+        seconds back to text.
+    batch_size : int, optional(default=MIGRATE_BATCH_SIZE)
+        The number of IDs to convert per transaction.
+    progress : callable, optional(default=None)
+        Called with (IDs done, IDs total) after each batch.
+
+    Returns
+    -------
+    int : The number of rows changed.
+    """
+    name = f"{table.__name__}s"
+    cols = datetime_fields(table)
+    if not cols:
+        return 0
+
+    if epoch:
+        sets = ", ".join([f"{c} = {sql_epoch(c)}" for c in cols])
+        where = " OR ".join([f"typeof({c}) = 'text'" for c in cols])
+    else:
+        sets = ", ".join([f"{c} = CASE WHEN typeof({c}) = 'integer' "
+                          f"THEN datetime({c}, 'unixepoch') ELSE {c} END" for c in cols])
+        where = " OR ".join([f"typeof({c}) = 'integer'" for c in cols])
+
+    lo, hi = db.conn.execute(f"SELECT min(id), max(id) FROM {name}").fetchone()
+    if lo is None:
+        return 0
+
+    logger.debug(f"Converting {name}({', '.join(cols)}) to "
+                 f"{'epoch seconds' if epoch else 'text'} in batches of {batch_size}.")
+    changed = 0
+    total = hi - lo + 1
+    for start in range(lo, hi + 1, batch_size):
+        cursor = db.conn.execute(f"""
+            UPDATE {name} SET {sets}
+            WHERE id BETWEEN ? AND ? AND ({where})""",
+            (start, start + batch_size - 1))
+        db.conn.commit()
+        changed += cursor.rowcount
+        if progress:
+            progress(min(start + batch_size, hi + 1) - lo, total)
+
+    logger.debug(f"Converted {changed} rows of {name}.")
+    return changed
+
+# ---------------------------------------------------------------------
+# Schema migrations ---------------------------------------------------
+
+def schema_version(db : DBCfg) -> int:
+    """Get the database's schema version, raised by each migration run."""
+    return db.conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _columns(db : DBCfg, name : str) -> dict[str, str]:
+    """Get the declared type of each column of a table."""
+    return {r[1]: r[2].upper() for r in db.conn.execute(f"PRAGMA table_info({name})")}
+
+def _default(f : Field, epoch : bool) -> Any:
+    """Get the stored value of a field's default, or None if it has none."""
+    if f.default is not MISSING:
+        val = f.default
+    elif f.default_factory is not MISSING:
+        try:
+            val = f.default_factory()
+        except TypeError:
+            return None
+    else:
+        return None
+    try:
+        return encode(val, f.type, epoch)
+    except ValueError:
+        return None
+
+def _literal(val : Any) -> str:
+    """Format a stored value as a SQL literal for a column default."""
+    if val is None:
+        return "NULL"
+    if isinstance(val, (int, float)):
+        return repr(val)
+    if isinstance(val, bytes):
+        return f"X'{val.hex()}'"
+    return "'" + str(val).replace("'", "''") + "'"
+
+def _convert(val : Any, tp : Any, epoch : bool) -> Any:
+    """Re-encode a stored value for a field's new column type."""
+    try:
+        return encode(decode(val, tp), tp, epoch)
+    except (ValueError, TypeError):
+        return val
+
+def _begin(db : DBCfg) -> None:
+    """Start a transaction, unless the caller already has one open."""
+    if not db.conn.in_transaction:
+        db.conn.execute("BEGIN")
+
+def _field_types(table : type[DataTable]) -> dict[str, Any]:
+    """Get the stored fields of a DataTable class and their types."""
+    return {f.name: f.type for f in fields(table) if f.name not in ('db', 'id')}
+
+def _plan_table(db : DBCfg, table : type[DataTable]) -> list[MigrationStep]:
+    """Get the steps that bring one table up to date with its class."""
+    name = table_name(table)
+    cols = _columns(db, name)
+    if not cols:
+        # Missing tables are created by the schema registry instead.
+        return []
+    unique = set(table.unique_columns())
+    steps = []
+    for col, tp in _field_types(table).items():
+        new_type = get_sql_type(None, db.epoch_datetimes, tp)
+        if col not in cols:
+            action = "rebuild" if col in unique else "add"
+            steps.append(MigrationStep(name, action, col, "", new_type))
+        elif cols[col] != new_type:
+            steps.append(MigrationStep(name, "rebuild", col, cols[col], new_type))
+    return steps
+
+def plan_migration(
+    db : DBCfg,
+    tables : Iterable[type[DataTable]] | None=None
+    ) -> list[MigrationStep]:
+    """List the changes needed to bring tables up to date with their classes.
+    
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    tables : iterable of type, optional(default=None)
+        The DataTable classes to check. Defaults to every imported one.
+    
+    Returns
+    -------
+    list : The migration steps, grouped by table.
+    """
+    tables = data_tables() if tables is None else tables
+    return [step for table in tables for step in _plan_table(db, table)]
+
+def _add_columns(db : DBCfg, table : type[DataTable], steps : list[MigrationStep]) -> None:
+    """Add new columns to a table in place, filled with the field defaults."""
+    defaults = {f.name: _default(f, db.epoch_datetimes) for f in fields(table)}
+    for step in steps:
+        logger.debug(f"Migrating {step}")
+        db.conn.execute(f"""
+            ALTER TABLE {step.table} ADD COLUMN {step.column} {step.new_type}
+            DEFAULT {_literal(defaults[step.column])}""")
+
+def _duplicates(
+    db : DBCfg,
+    table : type[DataTable],
+    name : str,
+    tmp : str,
+    cols : list[str],
+    dropped : list[tuple]
+    ) -> tuple[list[tuple[int, int]], dict[int, dict[str, Any]]]:
+    """Match the rows a rebuild left out as duplicates to the rows kept.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : type
+        The DataTable class being rebuilt.
+    name : str
+        The name of the old table.
+    tmp : str
+        The name of the new table.
+    cols : list of str
+        The columns of the new table, 'id' first.
+    dropped : list of tuple
+        The new table's values for each row left out.
+
+    Returns
+    -------
+    tuple : The (dropped ID, kept ID) of each duplicate, and for each
+    kept ID the empty columns to fill from its duplicates.
+    """
+    unique = table.unique_columns()
+    merges, fills = [], {}
+    for row in dropped:
+        values = dict(zip(cols, row))
+        kept = db.conn.execute(
+            f"SELECT {', '.join(cols)} FROM {tmp} "
+            f"WHERE {' AND '.join([f'{c} IS ?' for c in unique])}",
+            [values[c] for c in unique]).fetchone()
+        kept = dict(zip(cols, kept))
+        merges.append((values['id'], kept['id']))
+        filled = fills.setdefault(kept['id'], {})
+        for col in cols[1:]:
+            have, val = filled.get(col, kept[col]), values[col]
+            if col in unique or val in (None, '') or val == have:
+                continue
+            if have in (None, ''):
+                filled[col] = val
+            else:
+                logger.warning(f"Kept {col} of {name} {kept['id']} over that of its "
+                               f"duplicate {values['id']}.")
+    return merges, fills
+
+def _rebuild(
+    db : DBCfg,
+    table : type[DataTable],
+    memory_budget : int,
+    progress : Callable[[str, int, int], None] | None
+    ) -> None:
+    """Copy a table into a new table built from its class, in batches."""
+    name = table_name(table)
+    tmp = f"{name}{REBUILD_SUFFIX}"
+    epoch = db.epoch_datetimes
+    old = _columns(db, name)
+    types = _field_types(table)
+
+    # A copy left by an interrupted run is started over.
+    db.conn.execute(f"DROP TABLE IF EXISTS {tmp}")
+    db.conn.execute(table.table_sql(epoch, tmp))
+    extra = [c for c in old if c not in types and c != 'id']
+    for col in extra:
+        db.conn.execute(f"ALTER TABLE {tmp} ADD COLUMN {col} {old[col]}")
+
+    copied = ['id'] + [c for c in types if c in old] + extra
+    added = [c for c in types if c not in old]
+    convert = {i: types[c] for i, c in enumerate(copied)
+               if c in types and old[c] != get_sql_type(None, epoch, types[c])}
+    defaults = tuple(_default(f, epoch) for f in fields(table) if f.name in added)
+    compressed = compressed_fields(table)
+
+    def added_values(row : tuple) -> tuple:
+        """Get a row's new columns: derived from the row, or the defaults."""
+        derived = table.derived_values(
+            {c: decompress(v) if c in compressed else decode(v, types[c])
+             for c, v in zip(copied, row) if c in types})
+        return tuple(encode(derived[c], types[c], epoch) if c in derived else d
+                     for c, d in zip(added, defaults))
+
+    def new_row(row : tuple) -> tuple:
+        """Get a row's values for the new table."""
+        return tuple(_convert(v, convert[i], epoch) if i in convert else v
+                     for i, v in enumerate(row)) + added_values(row)
+
+    # Size batches so the rows fetched at once fit in the memory budget.
+    # Python objects take a few times the bytes SQLite stores.
+    row_bytes = db.conn.execute(
+        f"SELECT avg({' + '.join([f'coalesce(length({c}), 8)' for c in copied])}) FROM {name}"
+        ).fetchone()[0] or 1
+    batch_size = int(max(1, min(memory_budget // (row_bytes * 4), MIGRATE_MAX_BATCH)))
+    total = db.conn.execute(f"SELECT count(*) FROM {name}").fetchone()[0]
+    logger.debug(f"Rebuilding {name}: {total} rows in batches of {batch_size}.")
+
+    # A new unique key can make rows that were distinct duplicates. The
+    # first of each is kept, and the others are merged into it below.
+    insert = (f"INSERT OR IGNORE INTO {tmp}({', '.join(copied + added)}) "
+              f"VALUES({', '.join(['?'] * (len(copied) + len(added)))})")
+    select = (f"SELECT {', '.join(copied)} FROM {name} "
+              f"WHERE id > ? ORDER BY id LIMIT {batch_size}")
+    done, last = 0, -1
+    while True:
+        rows = db.conn.execute(select, (last,)).fetchall()
+        if not rows:
+            break
+        db.conn.executemany(insert, [new_row(row) for row in rows])
+        db.conn.commit()
+        done += len(rows)
+        last = rows[-1][0]
+        if progress:
+            progress(name, done, total)
+
+    merges, fills = _duplicates(db, table, name, tmp, copied + added,
+                                [new_row(row) for row in db.conn.execute(
+                                    f"SELECT {', '.join(copied)} FROM {name} "
+                                    f"WHERE id NOT IN (SELECT id FROM {tmp})")])
+
+    # Merge the duplicates and swap the tables in a transaction the caller
+    # commits. Views of the table would block the rename, so they are
+    # dropped and put back with the triggers.
+    _begin(db)
+    if merges:
+        repointed = repoint_links(db, name, merges)
+        for id, filled in fills.items():
+            if filled:
+                db.conn.execute(
+                    f"UPDATE {tmp} SET {', '.join([f'{c} = ?' for c in filled])} WHERE id = ?",
+                    (*filled.values(), id))
+        logger.warning(f"Merged {len(merges)} duplicate rows of {name} into the rows kept, "
+                       f"repointing {repointed} links: {merges}")
+    views = db.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'view' AND sql LIKE ?",
+        (f"%{name}%",)).fetchall()
+    for (view,) in views:
+        db.conn.execute(f"DROP VIEW {view}")
+    db.conn.execute(f"DROP TABLE {name}")
+    db.conn.execute(f"ALTER TABLE {tmp} RENAME TO {name}")
+
+def migrate_schema(
+    db : DBCfg,
+    tables : Iterable[type[DataTable]] | None=None,
+    dry_run : bool=False,
+    memory_budget : int=MIGRATE_MEMORY_BUDGET,
+    progress : Callable[[str, int, int], None] | None=None
+    ) -> list[MigrationStep]:
+    """Bring tables up to date with their DataTable classes.
+    
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    tables : iterable of type, optional(default=None)
+        The DataTable classes to migrate. Defaults to every imported one.
+    dry_run : bool, optional(default=False)
+        If true, only list the steps that would be applied.
+    memory_budget : int, optional(default=MIGRATE_MEMORY_BUDGET)
+        The bytes of rows to hold in memory at once when rebuilding.
+    progress : callable, optional(default=None)
+        Called with (table name, rows copied, rows total) after each
+        batch of a rebuild.
+    
+    Returns
+    -------
+    list : The migration steps applied, or to apply for a dry run.
+    """
+    tables = data_tables() if tables is None else list(tables)
+    plans = [(t, _plan_table(db, t)) for t in tables]
+    plans = [(t, steps) for t, steps in plans if steps]
+    applied = [step for _, steps in plans for step in steps]
+    if dry_run or not applied:
+        for step in applied:
+            logger.debug(f"Would migrate {step}")
+        return applied
+
+    version = schema_version(db) + 1
+    db.conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            version INTEGER NOT NULL,
+            tbl TEXT NOT NULL,
+            action TEXT NOT NULL,
+            col TEXT NOT NULL,
+            old_type TEXT NOT NULL,
+            new_type TEXT NOT NULL,
+            applied TEXT NOT NULL
+            );""")
+    for table, steps in plans:
+        if any(step.action == "rebuild" for step in steps):
+            _rebuild(db, table, memory_budget, progress)
+        else:
+            _begin(db)
+            _add_columns(db, table, steps)
+        db.conn.executemany(f"""
+            INSERT INTO {MIGRATIONS_TABLE}
+            VALUES (?, ?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%S', 'now'))""",
+            [(version, s.table, s.action, s.column, s.old_type, s.new_type) for s in steps])
+        db.conn.commit()
+
+    db.conn.execute(f"PRAGMA user_version = {version}")
+    db.conn.commit()
+    logger.debug(f"Migrated to schema version {version}.")
+
+    # Put back the triggers and indexes dropped with rebuilt tables.
+    forget_schema(db)
+    ensure_schema(db, [t for t, _ in plans])
+    return applied
@@ -0,0 +1,214 @@
+"""
+Schema Module
+
+Create each table's schema once per database.
+
+Table definitions are built from the dataclass field types, so they
+don't depend on any instance's values. The first time a table is used
+with a database, its table, constraints, indexes and triggers are
+created. The table is then remembered as verified for that database
+file, and later requests to create it return immediately.
+
+"""
+
+# Library imports
+from typing      import Any, Callable, Iterable, Iterator
+from inspect     import isabstract
+from abc         import ABC
+from loguru      import logger
+import os
+
+# Module imports
+from .config     import DBCfg
+from .datatable  import DataTable, RelTable
+
+# Constants
+MERGE_TABLE = "row_merges"
+
+# Database file (or connection, for in-memory databases) -> verified table names
+_verified: dict[Any, set[str]] = {}
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def _subclasses(cls : type) -> Iterator[type]:
+    """Recursively yield every subclass of a class."""
+    for sub in cls.__subclasses__():
+        yield sub
+        yield from _subclasses(sub)
+
+def data_tables() -> list[type]:
+    """Get every concrete DataTable subclass that has been imported.
+
+    Base classes that declare ABC directly, such as Creator, are left
+    out even when they have no abstract methods left.
+    """
+    return list(dict.fromkeys(
+        c for c in _subclasses(DataTable) if not isabstract(c) and ABC not in c.__bases__))
+
+def rel_tables() -> list[type]:
+    """Get every RelTable subclass that maps two named tables."""
+    return list(dict.fromkeys(
+        c for c in _subclasses(RelTable) if hasattr(c, "table_name")))
+
+def table_name(table : type) -> str:
+    """Get the SQL table name of a DataTable or RelTable class."""
+    if issubclass(table, RelTable):
+        return table.table_name
+    return f"{table.__name__}s"
+
+def schema_key(db : DBCfg) -> Any:
+    """Get the key that identifies a database in the verified registry.
+
+    File databases are keyed by their absolute path, so every connection
+    to a file shares one entry. In-memory databases are private to their
+    connection, so they are keyed by the connection.
+    """
+    path = db.conn.execute("PRAGMA database_list").fetchone()[2]
+    return os.path.realpath(path) if path else db.conn
+
+def ensure_schema(db : DBCfg, tables : Iterable[type]) -> list[str]:
+    """Create the schema of any tables not yet verified for a database.
+
+    All of the new schemas are created in a single transaction.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    tables : iterable of type
+        The DataTable and RelTable classes to verify.
+
+    Returns
+    -------
+    list : The names of the tables verified by this call.
+    """
+    verified = _verified.setdefault(schema_key(db), set())
+    todo = [t for t in dict.fromkeys(tables) if table_name(t) not in verified]
+    if not todo:
+        return []
+
+    names = [table_name(t) for t in todo]
+    logger.debug(f"Verifying schemas: {', '.join(names)}")
+    owner = not db.conn.in_transaction
+    if owner:
+        db.conn.execute("BEGIN")
+    try:
+        for table in todo:
+            table.create_schema(db)
+    except Exception:
+        if owner:
+            db.conn.rollback()
+        raise
+    if owner:
+        db.conn.commit()
+
+    verified.update(names)
+    return names
+
+def create_all(db : DBCfg) -> list[str]:
+    """Create the schema of every imported table, for application startup.
+
+    A new, empty database is set up to reclaim free pages with
+    incremental vacuum.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    list : The names of the tables verified by this call.
+    """
+    if not db.conn.execute("SELECT 1 FROM sqlite_master").fetchone():
+        # Only takes effect before the first table is created.
+        db.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    return ensure_schema(db, data_tables() + rel_tables())
+
+def forget_schema(db : DBCfg) -> None:
+    """Forget which tables were verified for a database.
+
+    Call this after dropping or replacing tables outside the registry, so
+    the next create() rebuilds them.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    None
+    """
+    _verified.pop(schema_key(db), None)
+
+# ---------------------------------------------------------------------
+# Links ---------------------------------------------------------------
+
+def rel_links(db : DBCfg, table : str) -> list[tuple[str, str, str]]:
+    """Get each relational table linking to a table, with its two ID columns."""
+    found = []
+    for rel in rel_tables():
+        for name, other in ((rel.a_name, rel.b_name), (rel.b_name, rel.a_name)):
+            if f"{name}s" == table.lower():
+                found.append((rel.table_name, f"{name}_id", f"{other}_id"))
+    tables = {i[0] for i in db.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [i for i in found if i[0] in tables]
+
+def repoint_links(
+    db : DBCfg,
+    table : str,
+    merges : list[tuple[int, int]],
+    progress : Callable[[str, int, int], None] | None=None
+    ) -> int:
+    """Move the links of rows being merged onto the rows they merge into.
+
+    Links the kept row already has, or gets from another merged row, are
+    dropped rather than repeated. The merges are left in the temporary
+    MERGE_TABLE (old_id, new_id) for the rest of the caller's
+    transaction, which the caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the table whose rows are merged.
+    merges : list of tuple
+        The (old ID, kept ID) of each row merged.
+    progress : callable, optional(default=None)
+        Called with (link table name, tables done, total tables).
+
+    Returns
+    -------
+    int : The number of links repointed.
+    """
+    db.conn.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {MERGE_TABLE} (
+            old_id INTEGER PRIMARY KEY,
+            new_id INTEGER NOT NULL)""")
+    db.conn.execute(f"DELETE FROM temp.{MERGE_TABLE}")
+    db.conn.executemany(f"INSERT INTO temp.{MERGE_TABLE} VALUES (?, ?)", merges)
+
+    links = rel_links(db, table)
+    repointed = 0
+    for done, (rel, col, other) in enumerate(links, 1):
+        # Drop the links that would repeat one the kept row has or will
+        # have, then repoint the rest. (An UPDATE OR IGNORE would also
+        # override the conflict handling of the triggers on the table.)
+        db.conn.execute(f"""
+            DELETE FROM {rel} WHERE rowid IN (
+                SELECT r.rowid FROM {rel} r JOIN temp.{MERGE_TABLE} m ON m.old_id = r.{col}
+                WHERE EXISTS (SELECT 1 FROM {rel} k
+                              WHERE k.{col} = m.new_id AND k.{other} = r.{other})
+                   OR r.rowid > (
+                      SELECT min(d.rowid) FROM {rel} d
+                      JOIN temp.{MERGE_TABLE} n ON n.old_id = d.{col}
+                      WHERE n.new_id = m.new_id AND d.{other} = r.{other}))""")
+        repointed += db.conn.execute(f"""
+            UPDATE {rel} SET {col} = m.new_id
+            FROM temp.{MERGE_TABLE} m WHERE {rel}.{col} = m.old_id""").rowcount
+        if progress:
+            progress(rel, done, len(links))
+    return repointed
@@ -0,0 +1,250 @@
+"""
+Search Module
+
+Full-text search over data table text columns using SQLite FTS5.
+
+Each searchable table gets an external-content FTS5 index named
+'<table>_fts' that stores only the inverted index, not a second copy
+of the text. Triggers keep the index in sync with the table. Tables
+with compressed columns are indexed through a view of their text.
+
+"""
+
+# Library imports
+from typing      import Iterable
+from dataclasses import dataclass
+from loguru      import logger
+import re
+
+# Module imports
+from .config     import DBCfg
+from .compress   import text_sql
+
+# Constants
+SEARCH_SUFFIX = "_fts"
+SEARCH_TEXT_SUFFIX = "_text"
+SEARCH_TOKENIZER = "porter unicode61 remove_diacritics 2"
+SEARCH_HIGHLIGHT = ("**", "**")
+SEARCH_ELLIPSIS = "..."
+SEARCH_SNIPPET_TOKENS = 16
+
+# ---------------------------------------------------------------------
+# SearchResult Class --------------------------------------------------
+
+@dataclass
+class SearchResult():
+    """A single ranked search match.
+
+    Attributes
+    ----------
+    kind : str
+        The kind of item matched (quote, book, author, etc.).
+    id : int
+        The ID of the matched item in its data table.
+    rank : float
+        The bm25 rank of the match. Lower is a better match.
+    snippet : str
+        The best matching text with the matched terms highlighted.
+    """
+    kind: str
+    id: int
+    rank: float
+    snippet: str
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def index_search(
+    db : DBCfg,
+    table : str,
+    cols : Iterable[str],
+    compressed : Iterable[str]=()
+    ) -> None:
+    """Add a full-text index over a table's columns if it does not exist.
+
+    Triggers on the table keep the index in sync on insert, update and
+    delete. Rows already in the table are indexed when the index is
+    first created. Compressed columns are indexed, and read back for
+    snippets, through a view of their text. The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the table to index. It must have an integer 'id'
+        primary key.
+    cols : iterable of str
+        The text columns to index.
+    compressed : iterable of str, optional(default=())
+        The columns that may hold compressed text.
+
+    Returns
+    -------
+    None
+    """
+    cols = list(cols)
+    compressed = set(compressed)
+    fts = f"{table}{SEARCH_SUFFIX}"
+    content = f"{table}{SEARCH_TEXT_SUFFIX}" if compressed else table
+    col_str = ", ".join(cols)
+
+    def values(ref : str) -> str:
+        return ", ".join([text_sql(f"{ref}.{c}") if c in compressed else f"{ref}.{c}"
+                          for c in cols])
+
+    old = db.cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+        ).fetchone()
+    exists = old is not None and f"content='{content}'" in old[0]
+    if old and not exists:
+        # Indexed from the table itself before its text was compressed.
+        logger.debug(f"Reindexing {fts} from {content}.")
+        db.cursor.execute(f"DROP TABLE {fts}")
+        for op in ("insert", "delete", "update"):
+            db.cursor.execute(f"DROP TRIGGER IF EXISTS {fts}_{op}")
+    if compressed:
+        text_cols = ", ".join([f"{text_sql(c)} AS {c}" if c in compressed else c for c in cols])
+        db.cursor.execute(f"""
+            CREATE VIEW IF NOT EXISTS {content} AS SELECT id, {text_cols} FROM {table}""")
+    if not exists:
+        logger.debug(f"Creating full-text index {fts} over {table}({col_str}).")
+        db.cursor.execute(f"""
+            CREATE VIRTUAL TABLE {fts} USING fts5(
+                {col_str},
+                content='{content}',
+                content_rowid='id',
+                tokenize='{SEARCH_TOKENIZER}',
+                prefix='2 3'
+                );""")
+
+    # The triggers are dropped with the table, so check them every time.
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {fts}(rowid, {col_str}) VALUES (new.id, {values('new')});
+        END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO {fts}({fts}, rowid, {col_str})
+            VALUES ('delete', old.id, {values('old')});
+        END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table}
+        BEGIN
+            INSERT INTO {fts}({fts}, rowid, {col_str})
+            VALUES ('delete', old.id, {values('old')});
+            INSERT INTO {fts}(rowid, {col_str}) VALUES (new.id, {values('new')});
+        END;""")
+
+    # Index any rows written before the index existed.
+    if not exists:
+        db.cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+def search_kinds(db : DBCfg) -> dict[str, str]:
+    """Get the searchable kinds of items in a database.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    dict : The full-text index table name of each kind.
+    """
+    rows = db.cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND sql LIKE ?",
+        ("CREATE VIRTUAL TABLE % USING fts5%",)
+        ).fetchall()
+    kinds = {}
+    for (name,) in rows:
+        if name.endswith(SEARCH_SUFFIX):
+            # Kinds are named by the singular of the table (Quotes -> quote).
+            kinds[name[:-len(SEARCH_SUFFIX)-1].lower()] = name
+    return kinds
+
+def fts_query(text : str) -> str:
+    """Convert free text into a safe FTS5 query.
+
+    Every word must appear in the match. The last word also matches
+    as a prefix so results show up while the query is still typed.
+
+    Parameters
+    ----------
+    text : str
+        The free text to search for.
+
+    Returns
+    -------
+    str : An FTS5 MATCH expression.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return ""
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+# ---------------------------------------------------------------------
+# Search functions ----------------------------------------------------
+
+def search(
+    db : DBCfg,
+    query : str,
+    kinds : Iterable[str] | None=None,
+    limit : int=20,
+    raw : bool=False
+    ) -> list[SearchResult]:
+    """Search the full-text indexes for the best matches to a query.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    query : str
+        The text to search for.
+    kinds : iterable of str, optional(default=None)
+        The kinds of items to search (quote, book, author, etc.).
+        Searches every kind if not given.
+    limit : int, optional(default=20)
+        The maximum number of results to return.
+    raw : bool, optional(default=False)
+        If true, pass the query to FTS5 as written so its full query
+        syntax (OR, NOT, NEAR, column filters) can be used.
+
+    Returns
+    -------
+    list : The matches, best first.
+    """
+    match = query if raw else fts_query(query)
+    if not match:
+        return []
+
+    indexes = search_kinds(db)
+    if kinds is not None:
+        indexes = {k: v for k, v in indexes.items() if k in kinds}
+    if not indexes:
+        logger.debug(f"No full-text indexes to search for {query}.")
+        return []
+
+    # Let FTS5 pick the top matches of each index with its own rank
+    # ordering before merging them.
+    selects = []
+    params = []
+    for kind, fts in indexes.items():
+        selects.append(f"""
+            SELECT * FROM (
+                SELECT '{kind}', rowid, rank,
+                       snippet({fts}, -1, ?, ?, ?, {SEARCH_SNIPPET_TOKENS})
+                FROM {fts} WHERE {fts} MATCH ?
+                ORDER BY rank LIMIT ?
+                )""")
+        params += [*SEARCH_HIGHLIGHT, SEARCH_ELLIPSIS, match, limit]
+    sql = " UNION ALL ".join(selects) + " ORDER BY 3 LIMIT ?"
+    params.append(limit)
+
+    logger.debug(f"Searching {', '.join(indexes)} for {match}.")
+    rows = db.cursor.execute(sql, params).fetchall()
+    return [SearchResult(*row) for row in rows]
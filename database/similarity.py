@@ -0,0 +1,493 @@
+"""
+Similarity Module
+
+An on-disk TF-IDF index for finding texts that resemble each other.
+
+Each document is stored as a sparse row of sub-linear term frequencies
+in CSR form (indptr, indices, data). The arrays live in flat binary
+files that are only ever appended to and are read back memory-mapped,
+so opening an index is cheap and adding documents never rewrites what
+is already stored. Inverse document frequencies are applied at query
+time from a small document-frequency array, so adding documents does
+not invalidate stored rows.
+
+The index follows its source table through the row_changes table (see
+the changes module). `refresh` re-indexes only the rows written since
+the last refresh; it never rescans the source table.
+
+"""
+
+# Library imports
+from typing      import Iterable
+from collections import Counter
+from loguru      import logger
+import numpy as np
+import json
+import math
+import os
+import re
+
+# Module imports
+from .config     import DBCfg
+from .changes    import CHANGES_TABLE
+
+# Constants
+SIMILARITY_BATCH_SIZE = 500
+SIMILARITY_TOKEN = re.compile(r"[^\W\d_]{2,}")
+SIMILARITY_STOPWORDS = frozenset("""
+    a an and are as at be but by for from had has have he her his i if in
+    into is it its me my no not of on or our she so than that the their them
+    then there these they this to was we were what when which who will with
+    you your
+    """.split())
+
+# Array files: name -> (dtype, whether the array starts with a zero)
+_ARRAYS = {
+    "ids":     (np.int64,   False),
+    "groups":  (np.int64,   False),
+    "indptr":  (np.int64,   True),
+    "indices": (np.int32,   False),
+    "data":    (np.float32, False),
+    }
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def tokenize(text : str) -> list[str]:
+    """Split text into lower case words, dropping common stop words."""
+    return [w for w in SIMILARITY_TOKEN.findall(text.lower())
+            if w not in SIMILARITY_STOPWORDS]
+
+def _top_k(scores : np.ndarray, k : int) -> np.ndarray:
+    """Get the positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+# ---------------------------------------------------------------------
+# SimilarityIndex Class -----------------------------------------------
+
+class SimilarityIndex():
+    """A memory-mapped TF-IDF index over the rows of a table.
+
+    Attributes
+    ----------
+    path : str
+        The directory the index files are stored in.
+    source_sql : str
+        A query returning (id, group, text, ...) rows to index. It must
+        contain a '{where}' placeholder for the index to filter on.
+    watch : dict
+        Maps each table whose changes affect the index to a query that
+        turns a list of its changed rowids ('{ids}') into document IDs,
+        or to None if its rowids are the document IDs.
+
+    Methods
+    -------
+    refresh
+        Index the rows written since the last refresh.
+    similar
+        Find the documents most like a stored document.
+    query
+        Find the documents most like a piece of text.
+    similar_groups
+        Find the groups whose documents are most like a group's.
+    compact
+        Rewrite the index files without deleted documents.
+    """
+
+    def __init__(self, path : str, source_sql : str, watch : dict[str, str | None]):
+        self.path = path
+        self.source_sql = source_sql
+        self.watch = watch
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # -----------------------------------------------------------------
+    # Storage ---------------------------------------------------------
+
+    def _file(self, name : str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _load(self) -> None:
+        """Open the index files and read the small in-memory state."""
+        meta_file = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_file):
+            with open(meta_file, "r") as f:
+                self._meta = json.load(f)
+        else:
+            self._meta = {"ndocs": 0, "nnz": 0, "nterms": 0,
+                          "mark": None, "mark_rows": []}
+
+        # Drop anything written past the last saved state.
+        lengths = {"ids": self._meta["ndocs"], "groups": self._meta["ndocs"],
+                   "indptr": self._meta["ndocs"] + 1,
+                   "indices": self._meta["nnz"], "data": self._meta["nnz"]}
+        for name, (dtype, zero) in _ARRAYS.items():
+            size = lengths[name] * np.dtype(dtype).itemsize
+            with open(self._file(name), "ab") as f:
+                if zero and f.tell() == 0:
+                    f.write(np.zeros(1, dtype=dtype).tobytes())
+                    size = f.tell()
+                f.truncate(size)
+
+        vocab_file = os.path.join(self.path, "vocab.txt")
+        if os.path.exists(vocab_file):
+            with open(vocab_file, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+            terms = lines[:self._meta["nterms"]]
+            if len(lines) > len(terms) + 1:
+                with open(vocab_file, "w", encoding="utf-8") as f:
+                    f.write("".join(f"{t}\n" for t in terms))
+        else:
+            terms = []
+        self._terms = {t: i for i, t in enumerate(terms)}
+        self._new_terms = []
+
+        df_file = self._file("df")
+        self._df = np.zeros(len(terms), dtype=np.int64)
+        if os.path.exists(df_file):
+            df = np.fromfile(df_file, dtype=np.int64)
+            self._df[:len(df)] = df[:len(terms)]
+
+        self._map()
+        self._pos = {int(i): p for p, i in enumerate(self._arr["ids"]) if i >= 0}
+        self._norms = None
+
+    def _map(self) -> None:
+        """Memory-map the stored arrays."""
+        self._arr = {}
+        for name, (dtype, _) in _ARRAYS.items():
+            if os.path.getsize(self._file(name)):
+                mode = "r+" if name == "ids" else "r"
+                self._arr[name] = np.memmap(self._file(name), dtype=dtype, mode=mode)
+            else:
+                self._arr[name] = np.empty(0, dtype=dtype)
+
+    def _save_meta(self) -> None:
+        """Write the document frequencies, new terms and counts."""
+        if self._new_terms:
+            with open(os.path.join(self.path, "vocab.txt"), "a", encoding="utf-8") as f:
+                f.write("".join(f"{t}\n" for t in self._new_terms))
+            self._new_terms = []
+        self._df.tofile(self._file("df"))
+        self._meta["nterms"] = len(self._terms)
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    # -----------------------------------------------------------------
+    # Updates ---------------------------------------------------------
+
+    @property
+    def ndocs(self) -> int:
+        """The number of live documents in the index."""
+        return len(self._pos)
+
+    def _remove(self, doc_ids : Iterable[int]) -> None:
+        """Mark documents deleted and drop their terms from the counts."""
+        for doc_id in doc_ids:
+            pos = self._pos.pop(doc_id, None)
+            if pos is None:
+                continue
+            start, end = self._arr["indptr"][pos], self._arr["indptr"][pos + 1]
+            np.subtract.at(self._df, self._arr["indices"][start:end], 1)
+            self._arr["ids"][pos] = -1
+        if isinstance(self._arr["ids"], np.memmap):
+            self._arr["ids"].flush()
+
+    def _append(self, rows : list[tuple]) -> None:
+        """Append (id, group, text, ...) rows as new documents."""
+        indptr, indices, data = [], [], []
+        nnz = self._meta["nnz"]
+        for row in rows:
+            text = " ".join([str(i) for i in row[2:] if i])
+            counts = Counter(tokenize(text))
+            for term in counts:
+                if term not in self._terms:
+                    self._terms[term] = len(self._terms)
+                    self._new_terms.append(term)
+            cols = np.array([self._terms[t] for t in counts], dtype=np.int32)
+            order = np.argsort(cols)
+            indices.append(cols[order])
+            data.append(1.0 + np.log(np.array(list(counts.values()), dtype=np.float32)[order]))
+            nnz += len(cols)
+            indptr.append(nnz)
+
+        if len(self._df) < len(self._terms):
+            self._df = np.concatenate(
+                (self._df, np.zeros(len(self._terms) - len(self._df), dtype=np.int64)))
+        for cols in indices:
+            self._df[cols] += 1
+
+        arrays = {
+            "ids":     np.array([r[0] for r in rows], dtype=np.int64),
+            "groups":  np.array([r[1] if r[1] is not None else -1 for r in rows], dtype=np.int64),
+            "indptr":  np.array(indptr, dtype=np.int64),
+            "indices": np.concatenate(indices) if indices else np.empty(0, np.int32),
+            "data":    np.concatenate(data).astype(np.float32) if data else np.empty(0, np.float32),
+            }
+        # Write the postings before the row offsets that point into them.
+        for name in ("data", "indices", "indptr", "groups", "ids"):
+            with open(self._file(name), "ab") as f:
+                f.write(arrays[name].tobytes())
+
+        for i, row in enumerate(rows):
+            self._pos[row[0]] = self._meta["ndocs"] + i
+        self._meta["ndocs"] += len(rows)
+        self._meta["nnz"] = nnz
+
+    def _fetch(self, db : DBCfg, doc_ids : list[int] | None) -> Iterable[list[tuple]]:
+        """Read source rows in batches, all of them if doc_ids is None."""
+        cursor = db.conn.cursor()
+        try:
+            if doc_ids is None:
+                cursor.execute(self.source_sql.format(where="1"))
+                while rows := cursor.fetchmany(SIMILARITY_BATCH_SIZE):
+                    yield rows
+                return
+            for i in range(0, len(doc_ids), SIMILARITY_BATCH_SIZE):
+                batch = doc_ids[i:i + SIMILARITY_BATCH_SIZE]
+                where = f"id IN ({','.join('?' * len(batch))})"
+                yield cursor.execute(self.source_sql.format(where=where), batch).fetchall()
+        finally:
+            cursor.close()
+
+    def _changed_ids(self, db : DBCfg) -> tuple[set[int], str | None, list]:
+        """Find the document IDs affected by writes since the last refresh."""
+        mark = self._meta["mark"]
+        seen = {tuple(i) for i in self._meta["mark_rows"]}
+        doc_ids = set()
+        new_mark, new_rows = mark, []
+        for table, map_sql in self.watch.items():
+            rows = db.conn.execute(
+                f"SELECT row_id, changed FROM {CHANGES_TABLE} WHERE tbl = ? AND changed >= ?",
+                (table, mark or "")).fetchall()
+            rows = [r for r in rows if not (r[1] == mark and (table, r[0]) in seen)]
+            for row_id, changed in rows:
+                if new_mark is None or changed > new_mark:
+                    new_mark, new_rows = changed, []
+                if changed == new_mark:
+                    new_rows.append((table, row_id))
+            row_ids = [r[0] for r in rows]
+            if map_sql is None:
+                doc_ids.update(row_ids)
+            elif row_ids:
+                for i in range(0, len(row_ids), SIMILARITY_BATCH_SIZE):
+                    batch = row_ids[i:i + SIMILARITY_BATCH_SIZE]
+                    sql = map_sql.format(ids=",".join("?" * len(batch)))
+                    doc_ids.update(r[0] for r in db.conn.execute(sql, batch))
+        if new_mark == mark:
+            new_rows = [list(i) for i in seen] + new_rows
+        return doc_ids, new_mark, new_rows
+
+    def refresh(self, db : DBCfg) -> int:
+        """Index the rows written since the last refresh.
+
+        The first refresh of an empty index reads the whole source
+        table. Later refreshes only read the rows named in the changes
+        table since the previous one.
+
+        Parameters
+        ----------
+        db : DBCfg (Database Config Object)
+            Contains the SQL database interface.
+
+        Returns
+        -------
+        int : The number of documents added or re-indexed.
+        """
+        tracked = db.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (CHANGES_TABLE,)).fetchone()
+        if not tracked:
+            logger.debug(f"Nothing tracked to index in {self.path}.")
+            return 0
+
+        doc_ids, mark, mark_rows = self._changed_ids(db)
+        if self._meta["mark"] is None and not self._meta["ndocs"]:
+            doc_ids = None
+
+        count = 0
+        if doc_ids is None or doc_ids:
+            self._remove(doc_ids or [])
+            for rows in self._fetch(db, None if doc_ids is None else sorted(doc_ids)):
+                self._append(rows)
+                count += len(rows)
+            self._norms = None
+
+        self._meta["mark"] = mark
+        self._meta["mark_rows"] = [list(i) for i in mark_rows]
+        self._save_meta()
+        self._map()
+        logger.debug(f"Indexed {count} documents in {self.path}.")
+        return count
+
+    def compact(self) -> None:
+        """Rewrite the index files without the deleted documents."""
+        alive = np.asarray(self._arr["ids"]) >= 0
+        lengths = np.diff(self._arr["indptr"])
+        keep = np.repeat(alive, lengths)
+        arrays = {
+            "ids":     np.asarray(self._arr["ids"][alive]),
+            "groups":  np.asarray(self._arr["groups"][alive]),
+            "indptr":  np.concatenate(([0], np.cumsum(lengths[alive]))).astype(np.int64),
+            "indices": np.asarray(self._arr["indices"][keep]),
+            "data":    np.asarray(self._arr["data"][keep]),
+            }
+        self._arr = {}
+        for name, arr in arrays.items():
+            arr.astype(_ARRAYS[name][0]).tofile(self._file(name))
+        self._meta["ndocs"] = len(arrays["ids"])
+        self._meta["nnz"] = int(arrays["indptr"][-1])
+        self._save_meta()
+        self._load()
+        logger.debug(f"Compacted {self.path} to {self.ndocs} documents.")
+
+    # -----------------------------------------------------------------
+    # Queries ---------------------------------------------------------
+
+    def _idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency of every term."""
+        n = self.ndocs
+        return (np.log((1.0 + n) / (1.0 + self._df)) + 1.0).astype(np.float32)
+
+    def _doc_norms(self, idf : np.ndarray) -> np.ndarray:
+        """Euclidean norm of every stored TF-IDF row, cached until the next refresh."""
+        if self._norms is None:
+            weights = self._arr["data"] * idf[self._arr["indices"]]
+            self._norms = np.sqrt(self._row_sums(weights * weights))
+        return self._norms
+
+    def _row_sums(self, values : np.ndarray) -> np.ndarray:
+        """Sum per-posting values into one value per stored row."""
+        indptr = self._arr["indptr"]
+        sums = np.zeros(len(indptr) - 1, dtype=np.float64)
+        if not len(values):
+            return sums
+        full = indptr[:-1] < indptr[1:]
+        sums[full] = np.add.reduceat(values, indptr[:-1][full])
+        return sums
+
+    def _scores(self, qvec : np.ndarray) -> np.ndarray:
+        """Cosine similarity of a dense query vector to every stored row."""
+        idf = self._idf()
+        qvec = qvec * idf
+        qnorm = np.linalg.norm(qvec)
+        if not qnorm or not self._meta["ndocs"]:
+            return np.zeros(self._meta["ndocs"])
+        indices = self._arr["indices"]
+        dots = self._row_sums(self._arr["data"] * qvec[indices])
+        norms = self._doc_norms(idf)
+        scores = np.divide(dots, norms * qnorm, out=np.zeros_like(dots), where=norms > 0)
+        scores[self._arr["ids"] < 0] = -1.0
+        return scores
+
+    def _vector(self, pos : int) -> np.ndarray:
+        """The dense term-frequency vector of a stored row."""
+        vec = np.zeros(len(self._terms), dtype=np.float32)
+        start, end = self._arr["indptr"][pos], self._arr["indptr"][pos + 1]
+        vec[self._arr["indices"][start:end]] = self._arr["data"][start:end]
+        return vec
+
+    def _results(self, scores : np.ndarray, k : int, exclude : set[int]) -> list[tuple[int, float]]:
+        ids = self._arr["ids"]
+        top = _top_k(scores, k + len(exclude))
+        return [(int(ids[p]), float(scores[p])) for p in top
+                if scores[p] > 0 and int(ids[p]) not in exclude][:k]
+
+    def similar(self, doc_id : int, k : int=10) -> list[tuple[int, float]]:
+        """Find the stored documents most like a stored document.
+
+        Parameters
+        ----------
+        doc_id : int
+            The ID of the document to compare against.
+        k : int, optional(default=10)
+            The number of documents to return.
+
+        Returns
+        -------
+        list : (id, cosine similarity) of the best matches, best first.
+        """
+        if doc_id not in self._pos:
+            return []
+        scores = self._scores(self._vector(self._pos[doc_id]))
+        return self._results(scores, k, {doc_id})
+
+    def query(self, text : str, k : int=10) -> list[tuple[int, float]]:
+        """Find the stored documents most like a piece of text.
+
+        Parameters
+        ----------
+        text : str
+            The text to compare against.
+        k : int, optional(default=10)
+            The number of documents to return.
+
+        Returns
+        -------
+        list : (id, cosine similarity) of the best matches, best first.
+        """
+        qvec = np.zeros(len(self._terms), dtype=np.float32)
+        for term, count in Counter(tokenize(text)).items():
+            if term in self._terms:
+                qvec[self._terms[term]] = 1.0 + math.log(count)
+        return self._results(self._scores(qvec), k, set())
+
+    def similar_groups(self, group : int, k : int=10) -> list[tuple[int, float]]:
+        """Find the groups whose documents are most like a group's.
+
+        A group is represented by the sum of its documents' normalized
+        TF-IDF rows, so every document counts equally.
+
+        Parameters
+        ----------
+        group : int
+            The group to compare against.
+        k : int, optional(default=10)
+            The number of groups to return.
+
+        Returns
+        -------
+        list : (group, cosine similarity) of the best matches, best first.
+        """
+        groups = np.asarray(self._arr["groups"])
+        live = (self._arr["ids"] >= 0) & (groups >= 0)
+        if not live[groups == group].any():
+            return []
+
+        idf = self._idf()
+        norms = self._doc_norms(idf)
+        indptr = self._arr["indptr"]
+        lengths = np.diff(indptr)
+        # Every posting's TF-IDF weight divided by its row's norm.
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        weights = self._arr["data"] * idf[self._arr["indices"]]
+        weights = np.divide(weights, norms[rows], out=np.zeros_like(weights),
+                            where=norms[rows] > 0)
+        keep = live[rows]
+
+        # Sum the rows of each group into a sparse group-by-term matrix.
+        nterms = max(len(self._terms), 1)
+        keys = groups[rows[keep]] * nterms + self._arr["indices"][keep]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=weights[keep])
+        key_groups, key_terms = keys // nterms, keys % nterms
+
+        target = np.zeros(nterms)
+        mine = key_groups == group
+        target[key_terms[mine]] = sums[mine]
+
+        labels, start = np.unique(key_groups, return_index=True)
+        dots = np.add.reduceat(sums * target[key_terms], start)
+        gnorms = np.sqrt(np.add.reduceat(sums * sums, start))
+        denom = gnorms * np.linalg.norm(target)
+        scores = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+        scores[labels == group] = -1.0
+
+        top = _top_k(scores, k)
+        return [(int(labels[p]), float(scores[p])) for p in top if scores[p] > 0]
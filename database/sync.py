@@ -0,0 +1,317 @@
+"""
+Sync Module
+
+Two-way sync between library files, exchanging only the rows changed
+since the two libraries last synced.
+
+Every write to a data table or relational table is logged in the
+changes table with the row's key. IDs differ between libraries, so
+rows are matched by their unique_ids columns, and links by the keys of
+the rows they join. When both libraries changed the same row, rows
+whose content hashes match need nothing, and otherwise the later change
+wins. Tables without unique_ids can't be matched and are not synced.
+Each library remembers the point in its own change log it last
+synced to with each other library, so a sync reads a number of rows
+proportional to the changes, not the size of the library.
+
+Fields that hold the IDs of other rows, like a reading's source, are
+copied as they are.
+
+"""
+
+# Library imports
+from typing      import Any, Callable
+from dataclasses import dataclass, fields
+from loguru      import logger
+import hashlib
+import json
+import uuid
+
+# Module imports
+from .config     import DBCfg
+from .datatable  import DataTable, RelTable
+from .changes    import CHANGES_TABLE, CHANGES_DATE_FORMAT
+from .events     import bus, Change, INSERT, UPDATE, DELETE
+from .schema     import data_tables, rel_tables, table_name, create_all
+
+# Constants
+SYNC_LIBRARY_TABLE = "sync_library"
+SYNC_PEERS_TABLE = "sync_peers"
+SYNC_TIMEOUT = 30.0
+
+# ---------------------------------------------------------------------
+# SyncReport Class ----------------------------------------------------
+
+@dataclass
+class SyncReport():
+    """What one sync did.
+
+    Attributes
+    ----------
+    sent : int
+        The rows changed in the other library.
+    received : int
+        The rows changed in this library.
+    conflicts : int
+        The rows both libraries changed differently.
+    """
+    sent: int = 0
+    received: int = 0
+    conflicts: int = 0
+
+    def __str__(self):
+        return f"sent {self.sent}, received {self.received}, {self.conflicts} conflicts"
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def library_id(db : DBCfg) -> str:
+    """Get the ID that names a library to the libraries it syncs with.
+
+    The ID is made the first time it is asked for, and is kept if the
+    file is copied, so a copy syncs as the same library.
+    """
+    db.conn.execute(f"CREATE TABLE IF NOT EXISTS {SYNC_LIBRARY_TABLE} (id TEXT NOT NULL)")
+    row = db.conn.execute(f"SELECT id FROM {SYNC_LIBRARY_TABLE}").fetchone()
+    if row:
+        return row[0]
+    lib = uuid.uuid4().hex
+    db.conn.execute(f"INSERT INTO {SYNC_LIBRARY_TABLE}(id) VALUES (?)", (lib,))
+    return lib
+
+def row_hash(values : Any) -> str:
+    """Hash a row's stored values, to compare rows across libraries."""
+    text = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False,
+                      default=lambda v: v.hex() if isinstance(v, bytes) else str(v))
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def _synced(db : DBCfg, peer : str) -> str:
+    """Get the change log time a library last synced with a peer to."""
+    db.conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SYNC_PEERS_TABLE} (
+            peer TEXT PRIMARY KEY,
+            synced TEXT NOT NULL
+            );""")
+    row = db.conn.execute(
+        f"SELECT synced FROM {SYNC_PEERS_TABLE} WHERE peer = ?", (peer,)).fetchone()
+    return row[0] if row else ""
+
+def _mark(db : DBCfg, peer : str) -> None:
+    """Remember that a library is synced with a peer up to now."""
+    db.conn.execute(f"""
+        REPLACE INTO {SYNC_PEERS_TABLE}(peer, synced)
+        VALUES (?, strftime('{CHANGES_DATE_FORMAT}', 'now'))""", (peer,))
+
+def _changes(db : DBCfg, name : str, since : str) -> list[tuple]:
+    """Get (row ID, op, changed, key) for a table's rows changed since a time.
+
+    Rows changed in the same millisecond as the last sync are read again,
+    but rows that already match are never written.
+    """
+    return db.conn.execute(f"""
+        SELECT row_id, op, changed, row_key FROM {CHANGES_TABLE}
+        WHERE tbl = ? AND changed >= ? ORDER BY changed""", (name, since)).fetchall()
+
+def _by_key(changes : list[tuple]) -> dict[tuple, tuple]:
+    """Index changes by their row keys."""
+    return {tuple(json.loads(key)): (op, changed)
+            for _, op, changed, key in changes if key is not None}
+
+def _columns(table : type[DataTable]) -> list[str]:
+    return [f.name for f in fields(table) if f.name not in ('db', 'id')]
+
+def _find(db : DBCfg, table : type[DataTable], key : tuple) -> int | None:
+    """Get the ID of the row with a key, using the table's unique index."""
+    cols = table.unique_columns()
+    where = " AND ".join([f"{c} IS ?" for c in cols])
+    row = db.conn.execute(
+        f"SELECT id FROM {table_name(table)} WHERE {where}", key).fetchone()
+    return row[0] if row else None
+
+def _read(db : DBCfg, table : type[DataTable], id : int) -> tuple | None:
+    cols = ", ".join(_columns(table))
+    return db.conn.execute(
+        f"SELECT {cols} FROM {table_name(table)} WHERE id = ?", (id,)).fetchone()
+
+def _sync_data(
+    src : DBCfg,
+    dst : DBCfg,
+    table : type[DataTable],
+    changes : list[tuple],
+    dst_changes : dict[tuple, tuple],
+    report : SyncReport
+    ) -> list[Change]:
+    """Apply a data table's changes from one library to the other."""
+    name = table_name(table)
+    cols = _columns(table)
+    key_cols = table.unique_columns()
+    applied = []
+    for row_id, op, changed, row_key in changes:
+        if op == "DELETE":
+            if row_key is None:
+                continue
+            key = tuple(json.loads(row_key))
+            row = None
+        else:
+            row = _read(src, table, row_id)
+            if row is None:
+                continue
+            key = tuple(row[cols.index(c)] for c in key_cols)
+
+        found = _find(dst, table, key)
+        mine = _read(dst, table, found) if found is not None else None
+        if row is None and mine is None:
+            continue
+        if row is not None and mine is not None and row_hash(row) == row_hash(mine):
+            continue
+        ours = dst_changes.get(key)
+        if ours is not None:
+            # Both libraries changed the row since they last synced.
+            if changed < ours[1]:
+                logger.debug(f"Kept {name} {key}, changed later here.")
+                continue
+            # Counted once, by the side whose change wins.
+            report.conflicts += 1
+
+        if row is None:
+            dst.conn.execute(f"DELETE FROM {name} WHERE id = ?", (found,))
+            applied.append(Change(DELETE, table, found))
+        elif found is None:
+            cursor = dst.conn.execute(
+                f"INSERT INTO {name}({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                row)
+            applied.append(Change(INSERT, table, cursor.lastrowid))
+        else:
+            sets = ", ".join([f"{c} = ?" for c in cols])
+            dst.conn.execute(f"UPDATE {name} SET {sets} WHERE id = ?", row + (found,))
+            applied.append(Change(UPDATE, table, found))
+    return applied
+
+def _ref(table : type[RelTable], side : str) -> type[DataTable]:
+    """Get the data table a relational table column links to."""
+    name = f"{getattr(table, f'{side}_name')}s".lower()
+    return next(t for t in data_tables() if table_name(t).lower() == name)
+
+def _translate(src : DBCfg, dst : DBCfg, table : type[DataTable], id : int) -> int | None:
+    """Get the ID in one library of a row from another, matched by key."""
+    cols = table.unique_columns()
+    if not cols:
+        return None
+    row = src.conn.execute(
+        f"SELECT {', '.join(cols)} FROM {table_name(table)} WHERE id = ?", (id,)).fetchone()
+    return _find(dst, table, row) if row else None
+
+def _sync_links(
+    src : DBCfg,
+    dst : DBCfg,
+    table : type[RelTable],
+    changes : list[tuple],
+    report : SyncReport
+    ) -> list[Change]:
+    """Apply a relational table's changes from one library to the other."""
+    name = table.table_name
+    a_col, b_col = f"{table.a_name}_id", f"{table.b_name}_id"
+    a_table, b_table = _ref(table, "a"), _ref(table, "b")
+    applied = []
+    for row_id, op, changed, row_key in changes:
+        if op == "DELETE":
+            if row_key is None:
+                continue
+            a, b = json.loads(row_key)
+        else:
+            row = src.conn.execute(
+                f"SELECT {a_col}, {b_col} FROM {name} WHERE rowid = ?", (row_id,)).fetchone()
+            if row is None:
+                continue
+            a, b = row
+        a, b = _translate(src, dst, a_table, a), _translate(src, dst, b_table, b)
+        if a is None or b is None:
+            logger.debug(f"Skipped a {name} link to a row missing from one library.")
+            continue
+        if op == "DELETE":
+            row = dst.conn.execute(
+                f"DELETE FROM {name} WHERE {a_col} = ? AND {b_col} = ? RETURNING rowid",
+                (a, b)).fetchone()
+            if row:
+                applied.append(Change(DELETE, table, row[0]))
+        else:
+            cursor = dst.conn.execute(
+                f"INSERT OR IGNORE INTO {name}({a_col}, {b_col}) VALUES (?, ?)", (a, b))
+            if cursor.rowcount:
+                applied.append(Change(INSERT, table, cursor.lastrowid))
+    return applied
+
+def sync(
+    db : DBCfg,
+    other : DBCfg,
+    progress : Callable[[str, int, int], None] | None=None
+    ) -> SyncReport:
+    """Exchange the rows two libraries changed since they last synced.
+
+    Both libraries are locked for writing while they sync, and either
+    every change is applied or none is.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        This library.
+    other : DBCfg (Database Config Object)
+        The library to sync with.
+    progress : callable, optional(default=None)
+        Called with (table name, tables done, tables total) after each table.
+
+    Returns
+    -------
+    SyncReport : The rows sent, received and in conflict.
+    """
+    create_all(db)
+    create_all(other)
+    for lib in (db, other):
+        lib.conn.execute(f"PRAGMA busy_timeout = {int(SYNC_TIMEOUT * 1000)}")
+        lib.conn.commit()
+        lib.conn.execute("BEGIN IMMEDIATE")
+
+    report = SyncReport()
+    published = []
+    try:
+        here, there = library_id(db), library_id(other)
+        ours_since, theirs_since = _synced(db, there), _synced(other, here)
+        logger.debug(f"Syncing {db.db} since {ours_since or 'the start'} with "
+                     f"{other.db} since {theirs_since or 'the start'}.")
+
+        # Data tables first, so links can find the rows they join.
+        tables = data_tables() + rel_tables()
+        for done, table in enumerate(tables, 1):
+            name = table_name(table)
+            ours = _changes(db, name, ours_since)
+            theirs = _changes(other, name, theirs_since)
+            if issubclass(table, RelTable):
+                sent = _sync_links(db, other, table, ours, report)
+                received = _sync_links(other, db, table, theirs, report)
+            elif not table.unique_columns():
+                logger.debug(f"Skipped {name}, which has no unique key to match rows by.")
+                continue
+            else:
+                # Read both sides before writing either, as writes log changes.
+                ours_keys, theirs_keys = _by_key(ours), _by_key(theirs)
+                sent = _sync_data(db, other, table, ours, theirs_keys, report)
+                received = _sync_data(other, db, table, theirs, ours_keys, report)
+            report.sent += len(sent)
+            report.received += len(received)
+            published += received
+            if progress:
+                progress(name, done, len(tables))
+
+        # Everything logged so far, including the changes just applied,
+        # is now in both libraries.
+        _mark(db, there)
+        _mark(other, here)
+    except Exception:
+        db.conn.rollback()
+        other.conn.rollback()
+        raise
+    other.conn.commit()
+    db.conn.commit()
+    bus.publish(published)
+    logger.debug(f"Synced {db.db} with {other.db}: {report}")
+    return report
@@ -0,0 +1,303 @@
+"""
+Writer Module
+
+A write-behind queue that saves objects on a dedicated writer thread.
+
+Callers queue saves and links and get a Future back straight away. The
+writer thread takes whatever writes are waiting, applies them in one
+transaction on its own connection, and resolves each Future once the
+transaction commits and its changes are published. A failed write is
+rolled back on its own, so the rest of its batch still commits. The
+caller never waits on the disk.
+
+An object handed to the writer belongs to it until its Future is done.
+In-memory databases can't be shared with the writer's connection, so
+their writes are applied straight away instead.
+
+"""
+
+# Library imports
+from typing             import Any
+from concurrent.futures import Future
+from dataclasses        import dataclass, field
+from loguru             import logger
+import queue
+import sqlite3
+import threading
+import time
+
+# Module imports
+from .config     import DBCfg
+from .datatable  import DataTable, RelTable
+from .events     import bus, Change, INSERT, UPDATE
+
+# Constants
+WRITER_BATCH_SIZE = 200
+WRITER_LINGER = 0.005
+WRITER_TIMEOUT = 30.0
+ERROR_WRITER_CLOSED = "The writer is closed! Cannot queue {KEY_OP}"
+ERROR_NOT_SAVED = "Failed to write {KEY_OP}"
+
+# ---------------------------------------------------------------------
+# WriteOp Class -------------------------------------------------------
+
+@dataclass
+class WriteOp():
+    """A queued write.
+
+    Attributes
+    ----------
+    kind : str
+        'save' to save a DataTable object, 'link' to add a RelTable row,
+        or 'flush' to mark a point in the queue.
+    target : any
+        The DataTable object to save, or the RelTable class to link in.
+    row : tuple
+        The DataTable objects or IDs to link.
+    update : bool
+        For saves, whether to update an object that already has an ID.
+    future : Future
+        Resolved with the saved ID once the write is committed.
+    """
+    kind: str
+    target: Any = None
+    row: tuple = ()
+    update: bool = True
+    future: Future = field(default_factory=Future)
+
+    def __str__(self):
+        if self.kind == "link":
+            return f"link {self.target.table_name} {self.row}"
+        return f"{self.kind} {type(self.target).__name__}"
+
+# ---------------------------------------------------------------------
+# WriteBehind Class ---------------------------------------------------
+
+class WriteBehind():
+    """Save objects in batches on a dedicated writer thread.
+
+    Attributes
+    ----------
+    db : DBCfg (Database Config Object)
+        The database to write to. The writer opens its own connection.
+    batch_size : int
+        The most writes to commit in one transaction.
+    linger : float
+        The seconds to wait for more writes to join a batch.
+
+    Methods
+    -------
+    save
+        Queue an object to save.
+    link
+        Queue a row to add to a relational table.
+    flush
+        Wait until every write queued so far is committed.
+    close
+        Flush the queue and stop the writer thread.
+    """
+
+    def __init__(
+        self,
+        db : DBCfg,
+        batch_size : int=WRITER_BATCH_SIZE,
+        linger : float=WRITER_LINGER
+        ):
+        self.db = db
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue: queue.Queue[WriteOp | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def save(self, obj : DataTable, update : bool=True) -> Future:
+        """Queue an object to save.
+
+        Parameters
+        ----------
+        obj : DataTable
+            The object to save. Its ID is set once it is written.
+        update : bool, optional(default=True)
+            If true, update the object if it already has an ID.
+
+        Returns
+        -------
+        Future : Resolved with the object's ID once it is committed.
+        """
+        return self._submit(WriteOp("save", obj, update=update))
+
+    def link(self, rel : type[RelTable], a : DataTable | int, b : DataTable | int) -> Future:
+        """Queue a row to add to a relational table.
+
+        Objects are linked by the IDs they have when the row is written,
+        so objects queued to save earlier can be linked straight away.
+
+        Parameters
+        ----------
+        rel : type
+            The RelTable class to add the row to.
+        a : DataTable or int
+            The object, or its ID, for the 'a' column.
+        b : DataTable or int
+            The object, or its ID, for the 'b' column.
+
+        Returns
+        -------
+        Future : Resolved with the row's ID once it is committed.
+        """
+        return self._submit(WriteOp("link", rel, (a, b)))
+
+    def flush(self, timeout : float | None=WRITER_TIMEOUT) -> None:
+        """Wait until every write queued so far is committed.
+
+        Parameters
+        ----------
+        timeout : float, optional(default=WRITER_TIMEOUT)
+            The seconds to wait, or None to wait forever.
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        TimeoutError if the writes are not committed in time.
+        """
+        if self._thread is None:
+            return
+        self._submit(WriteOp("flush")).result(timeout)
+
+    def close(self, timeout : float | None=WRITER_TIMEOUT) -> None:
+        """Flush the queue and stop the writer thread.
+
+        Parameters
+        ----------
+        timeout : float, optional(default=WRITER_TIMEOUT)
+            The seconds to wait, or None to wait forever.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                return
+            self._queue.put(None)
+        self._thread.join(timeout)
+        logger.debug("Closed the writer thread.")
+
+    def _submit(self, op : WriteOp) -> Future:
+        """Queue a write, starting the writer thread if needed."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(ERROR_WRITER_CLOSED.format(KEY_OP=op))
+            if self.db.in_memory:
+                # Another connection can't see an in-memory database, so
+                # write it straight away on the caller's connection.
+                self._write(self.db, [op])
+                return op.future
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="anthology-writer", daemon=True)
+                self._thread.start()
+            self._queue.put(op)
+        return op.future
+
+    def _run(self) -> None:
+        """Apply queued writes in batches until closed."""
+        db = DBCfg(self.db.db, epoch_datetimes=self.db.epoch_datetimes)
+        conn = db.conn
+        conn.execute(f"PRAGMA busy_timeout = {int(WRITER_TIMEOUT * 1000)}")
+        logger.debug(f"Started the writer thread on {self.db.db}.")
+
+        stop = False
+        while not stop:
+            op = self._queue.get()
+            if op is None:
+                break
+            batch = [op]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    op = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if op is None:
+                    stop = True
+                    break
+                batch.append(op)
+            try:
+                self._write(db, batch)
+            except Exception as e:
+                # Keep the thread alive, and don't leave callers waiting.
+                logger.error(f"Failed to write a batch of {len(batch)}: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+                for op in batch:
+                    if not op.future.done():
+                        op.future.set_exception(e)
+        conn.close()
+
+    def _apply(self, db : DBCfg, op : WriteOp) -> int:
+        """Apply one write on the writer's connection, without committing."""
+        if op.kind == "save":
+            owner = op.target.db
+            op.target.db = db
+            try:
+                return op.target.save(op.update, commit=False)
+            finally:
+                op.target.db = owner
+        ids = tuple(i.id if isinstance(i, DataTable) else i for i in op.row)
+        if 0 in ids:
+            raise ValueError(f"Cannot {op}: an object was not saved.")
+        return op.target(db).save(ids, commit=False)
+
+    def _write(self, db : DBCfg, batch : list[WriteOp]) -> None:
+        """Apply a batch of writes in one transaction, then resolve them."""
+        results = []
+        new = {id(op) for op in batch if op.kind == "save" and not op.target.id}
+        if not db.conn.in_transaction:
+            db.conn.execute("BEGIN")
+        for op in batch:
+            if op.kind == "flush":
+                results.append((op, 0, None))
+                continue
+            # Roll back a failed write on its own, keeping the rest.
+            db.conn.execute("SAVEPOINT write_op")
+            try:
+                result = self._apply(db, op)
+                if not result:
+                    raise sqlite3.DatabaseError(ERROR_NOT_SAVED.format(KEY_OP=op))
+                db.conn.execute("RELEASE write_op")
+                results.append((op, result, None))
+            except Exception as e:
+                db.conn.execute("ROLLBACK TO write_op")
+                db.conn.execute("RELEASE write_op")
+                results.append((op, 0, e))
+
+        try:
+            db.conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to commit {len(batch)} writes: {e}")
+            db.conn.rollback()
+            results = [(op, 0, e) for op, _, _ in results]
+        else:
+            logger.debug(f"Committed {len(batch)} writes.")
+            bus.publish([
+                Change(INSERT if op.kind == "link" or id(op) in new else UPDATE,
+                       op.target if op.kind == "link" else op.target.__class__, result)
+                for op, result, error in results if error is None and op.kind != "flush"])
+
+        for op, result, error in results:
+            if error is None:
+                op.future.set_result(result)
+            else:
+                # A new object's ID was never committed.
+                if id(op) in new:
+                    op.target.id = 0
+                logger.error(f"Failed to {op}: {error}")
+                op.future.set_exception(error)
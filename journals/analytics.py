@@ -0,0 +1,422 @@
+"""
+Analytics
+
+Reading statistics computed in bulk over every reading session.
+
+Grouping and summing happen in SQL, so only one row per day, book or
+year reaches Python. The remaining maths (paces, streaks, calendar
+grids) runs over NumPy arrays. Results are cached on each database
+configuration and are only recomputed once the database has been
+written since they were cached.
+
+"""
+
+# Package imports
+from typing import Any, Callable
+from dataclasses import dataclass
+from functools import wraps
+from loguru import logger
+import datetime
+import numpy as np
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.datatable import get_sql_value, sql_epoch, sql_datetime
+from .session import Reading
+
+# Constants
+READINGS_TABLE = "Readings"
+MINUTES_SQL = f"({sql_epoch('end_time')} - {sql_epoch('start_time')}) / 60.0"
+PAGES_SQL = "(end_page - start_page)"
+DAY_SQL = f"date({sql_datetime('start_time')})"
+YEAR_SQL = f"CAST(strftime('%Y', {sql_datetime('start_time')}) AS INTEGER)"
+
+# ---------------------------------------------------------------------
+# Result Classes ------------------------------------------------------
+
+@dataclass
+class DailyTotals():
+    """Reading totals for each day with at least one session.
+
+    Attributes
+    ----------
+    days : ndarray of datetime64[D]
+        The days read on, in order.
+    minutes : ndarray of float
+        The minutes read on each day.
+    pages : ndarray of int
+        The pages read on each day.
+    sessions : ndarray of int
+        The number of sessions on each day.
+    """
+    days: np.ndarray
+    minutes: np.ndarray
+    pages: np.ndarray
+    sessions: np.ndarray
+
+@dataclass
+class BookPace():
+    """Reading pace for each book with at least one session.
+
+    Attributes
+    ----------
+    book_ids : ndarray of int
+        The IDs of the books read.
+    minutes : ndarray of float
+        The minutes spent reading each book.
+    pages : ndarray of int
+        The pages read of each book.
+    sessions : ndarray of int
+        The number of sessions spent on each book.
+    pages_per_hour : ndarray of float
+        The pages read per hour of each book.
+    first : ndarray of datetime64[s]
+        The start of the first session on each book.
+    last : ndarray of datetime64[s]
+        The end of the last session on each book.
+    """
+    book_ids: np.ndarray
+    minutes: np.ndarray
+    pages: np.ndarray
+    sessions: np.ndarray
+    pages_per_hour: np.ndarray
+    first: np.ndarray
+    last: np.ndarray
+
+@dataclass
+class YearlyTotals():
+    """Reading totals for each year with at least one session.
+
+    Attributes
+    ----------
+    years : ndarray of int
+        The years read in, in order.
+    minutes : ndarray of float
+        The minutes read in each year.
+    pages : ndarray of int
+        The pages read in each year.
+    sessions : ndarray of int
+        The number of sessions in each year.
+    books : ndarray of int
+        The number of different books read in each year.
+    """
+    years: np.ndarray
+    minutes: np.ndarray
+    pages: np.ndarray
+    sessions: np.ndarray
+    books: np.ndarray
+
+@dataclass
+class LibraryTotals():
+    """Reading totals for each library queried.
+
+    Attributes
+    ----------
+    sources : ndarray of str
+        The aliases of the libraries, in the order they were queried.
+    minutes : ndarray of float
+        The minutes read in each library.
+    pages : ndarray of int
+        The pages read in each library.
+    sessions : ndarray of int
+        The number of sessions in each library.
+    books : ndarray of int
+        The number of different books read in each library.
+    """
+    sources: np.ndarray
+    minutes: np.ndarray
+    pages: np.ndarray
+    sessions: np.ndarray
+    books: np.ndarray
+
+@dataclass
+class Streaks():
+    """Runs of consecutive days with reading.
+
+    Attributes
+    ----------
+    current : int
+        The length in days of the run ending today or yesterday.
+    longest : int
+        The length in days of the longest run.
+    longest_start : datetime.date | None
+        The first day of the longest run.
+    longest_end : datetime.date | None
+        The last day of the longest run.
+    """
+    current: int
+    longest: int
+    longest_start: datetime.date | None
+    longest_end: datetime.date | None
+
+# ---------------------------------------------------------------------
+# Cache ---------------------------------------------------------------
+
+def high_water_mark(db : DBCfg) -> tuple[int, int]:
+    """Get a marker that changes whenever the database is written.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    tuple : PRAGMA data_version, which changes when another connection
+    commits, and the number of rows this connection has changed.
+    """
+    return (db.conn.execute("PRAGMA data_version").fetchone()[0], db.conn.total_changes)
+
+def cached(func : Callable) -> Callable:
+    """Cache a statistic on the database until it is written."""
+
+    @wraps(func)
+    def wrapper(db : DBCfg, *args, **kwargs):
+        # (function, arguments) -> (high-water mark, result)
+        cache = db.cache.setdefault(__name__, {})
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        mark = high_water_mark(db)
+        hit = cache.get(key)
+        if hit and hit[0] == mark:
+            return hit[1]
+        logger.debug(f"Computing {func.__name__} at {mark}.")
+        # Without a Readings table there is nothing to query.
+        found = db.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (READINGS_TABLE,)).fetchone()
+        result = func(db if found else None, *args, **kwargs)
+        cache[key] = (mark, result)
+        return result
+
+    return wrapper
+
+def clear_cache(db : DBCfg) -> None:
+    """Drop every statistic cached for a database."""
+    db.cache.pop(__name__, None)
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def _query(db : DBCfg | None, sql : str, params : tuple=()) -> list[tuple]:
+    """Run an aggregate query, or return no rows if there are no readings."""
+    if db is None:
+        return []
+    return db.conn.execute(sql, params).fetchall()
+
+def _column(rows : list[tuple], col : int, dtype : Any) -> np.ndarray:
+    """Get one column of the query rows as a NumPy array."""
+    return np.array([r[col] for r in rows], dtype=dtype)
+
+def _range_sql(
+    db : DBCfg | None,
+    start : datetime.date | None,
+    end : datetime.date | None
+    ) -> tuple[str, tuple]:
+    """Get a WHERE clause limiting sessions to a range of days."""
+    # Compare the raw column so the start_time index can be used.
+    epoch = db.epoch_datetimes if db else False
+    conds, params = ["1"], []
+    if start is not None:
+        conds.append("start_time >= ?")
+        params.append(get_sql_value(
+            datetime.datetime.combine(start, datetime.time()), epoch))
+    if end is not None:
+        conds.append("start_time < ?")
+        params.append(get_sql_value(
+            datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time()), epoch))
+    return " AND ".join(conds), tuple(params)
+
+# ---------------------------------------------------------------------
+# Statistics ----------------------------------------------------------
+
+@cached
+def daily_totals(
+    db : DBCfg,
+    start : datetime.date | None=None,
+    end : datetime.date | None=None
+    ) -> DailyTotals:
+    """Get the minutes, pages and sessions of each day read.
+
+    Sessions count towards the day they started on.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    start : date, optional(default=None)
+        The first day to include.
+    end : date, optional(default=None)
+        The last day to include.
+
+    Returns
+    -------
+    DailyTotals : The totals of each day, in order.
+    """
+    where, params = _range_sql(db, start, end)
+    rows = _query(db, f"""
+        SELECT {DAY_SQL} AS day, total({MINUTES_SQL}), total({PAGES_SQL}), count(*)
+        FROM {READINGS_TABLE} WHERE {where}
+        GROUP BY day ORDER BY day""", params)
+    return DailyTotals(
+        days=_column(rows, 0, "datetime64[D]"),
+        minutes=_column(rows, 1, np.float64),
+        pages=_column(rows, 2, np.int64),
+        sessions=_column(rows, 3, np.int64),
+        )
+
+@cached
+def book_pace(db : DBCfg) -> BookPace:
+    """Get the reading pace of every book.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    BookPace : The totals and pace of each book, ordered by book ID.
+    """
+    rows = _query(db, f"""
+        SELECT _source_id, total({MINUTES_SQL}), total({PAGES_SQL}), count(*),
+               {sql_datetime('min(start_time)')}, {sql_datetime('max(end_time)')}
+        FROM {READINGS_TABLE} WHERE source_type = 'Book'
+        GROUP BY _source_id ORDER BY _source_id""")
+    minutes = _column(rows, 1, np.float64)
+    pages = _column(rows, 2, np.int64)
+    pace = np.divide(pages * 60.0, minutes, out=np.zeros_like(minutes), where=minutes > 0)
+    return BookPace(
+        book_ids=_column(rows, 0, np.int64),
+        minutes=minutes,
+        pages=pages,
+        sessions=_column(rows, 3, np.int64),
+        pages_per_hour=pace,
+        first=_column(rows, 4, "datetime64[s]"),
+        last=_column(rows, 5, "datetime64[s]"),
+        )
+
+@cached
+def yearly_totals(db : DBCfg) -> YearlyTotals:
+    """Get the minutes, pages, sessions and books of each year read.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    YearlyTotals : The totals of each year, in order.
+    """
+    rows = _query(db, f"""
+        SELECT {YEAR_SQL} AS year, total({MINUTES_SQL}), total({PAGES_SQL}), count(*),
+               count(DISTINCT CASE WHEN source_type = 'Book' THEN _source_id END)
+        FROM {READINGS_TABLE}
+        GROUP BY year ORDER BY year""")
+    return YearlyTotals(
+        years=_column(rows, 0, np.int64),
+        minutes=_column(rows, 1, np.float64),
+        pages=_column(rows, 2, np.int64),
+        sessions=_column(rows, 3, np.int64),
+        books=_column(rows, 4, np.int64),
+        )
+
+def library_totals(db : DBCfg, sources : list[str] | None=None) -> LibraryTotals:
+    """Get the reading totals of the main and attached libraries.
+
+    Every library is summed in one query, in SQL. Totals across the
+    libraries are the sums of the arrays. Attached libraries aren't
+    tracked by the cache, so this is never cached.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface, with libraries attached.
+    sources : list of str, optional(default=None)
+        The aliases of the libraries to sum. Defaults to all of them.
+
+    Returns
+    -------
+    LibraryTotals : The totals of each library.
+    """
+    sql, found = Reading.union_sql(
+        db, f"{MINUTES_SQL} AS minutes, {PAGES_SQL} AS pages, source_type, _source_id",
+        sources=sources)
+    rows = []
+    if found:
+        totals = {row[0]: row for row in _query(db, f"""
+            SELECT source, total(minutes), total(pages), count(*),
+                   count(DISTINCT CASE WHEN source_type = 'Book' THEN _source_id END)
+            FROM ({sql}) GROUP BY source""")}
+        rows = [totals.get(src, (src, 0.0, 0, 0, 0)) for src in found]
+    return LibraryTotals(
+        sources=np.array([row[0] for row in rows], dtype=str),
+        minutes=_column(rows, 1, np.float64),
+        pages=_column(rows, 2, np.int64),
+        sessions=_column(rows, 3, np.int64),
+        books=_column(rows, 4, np.int64),
+        )
+
+def streaks(db : DBCfg, today : datetime.date | None=None) -> Streaks:
+    """Get the current and longest runs of consecutive days read.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    today : date, optional(default=None)
+        The day to measure the current streak to. Defaults to today.
+
+    Returns
+    -------
+    Streaks : The current and longest streaks.
+    """
+    days = daily_totals(db).days
+    if not len(days):
+        return Streaks(0, 0, None, None)
+    today = np.datetime64(today or datetime.date.today(), "D")
+
+    # A new run starts wherever the gap to the previous day isn't one day.
+    breaks = np.flatnonzero(np.diff(days) != np.timedelta64(1, "D")) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(days)])) - 1
+    lengths = ends - starts + 1
+
+    best = int(np.argmax(lengths))
+    current = int(lengths[-1]) if today - days[-1] <= np.timedelta64(1, "D") else 0
+    return Streaks(
+        current=current,
+        longest=int(lengths[best]),
+        longest_start=days[starts[best]].astype(datetime.date),
+        longest_end=days[ends[best]].astype(datetime.date),
+        )
+
+def heatmap(db : DBCfg, year : int, value : str="minutes") -> np.ndarray:
+    """Get a calendar grid of a year's reading for a heatmap.
+
+    Rows are the weeks of the year (starting Monday) and columns are the
+    days of the week. Days outside the year are NaN.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    year : int
+        The year to grid.
+    value : str, optional(default="minutes")
+        The daily total to fill the grid with: minutes, pages or sessions.
+
+    Returns
+    -------
+    ndarray : A (weeks, 7) array of the daily totals.
+    """
+    first = datetime.date(year, 1, 1)
+    last = datetime.date(year, 12, 31)
+    totals = daily_totals(db, first, last)
+
+    offset = first.weekday()
+    ndays = (last - first).days + 1
+    grid = np.full(((ndays + offset + 6) // 7) * 7, np.nan)
+    grid[offset:offset + ndays] = 0.0
+    cells = (totals.days - np.datetime64(first, "D")).astype(np.int64) + offset
+    grid[cells] = getattr(totals, value)
+    return grid.reshape(-1, 7)
@@ -0,0 +1,249 @@
+"""
+Attachment
+
+Binary files, such as cover images, scanned pages and PDFs, attached to
+books and readings.
+
+Attachments are stored in the database as BLOBs, keyed by a hash of
+their content, so a file attached to several records is stored once.
+The data is copied in and out a block at a time (see blobs.py), and is
+never read when attachments are loaded or listed.
+
+Thumbnails of image attachments are made on first request and cached
+in a local table. They need the optional Pillow package.
+
+"""
+
+# Parent class
+from ..database.datatable import *
+from ..database.blobs import hash_file, write_blob, iter_blob, copy_blob, BLOB_BLOCK_SIZE
+
+# Package imports
+from typing import BinaryIO
+import io
+import mimetypes
+import os
+import sqlite3
+
+# Constants
+THUMBNAIL_SIZE = 256
+THUMBNAIL_FORMAT = "PNG"
+THUMBNAILS_TABLE = "attachment_thumbnails"
+DEFAULT_MEDIA_TYPE = "application/octet-stream"
+ERROR_NO_PILLOW = "Thumbnails need the Pillow package! Cannot thumbnail {KEY_NAME}"
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def track_thumbnails(db : DBCfg, table : str) -> None:
+    """Add the thumbnail cache and its delete trigger if they do not exist.
+
+    The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the attachments table.
+
+    Returns
+    -------
+    None
+    """
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {THUMBNAILS_TABLE} (
+            attachment_id INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (attachment_id, size)
+            );""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_thumbnails_delete AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM {THUMBNAILS_TABLE} WHERE attachment_id = OLD.id;
+        END;""")
+
+def _rollback_add(db : DBCfg, owner : bool) -> None:
+    """Undo a failed add, and end the transaction if the add began it."""
+    db.conn.execute("ROLLBACK TO attachment_add")
+    db.conn.execute("RELEASE attachment_add")
+    if owner:
+        db.conn.rollback()
+
+# --------------------------------------------------------------------
+# Attachment Class ---------------------------------------------------
+
+@dataclass
+class Attachment(DataTable):
+    """
+    An attachment is a binary file kept with a record. It consists of:
+    :content_hash:  hash of the file's bytes, its unique key
+    :name:          the file name it was added from
+    :media_type:    the MIME type of the file
+    :size:          the size of the file in bytes
+    :data:          the file's bytes, read only when accessed
+    """
+    content_hash: str = field(metadata={
+        'name': 'Content Hash',
+        'desc': "The SHA-256 hash of the file's bytes."})
+    name: str = field(metadata={
+        'name': 'File Name',
+        'desc': 'The name of the attached file.'})
+    media_type: str = field(metadata={
+        'name': 'Media Type',
+        'desc': 'The MIME type of the attached file.'})
+    size: int = field(metadata={
+        'name': 'Size',
+        'desc': 'The size of the attached file in bytes.'})
+    data: bytes = field(init=False, repr=False, compare=False, metadata={
+        'name': 'Data',
+        'desc': "The attached file's bytes.",
+        'deferred': True})
+
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('content_hash', self.content_hash)]
+
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and the thumbnail cache."""
+        super().create_schema(db)
+        track_thumbnails(db, f"{cls.__name__}s")
+
+    def __str__(self):
+        return f"{self.name} ({self.media_type}, {self.size} bytes)"
+
+    @classmethod
+    def add(
+        cls,
+        db : DBCfg,
+        src : str | os.PathLike | BinaryIO,
+        name : str | None=None,
+        media_type : str | None=None,
+        commit : bool=True
+        ):
+        """Store a file, or find it if the same bytes are already stored.
+
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        src : path or binary file
+            The file to add. Open files must be seekable, and are read
+            from their position.
+        name : str, optional(default=None)
+            The file name to store. Defaults to the name of the file.
+        media_type : str, optional(default=None)
+            The MIME type. Defaults to the one guessed from the name.
+        commit : bool, optional(default=True)
+            If false, leave the write in the open transaction so the
+            caller can commit a batch of writes together. A transaction
+            the caller already has open is never committed here.
+
+        Returns
+        -------
+        Attachment : The stored attachment, or 0 if it could not be saved.
+        """
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, "rb") as fp:
+                return cls.add(db, fp, name or os.path.basename(src), media_type, commit)
+
+        digest, size = hash_file(src)
+        found = cls.load(db, digest, 'content_hash')
+        if found:
+            logger.debug(f"Attachment {found.id} already holds {digest}.")
+            return found
+
+        name = name or os.path.basename(getattr(src, "name", "") or "")
+        media_type = media_type or mimetypes.guess_type(name)[0] or DEFAULT_MEDIA_TYPE
+        item = cls(db, content_hash=digest, name=name, media_type=media_type, size=size)
+        owner = not db.conn.in_transaction
+        if owner:
+            db.conn.execute("BEGIN")
+        # A failed add undoes its own writes, not the caller's.
+        db.conn.execute("SAVEPOINT attachment_add")
+        try:
+            if item.save(commit=False):
+                write_blob(db.conn, f"{cls.__name__}s", "data", item.id, src)
+        except Exception:
+            # The row and its partly written bytes were never committed.
+            item.id = 0
+            _rollback_add(db, owner)
+            raise
+        if not item.id:
+            _rollback_add(db, owner)
+            return 0
+        db.conn.execute("RELEASE attachment_add")
+        item.data = DEFERRED
+        if owner and commit:
+            db.conn.commit()
+            bus.publish([Change(INSERT, cls, item.id)])
+        return item
+
+    def open(self) -> sqlite3.Blob:
+        """Open the attachment's bytes as a read-only file object."""
+        return self.db.conn.blobopen(f"{self.__class__.__name__}s", "data", self.id,
+                                     readonly=True)
+
+    def stream(self, block_size : int=BLOB_BLOCK_SIZE) -> Iterator[bytes]:
+        """Yield the attachment's bytes a block at a time."""
+        return iter_blob(self.db.conn, f"{self.__class__.__name__}s", "data", self.id,
+                         block_size)
+
+    def copy_to(self, out : BinaryIO, block_size : int=BLOB_BLOCK_SIZE) -> int:
+        """Write the attachment's bytes to a file, returning the number written."""
+        return copy_blob(self.db.conn, f"{self.__class__.__name__}s", "data", self.id, out,
+                         block_size)
+
+    def thumbnail(self, size : int=THUMBNAIL_SIZE) -> bytes | None:
+        """Get a PNG thumbnail of an image attachment, made on first request.
+
+        Parameters
+        ----------
+        size : int, optional(default=THUMBNAIL_SIZE)
+            The largest width and height of the thumbnail in pixels.
+
+        Returns
+        -------
+        bytes or None : The thumbnail, or None if the attachment is not
+        an image.
+
+        Raises
+        ------
+        ImportError if Pillow is not installed.
+        """
+        row = self.db.conn.execute(
+            f"SELECT data FROM {THUMBNAILS_TABLE} WHERE attachment_id = ? AND size = ?",
+            (self.id, size)).fetchone()
+        if row:
+            return row[0]
+        if not self.media_type.startswith("image/"):
+            return None
+
+        try:
+            from PIL import Image
+        except ImportError:
+            error_msg = ERROR_NO_PILLOW.format(KEY_NAME=self.name)
+            logger.error(error_msg)
+            raise ImportError(error_msg) from None
+
+        out = io.BytesIO()
+        # Decoded straight from the BLOB, at a reduced scale where the
+        # format allows it.
+        with self.open() as blob, Image.open(blob) as img:
+            img.draft("RGB", (size, size))
+            img.thumbnail((size, size))
+            if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                img = img.convert("RGB")
+            img.save(out, THUMBNAIL_FORMAT)
+        data = out.getvalue()
+        logger.debug(f"Made {size} px thumbnail of Attachment {self.id}: {len(data)} bytes")
+
+        # Only commit the cache write if no caller's transaction is open.
+        owner = not self.db.conn.in_transaction
+        self.db.conn.execute(f"INSERT OR REPLACE INTO {THUMBNAILS_TABLE} VALUES (?, ?, ?)",
+                             (self.id, size, data))
+        if owner:
+            self.db.conn.commit()
+        return data
@@ -9,6 +9,10 @@ from dataclasses import dataclass, Field
 # Parent classes
 from .medium   import *
 from .utils    import oxford_comma_list
+from .progress import BookProgress
+from .display  import track_book_display, book_display, BOOK_DISPLAY_TABLE
+from .session  import Note
+from .attachment import Attachment
 
 # --------------------------------------------------------------------
 # Author Class -------------------------------------------------------
@@ -17,6 +21,12 @@ from .utils    import oxford_comma_list
 class Author(Creator):
     """The author class."""
     
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table, its display names and the book display triggers on it."""
+        super().create_schema(db)
+        track_book_display(db)
+    
     @property
     def book_ids(self) -> list[int]:
         """ Get list of the author's book IDs."""
@@ -74,13 +84,33 @@ class Book(Medium):
     rating: float = field(default=0.0, metadata={
         'name': 'Rating',
         'desc': 'Rating of the book.'})
+    sql_label = "title"
+    search_fields = ("title", "publisher")
     
     def __str__(self):
         """Formatted as <title> by <author>, <location>, <year>"""
         return (
-            f"{self.title} by {oxford_comma_list(self.author)}, {self.publishloc}, {self.publishyear}"
+            f"{self.title} by {self.author_display}, {self.publishloc}, {self.publishyear}"
             )
 
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and the display strings kept for it."""
+        super().create_schema(db)
+        track_book_display(db)
+
+    @classmethod
+    def list_display(cls, db : DBCfg) -> list[tuple[str, int]]:
+        """List every book as (str(book), ID), sorted by author then title.
+
+        Read from the display strings in a single query.
+        """
+        return db.conn.execute(f"""
+            SELECT b.title || ' by ' || coalesce(d.author_display, '') || ', '
+                   || b.publishloc || ', ' || b.publishyear, b.id
+            FROM {cls.__name__}s b LEFT JOIN {BOOK_DISPLAY_TABLE} d ON d.book_id = b.id
+            ORDER BY d.sort_key""").fetchall()
+
     @property
     def unique_ids(self) -> list[tuple]:
         """Unique ID definition for a SQL database table."""
@@ -96,6 +126,34 @@ class Book(Medium):
     def author(self) -> list[str]:
         """Get a list of the book's authors."""
         return BookAuthor.get_book_authors(self.id, self.db)
+
+    @property
+    def author_display(self) -> str:
+        """Get the book's authors as an Oxford comma list."""
+        stored = book_display(self.db, self.id) if self.id else None
+        return stored if stored is not None else oxford_comma_list(self.author)
+
+    @property
+    def category_nodes(self) -> list[tuple[str, int]]:
+        """Get the (table, ID) of every category the book is linked to."""
+        return [(f"{link.category.__name__}s", i) for link in BOOK_CATEGORIES
+                for i in link.get_category_ids(self.id, self.db)]
+
+    @classmethod
+    def in_category(cls, db : DBCfg, category : Category) -> list[int]:
+        """Get the IDs of the books in a category or any category below it.
+
+        Each link table is read through the closure table's index, so
+        the whole subtree is found without walking it.
+        """
+        sql = " UNION ".join(link.under_sql() for link in BOOK_CATEGORIES)
+        return [i[0] for i in db.conn.execute(
+            f"SELECT * FROM ({sql}) ORDER BY 1", category.node * len(BOOK_CATEGORIES))]
+
+    @property
+    def progress(self) -> BookProgress | None:
+        """Get the book's reading progress summary."""
+        return BookProgress.load(self.db, self.id)
     
     def store_entry(self, entry:dict) -> None:
         """Store values from a dictionary into the object."""
@@ -131,6 +189,12 @@ class BookAuthor(MediumCreator):
     b_name = "book"
     table_name = "books_authors"
     
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and the book display triggers on it."""
+        super().create_schema(db)
+        track_book_display(db)
+    
     @classmethod
     def get_book_author_ids(cls, book_id:int, db) -> list[int]:
         """Return a list of author ids associated with a book id."""
@@ -150,4 +214,86 @@ class BookAuthor(MediumCreator):
     def get_author_books(cls, author_id:int, db) -> list[str]:
         """Return a list of book names associated with an author id."""
         return [Book.load(db, i).title for i in cls.get_author_book_ids(author_id, db)]
-    
\ No newline at end of file
+
+# --------------------------------------------------------------------
+# Books <-> Notes Class ----------------------------------------------
+
+@dataclass
+class BookNote(RelTable):
+    """Many to many intermediate table to map books and notes."""
+    a_name = "book"
+    b_name = "note"
+    table_name = "books_notes"
+    
+    @classmethod
+    def get_book_note_ids(cls, book_id:int, db) -> list[int]:
+        """Return a list of note ids associated with a book id."""
+        return cls.lookup_rel_ids(db, book_id, ("a","b"))
+    
+    @classmethod
+    def get_book_notes(cls, book_id:int, db) -> list[Note]:
+        """Return a list of notes associated with a book id, read in one query."""
+        return Note.load_list(
+            db, f"id IN (SELECT note_id FROM {cls.table_name} WHERE book_id = ?)",
+            (book_id,))
+    
+    @classmethod
+    def get_note_book_ids(cls, note_id:int, db) -> list[int]:
+        """Return a list of book ids associated with a note id."""
+        return cls.lookup_rel_ids(db, note_id, ("b","a"))
+
+# --------------------------------------------------------------------
+# Books <-> Attachments Class ----------------------------------------
+
+@dataclass
+class BookAttachment(RelTable):
+    """Many to many intermediate table to map books and attachments."""
+    a_name = "book"
+    b_name = "attachment"
+    table_name = "books_attachments"
+    
+    @classmethod
+    def get_book_attachment_ids(cls, book_id:int, db) -> list[int]:
+        """Return a list of attachment ids associated with a book id."""
+        return cls.lookup_rel_ids(db, book_id, ("a","b"))
+    
+    @classmethod
+    def get_book_attachments(cls, book_id:int, db) -> list[Attachment]:
+        """Return a list of attachments associated with a book id, without their data."""
+        return Attachment.load_list(
+            db, f"id IN (SELECT attachment_id FROM {cls.table_name} WHERE book_id = ?)",
+            (book_id,))
+    
+    @classmethod
+    def get_attachment_book_ids(cls, attachment_id:int, db) -> list[int]:
+        """Return a list of book ids associated with an attachment id."""
+        return cls.lookup_rel_ids(db, attachment_id, ("b","a"))
+
+# --------------------------------------------------------------------
+# Books <-> Categories Classes ---------------------------------------
+
+@dataclass
+class BookGenre(MediumCategory):
+    """Many to many intermediate table to map books and genres."""
+    a_name = "genre"
+    b_name = "book"
+    table_name = "books_genres"
+    category = Genre
+
+@dataclass
+class BookSubGenre(MediumCategory):
+    """Many to many intermediate table to map books and sub-genres."""
+    a_name = "subgenre"
+    b_name = "book"
+    table_name = "books_subgenres"
+    category = SubGenre
+
+@dataclass
+class BookSubject(MediumCategory):
+    """Many to many intermediate table to map books and subjects."""
+    a_name = "subject"
+    b_name = "book"
+    table_name = "books_subjects"
+    category = Subject
+
+BOOK_CATEGORIES = (BookGenre, BookSubGenre, BookSubject)
@@ -0,0 +1,299 @@
+"""
+Dedupe
+
+Find creators entered more than once under differently written names
+and merge them.
+
+Candidate pairs come from the name key index (equal keys), from names
+sharing a surname and first initial, and from the trigram index. Only
+the rarest few trigrams of each name are joined (prefix filtering), so
+only names that are already close are paired rather than every two
+creators. Each
+candidate pair is then compared in Python: names match if their keys
+are equal, if their surnames agree and each given name agrees with the
+other or is its initial, or if their trigrams are similar enough.
+
+Clusters only grow when every name in them matches every other, so
+"J. Smith" can't join "John Smith" and "Jane Smith" into one person.
+
+"""
+
+# Package imports
+from typing import Callable
+from collections import defaultdict, Counter
+from itertools import combinations
+from functools import lru_cache
+from dataclasses import dataclass, fields
+from loguru import logger
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.events import bus, Change, UPDATE, DELETE
+from ..database.schema import (table_name, ensure_schema, rel_links, repoint_links,
+                               MERGE_TABLE)
+from .names import trigrams, NAME_TRIGRAMS_TABLE, NAME_KEY_COLUMN
+from .medium import Creator
+
+# Constants
+DEDUPE_THRESHOLD = 0.7
+NAME_COLUMNS = ("firstname", "midname", "lastname", NAME_KEY_COLUMN)
+
+# ---------------------------------------------------------------------
+# Result Classes ------------------------------------------------------
+
+@dataclass
+class DedupeReport():
+    """What one dedupe run did.
+
+    Attributes
+    ----------
+    clusters : list of list of int
+        The IDs of each group of creators found to be one person, the
+        one kept first.
+    merged : int
+        The creators merged into another and deleted.
+    links : int
+        The links repointed from merged creators.
+    """
+    clusters: list[list[int]]
+    merged: int = 0
+    links: int = 0
+
+    def __str__(self):
+        return (f"{len(self.clusters)} clusters, merged {self.merged} creators, "
+                f"repointed {self.links} links")
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def _initials_match(a : list[str], b : list[str]) -> bool:
+    """Check given names agree, where either may be an initial."""
+    return all(x == y or (len(x) == 1 and y.startswith(x)) or (len(y) == 1 and x.startswith(y))
+               for x, y in zip(a, b))
+
+@lru_cache(maxsize=2**16)
+def _trigrams(key : str) -> frozenset[str]:
+    """Get the trigrams of a name key, cached as each key is compared many times."""
+    return frozenset(trigrams(key))
+
+def similarity(a : str, b : str) -> float:
+    """Get the Jaccard similarity of two name keys' trigrams."""
+    ta, tb = _trigrams(a), _trigrams(b)
+    return len(ta & tb) / len(ta | tb) if ta or tb else 1.0
+
+def same_person(a : str, b : str, threshold : float=DEDUPE_THRESHOLD) -> bool:
+    """Check whether two name keys name the same person.
+
+    Parameters
+    ----------
+    a, b : str
+        The name keys to compare.
+    threshold : float, optional(default=DEDUPE_THRESHOLD)
+        The trigram similarity above which names match regardless of
+        their parts.
+
+    Returns
+    -------
+    bool : True if the names match.
+    """
+    if a == b:
+        return True
+    wa, wb = a.split(), b.split()
+    if len(wa) > 1 and len(wb) > 1 and wa[-1] == wb[-1] and _initials_match(wa[:-1], wb[:-1]):
+        return True
+    # The similarity can't be more than the ratio of the trigram counts.
+    na, nb = len(_trigrams(a)), len(_trigrams(b))
+    if min(na, nb) < threshold * max(na, nb):
+        return False
+    return similarity(a, b) >= threshold
+
+def _candidates(
+    db : DBCfg,
+    table : str,
+    keys : dict[int, str],
+    threshold : float
+    ) -> list[tuple[int, int]]:
+    """Get the pairs of creators that might name the same person.
+
+    Pairs share a name key, a surname and first initial, or two of the
+    rarest trigrams of each name. Names with a trigram similarity of at least the
+    threshold always share two of their rarest few trigrams (prefix
+    filtering), so only those need to be joined.
+    """
+    equal = db.conn.execute(f"""
+        SELECT a.id, b.id FROM {table} a JOIN {table} b
+          ON b.{NAME_KEY_COLUMN} = a.{NAME_KEY_COLUMN} AND b.id > a.id
+        WHERE a.{NAME_KEY_COLUMN} <> ''""").fetchall()
+
+    # Names with a similarity of t share at least t * size trigrams, so
+    # the rarest size - t * size + 2 trigrams of each share at least
+    # two. Rounding the prefix length up keeps every similar pair.
+    postings = defaultdict(list)
+    for i, gram in db.conn.execute(f"""
+        WITH df AS (
+            SELECT trigram, count(*) AS n FROM {NAME_TRIGRAMS_TABLE}
+            WHERE tbl = ? GROUP BY trigram),
+        ranked AS (
+            SELECT t.creator_id, t.trigram,
+                   row_number() OVER (PARTITION BY t.creator_id ORDER BY df.n, t.trigram) AS r,
+                   count(*) OVER (PARTITION BY t.creator_id) AS size
+            FROM {NAME_TRIGRAMS_TABLE} t JOIN df ON df.trigram = t.trigram
+            WHERE t.tbl = ?)
+        SELECT creator_id, trigram FROM ranked
+        WHERE r <= size - CAST(? * size AS INTEGER) + 2""", (table, table, threshold)):
+        postings[gram].append(i)
+    shared = Counter(p for ids in postings.values() for p in combinations(sorted(ids), 2))
+    similar = [p for p, n in shared.items() if n >= 2]
+
+    # The surname rule needs the first given names to agree or be one
+    # the other's initial, so only names with the same first initial are
+    # paired, not every Smith with every other.
+    surnames = defaultdict(list)
+    for i, key in keys.items():
+        words = key.split()
+        if len(words) > 1:
+            surnames[words[-1], words[0][0]].append(i)
+    family = [p for ids in surnames.values() for p in combinations(sorted(ids), 2)]
+    return list(dict.fromkeys(equal + similar + family))
+
+# ---------------------------------------------------------------------
+# Dedupe functions ----------------------------------------------------
+
+def find_clusters(
+    db : DBCfg,
+    creator : type[Creator],
+    threshold : float=DEDUPE_THRESHOLD
+    ) -> list[list[int]]:
+    """Find the groups of creators that name the same person.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    creator : type
+        The Creator class to dedupe, such as Author.
+    threshold : float, optional(default=DEDUPE_THRESHOLD)
+        The trigram similarity above which names match.
+
+    Returns
+    -------
+    list : The IDs of each group of two or more creators. The creator
+        with the most links comes first, then the oldest.
+    """
+    ensure_schema(db, [creator])
+    table = table_name(creator)
+    keys = dict(db.conn.execute(f"SELECT id, {NAME_KEY_COLUMN} FROM {table}"))
+    pairs = [p for p in _candidates(db, table, keys, threshold)
+             if same_person(keys[p[0]], keys[p[1]], threshold)]
+    logger.debug(f"Found {len(pairs)} matching pairs of {table}.")
+
+    # Closest pairs first, so a name joins the cluster it is most like.
+    pairs.sort(key=lambda p: -similarity(keys[p[0]], keys[p[1]]))
+    cluster = {i: [i] for i in keys}
+    for a, b in pairs:
+        ca, cb = cluster[a], cluster[b]
+        if ca is cb or not all(same_person(keys[x], keys[y], threshold)
+                               for x in ca for y in cb):
+            continue
+        ca += cb
+        for i in cb:
+            cluster[i] = ca
+
+    found = {id(c): c for c in cluster.values() if len(c) > 1}.values()
+    counts = {}
+    for rel, col, _ in rel_links(db, table):
+        for i, n in db.conn.execute(f"SELECT {col}, count(*) FROM {rel} GROUP BY {col}"):
+            counts[i] = counts.get(i, 0) + n
+    return sorted((sorted(c, key=lambda i: (-counts.get(i, 0), i)) for c in found),
+                  key=lambda c: c[0])
+
+def merge_clusters(
+    db : DBCfg,
+    creator : type[Creator],
+    clusters : list[list[int]],
+    progress : Callable[[str, int, int], None] | None=None
+    ) -> tuple[int, int]:
+    """Merge each group of creators into its first creator.
+
+    Links to the others are repointed in a few statements per link table
+    (links the kept creator already has are dropped), empty details of
+    the kept creator are filled from the others, and the others are
+    deleted. Everything happens in one transaction.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    creator : type
+        The Creator class to merge, such as Author.
+    clusters : list of list of int
+        The IDs of each group, the creator to keep first.
+    progress : callable, optional(default=None)
+        Called with (table name, tables done, total tables).
+
+    Returns
+    -------
+    tuple : The number of creators merged and of links repointed.
+    """
+    table = table_name(creator)
+    merges = [(old, c[0]) for c in clusters for old in c[1:]]
+    if not merges:
+        return 0, 0
+    details = [f.name for f in fields(creator) if f.name not in ('db', 'id')
+               and f.name not in NAME_COLUMNS and f.type is str]
+
+    if not db.conn.in_transaction:
+        db.conn.execute("BEGIN")
+    try:
+        repointed = repoint_links(db, table, merges, progress)
+        for col in details:
+            db.conn.execute(f"""
+                UPDATE {table} SET {col} = (
+                    SELECT d.{col} FROM temp.{MERGE_TABLE} m JOIN {table} d ON d.id = m.old_id
+                    WHERE m.new_id = {table}.id AND d.{col} <> '' ORDER BY d.id LIMIT 1)
+                WHERE {col} = '' AND id IN (SELECT new_id FROM temp.{MERGE_TABLE})
+                  AND EXISTS (
+                    SELECT 1 FROM temp.{MERGE_TABLE} m JOIN {table} d ON d.id = m.old_id
+                    WHERE m.new_id = {table}.id AND d.{col} <> '')""")
+        merged = db.conn.execute(f"""
+            DELETE FROM {table} WHERE id IN (SELECT old_id FROM temp.{MERGE_TABLE})""").rowcount
+    except Exception:
+        db.conn.rollback()
+        raise
+    db.conn.commit()
+    logger.debug(f"Merged {merged} {table} and repointed {repointed} links.")
+    bus.publish([Change(DELETE, creator, old) for old, _ in merges]
+                + [Change(UPDATE, creator, c[0]) for c in clusters])
+    return merged, repointed
+
+def dedupe(
+    db : DBCfg,
+    creator : type[Creator],
+    threshold : float=DEDUPE_THRESHOLD,
+    dry_run : bool=False,
+    progress : Callable[[str, int, int], None] | None=None
+    ) -> DedupeReport:
+    """Find and merge the creators that name the same person.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    creator : type
+        The Creator class to dedupe, such as Author.
+    threshold : float, optional(default=DEDUPE_THRESHOLD)
+        The trigram similarity above which names match.
+    dry_run : bool, optional(default=False)
+        If true, only find the clusters.
+    progress : callable, optional(default=None)
+        Called with (table name, tables done, total tables) as links
+        are repointed.
+
+    Returns
+    -------
+    DedupeReport : The clusters found and what was merged.
+    """
+    report = DedupeReport(find_clusters(db, creator, threshold))
+    if not dry_run:
+        report.merged, report.links = merge_clusters(db, creator, report.clusters, progress)
+    return report
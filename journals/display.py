@@ -0,0 +1,218 @@
+"""
+Display
+
+Display strings for lists of books and creators, kept current by
+triggers so a list renders from a single SELECT.
+
+Each book's author list (with an Oxford comma) and sort key are kept in
+a display table, refreshed when the book's title, its links to authors,
+or one of its authors' names change. Each creator's 'last, first
+middle' name is kept the same way.
+
+"""
+
+# Package imports
+from loguru import logger
+import sqlite3
+
+# Module imports
+from ..database.config import DBCfg
+
+# Constants
+BOOK_DISPLAY_TABLE = "book_display"
+CREATOR_NAMES_TABLE = "creator_names"
+BOOKS_TABLE = "Books"
+AUTHORS_TABLE = "Authors"
+LINKS_TABLE = "books_authors"
+
+def first_last_sql(ref : str) -> str:
+    """Get the SQL for a creator's 'first middle last' name (as Creator.first_last)."""
+    return f"{ref}.firstname || ' ' || {ref}.midname || ' ' || {ref}.lastname"
+
+def last_first_sql(ref : str) -> str:
+    """Get the SQL for a creator's 'last, first middle' name (as Creator.last_first)."""
+    return f"{ref}.lastname || ', ' || {ref}.firstname || ' ' || {ref}.midname"
+
+def _authors_sql(book : str) -> str:
+    """Get the SQL for a book's authors as an Oxford comma list, in link order."""
+    return f"""(SELECT coalesce(group_concat(
+                    CASE WHEN n = 1 THEN name
+                         WHEN total = 2 THEN ' and ' || name
+                         WHEN n = total THEN ', and ' || name
+                         ELSE ', ' || name END, ''), '')
+                FROM (SELECT {first_last_sql('a')} AS name,
+                             row_number() OVER (ORDER BY l.rowid) AS n,
+                             count(*) OVER () AS total
+                      FROM {LINKS_TABLE} l JOIN {AUTHORS_TABLE} a ON a.id = l.author_id
+                      WHERE l.book_id = {book} ORDER BY l.rowid))"""
+
+def _sort_sql(book : str, title : str) -> str:
+    """Get the SQL for a book's sort key: its first author, then its title."""
+    return f"""lower(coalesce(
+                (SELECT {last_first_sql('a')}
+                 FROM {LINKS_TABLE} l JOIN {AUTHORS_TABLE} a ON a.id = l.author_id
+                 WHERE l.book_id = {book} ORDER BY l.rowid LIMIT 1), '')
+                || char(31) || {title})"""
+
+def _refresh_sql(where : str) -> str:
+    """Get the SQL that rebuilds the display rows of the books matching a condition.
+
+    An upsert rather than a REPLACE, as a trigger's REPLACE is turned
+    into an IGNORE by an outer INSERT OR IGNORE (as in a sync).
+    """
+    return f"""
+        INSERT INTO {BOOK_DISPLAY_TABLE}(book_id, author_display, sort_key)
+        SELECT b.id, {_authors_sql('b.id')}, {_sort_sql('b.id', 'b.title')}
+        FROM {BOOKS_TABLE} b WHERE {where}
+        ON CONFLICT(book_id) DO UPDATE
+        SET author_display = excluded.author_display, sort_key = excluded.sort_key;"""
+
+def _tables(db : DBCfg) -> set[str]:
+    return {i[0] for i in db.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+def _trigger(db : DBCfg, name : str, sql : str) -> bool:
+    """Create a trigger unless it exists as given. Returns true if it was (re)created."""
+    sql = f"CREATE TRIGGER {name} {sql}"
+    old = db.cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                            (name,)).fetchone()
+    if old and old[0] == sql:
+        return False
+    if old:
+        # Written by an older version.
+        db.cursor.execute(f"DROP TRIGGER {name}")
+    db.cursor.execute(sql)
+    return True
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def track_book_display(db : DBCfg) -> None:
+    """Add the book display table and the triggers that keep it current.
+
+    The triggers read all of the books, authors and link tables, so
+    nothing is added until the last of them exists. Call this as each of
+    them is created. Books are (re)summarized whenever a trigger had to
+    be added, as they may have been written without it. The caller
+    commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    None
+    """
+    if not {BOOKS_TABLE, AUTHORS_TABLE, LINKS_TABLE} <= _tables(db):
+        return
+
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {BOOK_DISPLAY_TABLE} (
+            book_id INTEGER PRIMARY KEY,
+            author_display TEXT NOT NULL,
+            sort_key TEXT NOT NULL
+            );""")
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {BOOK_DISPLAY_TABLE}_sort
+            ON {BOOK_DISPLAY_TABLE}(sort_key);""")
+
+    # Look up a book's authors without scanning every link.
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {LINKS_TABLE}_book
+            ON {LINKS_TABLE}(book_id);""")
+
+    linked = f"b.id IN (SELECT book_id FROM {LINKS_TABLE} WHERE author_id = {{}}.id)"
+    triggers = {
+        "book_insert": f"""
+            AFTER INSERT ON {BOOKS_TABLE}
+            BEGIN {_refresh_sql('b.id = NEW.id')} END;""",
+        "book_update": f"""
+            AFTER UPDATE OF title ON {BOOKS_TABLE}
+            BEGIN {_refresh_sql('b.id = NEW.id')} END;""",
+        "book_delete": f"""
+            AFTER DELETE ON {BOOKS_TABLE}
+            BEGIN DELETE FROM {BOOK_DISPLAY_TABLE} WHERE book_id = OLD.id; END;""",
+        "link_insert": f"""
+            AFTER INSERT ON {LINKS_TABLE}
+            BEGIN {_refresh_sql('b.id = NEW.book_id')} END;""",
+        "link_delete": f"""
+            AFTER DELETE ON {LINKS_TABLE}
+            BEGIN {_refresh_sql('b.id = OLD.book_id')} END;""",
+        "link_update": f"""
+            AFTER UPDATE ON {LINKS_TABLE}
+            BEGIN
+                {_refresh_sql('b.id = OLD.book_id')}
+                {_refresh_sql('b.id = NEW.book_id')}
+            END;""",
+        "author_update": f"""
+            AFTER UPDATE OF firstname, midname, lastname ON {AUTHORS_TABLE}
+            BEGIN {_refresh_sql(linked.format('NEW'))} END;""",
+        "author_delete": f"""
+            AFTER DELETE ON {AUTHORS_TABLE}
+            BEGIN {_refresh_sql(linked.format('OLD'))} END;""",
+        }
+    added = [_trigger(db, f"{BOOK_DISPLAY_TABLE}_{name}", sql) for name, sql in triggers.items()]
+
+    if any(added):
+        logger.debug(f"Summarizing {BOOKS_TABLE} into {BOOK_DISPLAY_TABLE}.")
+        db.cursor.execute(_refresh_sql("1"))
+
+def track_creator_names(db : DBCfg, table : str) -> None:
+    """Add the creator names table and the triggers that keep it current.
+
+    Creators saved before the triggers existed are added when the
+    triggers are first created. The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the creator table to track.
+
+    Returns
+    -------
+    None
+    """
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CREATOR_NAMES_TABLE} (
+            tbl TEXT NOT NULL,
+            creator_id INTEGER NOT NULL,
+            last_first TEXT NOT NULL,
+            PRIMARY KEY (tbl, creator_id)
+            ) WITHOUT ROWID;""")
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {CREATOR_NAMES_TABLE}_sort
+            ON {CREATOR_NAMES_TABLE}(tbl, last_first);""")
+
+    upsert = f"""INSERT INTO {CREATOR_NAMES_TABLE}(tbl, creator_id, last_first)
+                 VALUES ('{table}', NEW.id, {last_first_sql('NEW')})
+                 ON CONFLICT(tbl, creator_id) DO UPDATE SET last_first = excluded.last_first;"""
+    added = _trigger(db, f"{table}_names_insert", f"""
+        AFTER INSERT ON {table} BEGIN {upsert} END;""")
+    added |= _trigger(db, f"{table}_names_update", f"""
+        AFTER UPDATE OF firstname, midname, lastname ON {table} BEGIN {upsert} END;""")
+    added |= _trigger(db, f"{table}_names_delete", f"""
+        AFTER DELETE ON {table}
+        BEGIN
+            DELETE FROM {CREATOR_NAMES_TABLE} WHERE tbl = '{table}' AND creator_id = OLD.id;
+        END;""")
+
+    if added:
+        logger.debug(f"Summarizing {table} into {CREATOR_NAMES_TABLE}.")
+        db.cursor.execute(f"""
+            REPLACE INTO {CREATOR_NAMES_TABLE}(tbl, creator_id, last_first)
+            SELECT '{table}', c.id, {last_first_sql('c')} FROM {table} c""")
+
+def book_display(db : DBCfg, book_id : int) -> str | None:
+    """Get a book's stored author list, or None if it isn't stored."""
+    try:
+        row = db.conn.execute(
+            f"SELECT author_display FROM {BOOK_DISPLAY_TABLE} WHERE book_id = ?",
+            (book_id,)).fetchone()
+    except sqlite3.OperationalError:
+        # Not created in this database yet.
+        return None
+    return row[0] if row else None
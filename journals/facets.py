@@ -0,0 +1,263 @@
+"""
+Facets
+
+Faceted browsing over the library's books.
+
+Each facet (format, rating, publish year, author country and gender,
+genre) maps every book to zero or more values. The counts for every
+value of every facet are computed for the current filters in one
+grouped query, and the matching books in a second, so a filter screen
+can refresh them on each keystroke without loading any table.
+
+Filters on different facets are combined with AND, and values selected
+within one facet with OR. As usual for faceted browsing, a facet's own
+counts ignore its own selection, so they show what selecting another of
+its values would add.
+
+"""
+
+# Package imports
+from typing import Any, Iterable
+from dataclasses import dataclass
+from loguru import logger
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.search import fts_query, SEARCH_SUFFIX
+from .hierarchy import CLOSURE_TABLE
+from .book import BOOK_CATEGORIES
+
+# Constants
+BOOKS_TABLE = "Books"
+AUTHORS_TABLE = "Authors"
+LINKS_TABLE = "books_authors"
+GENRES_TABLE = "Genres"
+FACET_VALUES_TABLE = "facet_values"
+ERROR_BAD_FACET = "Unknown facet: {KEY_FACET}! Choose from {KEY_FACETS}."
+
+# ---------------------------------------------------------------------
+# Facet Classes -------------------------------------------------------
+
+@dataclass
+class Facet():
+    """A way of narrowing the library.
+
+    Attributes
+    ----------
+    name : str
+        The facet's key in filters and counts.
+    label : str
+        The facet's formal print name.
+    sql : str
+        A SELECT of (book_id, value) rows, one for each of a book's
+        values. Empty values are left out.
+    """
+    name: str
+    label: str
+    sql: str
+
+def _author_sql(col : str) -> str:
+    return f"""
+        SELECT l.book_id, a.{col} FROM {LINKS_TABLE} l
+        JOIN {AUTHORS_TABLE} a ON a.id = l.author_id WHERE a.{col} <> ''"""
+
+def _genre_sql() -> str:
+    """Get the SQL for each book's genres, including those above its sub-genres and subjects."""
+    links = " UNION ALL ".join(
+        f"SELECT {link.b_name}_id AS book_id, '{link.category.__name__}s' AS tbl, "
+        f"{link.a_name}_id AS id FROM {link.table_name}"
+        for link in BOOK_CATEGORIES)
+    return f"""
+        SELECT l.book_id, g.name FROM ({links}) l
+        JOIN {CLOSURE_TABLE} c ON c.desc_tbl = l.tbl AND c.desc_id = l.id
+        JOIN {GENRES_TABLE} g ON c.anc_tbl = '{GENRES_TABLE}' AND g.id = c.anc_id"""
+
+FACETS = {f.name: f for f in (
+    Facet("format", "Format",
+          f"SELECT id, formattype FROM {BOOKS_TABLE} WHERE formattype <> ''"),
+    # Whole stars, rounded down. Unrated books are in bucket 0.
+    Facet("rating", "Rating",
+          f"SELECT id, CAST(rating AS INTEGER) FROM {BOOKS_TABLE}"),
+    Facet("year", "Publish Year",
+          f"SELECT id, publishyear FROM {BOOKS_TABLE} WHERE publishyear <> ''"),
+    Facet("country", "Author Country", _author_sql("country")),
+    Facet("gender", "Author Gender", _author_sql("gender")),
+    Facet("genre", "Genre", _genre_sql()),
+    )}
+
+@dataclass
+class FacetCounts():
+    """The books matching a set of filters and the counts of each facet.
+
+    Attributes
+    ----------
+    book_ids : list of int
+        The IDs of the books matching every filter, in order.
+    counts : dict
+        Facet name -> list of (value, number of books), most books
+        first. Each facet is counted under every filter but its own.
+    """
+    book_ids: list[int]
+    counts: dict[str, list[tuple[Any, int]]]
+
+    @property
+    def total(self) -> int:
+        """The number of books matching every filter."""
+        return len(self.book_ids)
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+# Connection -> the change marker its facet values were stored at
+_marks: dict[int, tuple] = {}
+
+def _mark(db : DBCfg) -> tuple:
+    """Get a marker that changes whenever the database is written.
+
+    Counts this connection's writes (including those of triggers) and
+    notices commits from any other connection.
+    """
+    return (db.conn.total_changes, db.conn.execute("PRAGMA data_version").fetchone()[0])
+
+def refresh_values(db : DBCfg) -> None:
+    """Store each book's facet values, unless they are already current.
+
+    The values are kept in a temporary table private to the connection,
+    indexed by facet and value, and only rebuilt after the database has
+    been written. Filtering as a user types then only reads the index.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    None
+    """
+    exists = db.conn.execute("SELECT 1 FROM temp.sqlite_master WHERE name = ?",
+                             (FACET_VALUES_TABLE,)).fetchone()
+    if exists and _marks.get(id(db.conn)) == _mark(db):
+        return
+
+    logger.debug(f"Storing the facet values of {BOOKS_TABLE}.")
+    db.conn.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {FACET_VALUES_TABLE} (
+            facet TEXT NOT NULL,
+            value NOT NULL,
+            book_id INTEGER NOT NULL,
+            PRIMARY KEY (facet, value, book_id)
+            ) WITHOUT ROWID;""")
+    db.conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS temp.{FACET_VALUES_TABLE}_book
+            ON {FACET_VALUES_TABLE}(book_id);""")
+    pending = db.conn.in_transaction
+    db.conn.execute(f"DELETE FROM temp.{FACET_VALUES_TABLE}")
+    # OR IGNORE drops repeats, such as two authors from one country.
+    for facet in FACETS.values():
+        db.conn.execute(f"""
+            WITH f(book_id, value) AS ({facet.sql})
+            INSERT OR IGNORE INTO temp.{FACET_VALUES_TABLE}(facet, value, book_id)
+            SELECT '{facet.name}', value, book_id FROM f""")
+    if pending:
+        # Part of the caller's transaction, which may yet roll back.
+        _marks.pop(id(db.conn), None)
+    else:
+        db.conn.commit()
+        _marks[id(db.conn)] = _mark(db)
+
+def _mask_sql(
+    filters : dict[str, Iterable],
+    text : str | None
+    ) -> tuple[str, list, dict[str, int]]:
+    """Get the SQL for the bit mask of the filters each book passes.
+
+    Returns
+    -------
+    tuple : The SQL, its parameters and the bit of each active filter.
+    """
+    for name in filters:
+        if name not in FACETS:
+            raise ValueError(ERROR_BAD_FACET.format(KEY_FACET=name, KEY_FACETS=list(FACETS)))
+
+    # A text search is one more filter, on a pseudo-facet of its own.
+    selects = []
+    params = []
+    bits = {}
+    for name, selected in filters.items():
+        selected = list(dict.fromkeys(selected))
+        if not selected:
+            continue
+        bits[name] = 1 << len(bits)
+        selects.append(f"""
+            SELECT book_id, {bits[name]} AS bit FROM temp.{FACET_VALUES_TABLE}
+            WHERE facet = ? AND value IN ({', '.join('?' * len(selected))})""")
+        params += [name, *selected]
+    match = fts_query(text) if text else ""
+    if match:
+        bits[""] = 1 << len(bits)
+        selects.append(f"""
+            SELECT rowid AS book_id, {bits['']} AS bit FROM {BOOKS_TABLE}{SEARCH_SUFFIX}
+            WHERE {BOOKS_TABLE}{SEARCH_SUFFIX} MATCH ?""")
+        params.append(match)
+    if not selects:
+        return "SELECT NULL, 0 WHERE 0", [], bits
+    # UNION drops repeats, so each bit is summed once per book.
+    sql = f"SELECT book_id, sum(bit) FROM ({' UNION '.join(selects)}) GROUP BY book_id"
+    return sql, params, bits
+
+# ---------------------------------------------------------------------
+# Facet functions -----------------------------------------------------
+
+def facet_counts(
+    db : DBCfg,
+    filters : dict[str, Iterable] | None=None,
+    text : str | None=None
+    ) -> FacetCounts:
+    """Find the books matching a set of filters and count every facet.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    filters : dict, optional(default=None)
+        Facet name -> the values to keep. A book passes a filter if it
+        has any of the values. Empty selections are ignored.
+    text : str, optional(default=None)
+        Free text the books' titles or publishers must match, searched
+        in the full-text index as it is typed.
+
+    Returns
+    -------
+    FacetCounts : The matching book IDs and the count of each facet value.
+
+    Raises
+    ------
+    ValueError if a filter names an unknown facet.
+    """
+    mask_sql, params, bits = _mask_sql(filters or {}, text)
+    refresh_values(db)
+    logger.debug(f"Counting facets under {list(bits) or 'no filters'}.")
+    full = (1 << len(bits)) - 1
+
+    rows = db.conn.execute(f"""
+        WITH m(book_id, mask) AS ({mask_sql})
+        SELECT b.id FROM {BOOKS_TABLE} b LEFT JOIN m ON m.book_id = b.id
+        WHERE coalesce(m.mask, 0) = ? ORDER BY b.id""", params + [full]).fetchall()
+    book_ids = [i[0] for i in rows]
+
+    # A value is counted for the books passing every other filter, so a
+    # book failing only this facet's own filter still counts.
+    own = " ".join(f"WHEN '{name}' THEN {bit}" for name, bit in bits.items() if name)
+    own = f"CASE f.facet {own} ELSE 0 END" if own else "0"
+    rows = db.conn.execute(f"""
+        WITH m(book_id, mask) AS MATERIALIZED ({mask_sql})
+        SELECT f.facet, f.value, count(*) FROM temp.{FACET_VALUES_TABLE} f
+        LEFT JOIN m ON m.book_id = f.book_id
+        WHERE (coalesce(m.mask, 0) | {own}) = ?
+        GROUP BY f.facet, f.value
+        ORDER BY f.facet, count(*) DESC, f.value""", params + [full]).fetchall()
+    counts = {name: [] for name in FACETS}
+    for facet, value, count in rows:
+        counts[facet].append((value, count))
+    return FacetCounts(book_ids, counts)
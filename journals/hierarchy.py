@@ -0,0 +1,251 @@
+"""
+Hierarchy
+
+A category hierarchy kept in a closure table.
+
+The closure table holds a row for every ancestor and descendant pair,
+including each category paired with itself at depth 0, so all of a
+category's ancestors or descendants are found with one indexed lookup.
+Categories of different kinds (genres, sub-genres, subjects) can be
+nested, so each one is named by its table and ID.
+
+A count table keeps, for each category, the number of categories below
+it and the number of media links to it or any category below it.
+Triggers and moves update only the counts of the categories on the
+affected paths.
+
+"""
+
+# Package imports
+from loguru import logger
+
+# Module imports
+from ..database.config import DBCfg
+
+# Constants
+CLOSURE_TABLE = "category_closure"
+COUNTS_TABLE = "category_counts"
+ERROR_CYCLE = "Cannot move {KEY_NODE} below itself!"
+
+# A category, named by its table and ID.
+Node = tuple[str, int]
+
+def _create_tables(db : DBCfg) -> None:
+    """Add the closure and count tables if they do not exist."""
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CLOSURE_TABLE} (
+            anc_tbl TEXT NOT NULL,
+            anc_id INTEGER NOT NULL,
+            desc_tbl TEXT NOT NULL,
+            desc_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (anc_tbl, anc_id, desc_tbl, desc_id)
+            ) WITHOUT ROWID;""")
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {CLOSURE_TABLE}_desc
+            ON {CLOSURE_TABLE}(desc_tbl, desc_id, depth);""")
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {COUNTS_TABLE} (
+            tbl TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            nodes INTEGER NOT NULL DEFAULT 0,
+            items INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tbl, id)
+            ) WITHOUT ROWID;""")
+
+def _above_sql(tbl : str, id : str, strict : bool=True) -> str:
+    """Get the SQL selecting the ancestors of a category."""
+    depth = " AND depth > 0" if strict else ""
+    return (f"SELECT anc_tbl, anc_id FROM {CLOSURE_TABLE} "
+            f"WHERE desc_tbl = {tbl} AND desc_id = {id}{depth}")
+
+def _detach_sql(tbl : str, id : str) -> str:
+    """Get the SQL that cuts a category's subtree off from its ancestors."""
+    return f"""
+        UPDATE {COUNTS_TABLE}
+        SET nodes = nodes - (s.n + 1), items = items - s.i
+        FROM (SELECT nodes AS n, items AS i FROM {COUNTS_TABLE} WHERE tbl = {tbl} AND id = {id}) s
+        WHERE ({COUNTS_TABLE}.tbl, {COUNTS_TABLE}.id) IN ({_above_sql(tbl, id)});
+        DELETE FROM {CLOSURE_TABLE}
+        WHERE (desc_tbl, desc_id) IN (
+                SELECT desc_tbl, desc_id FROM {CLOSURE_TABLE}
+                WHERE anc_tbl = {tbl} AND anc_id = {id})
+          AND (anc_tbl, anc_id) IN ({_above_sql(tbl, id)});"""
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def track_categories(db : DBCfg, table : str) -> None:
+    """Add a category table to the hierarchy.
+
+    New categories start as roots. A deleted category's children become
+    roots. Categories saved before the triggers existed are added as
+    roots. The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the category table.
+
+    Returns
+    -------
+    None
+    """
+    _create_tables(db)
+    exists = db.cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+        (f"{table}_closure_insert",)).fetchone()
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_closure_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO {CLOSURE_TABLE} VALUES ('{table}', NEW.id, '{table}', NEW.id, 0);
+            INSERT INTO {COUNTS_TABLE}(tbl, id) VALUES ('{table}', NEW.id);
+        END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_closure_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {_detach_sql(f"'{table}'", 'OLD.id')}
+            DELETE FROM {CLOSURE_TABLE}
+            WHERE (anc_tbl = '{table}' AND anc_id = OLD.id)
+               OR (desc_tbl = '{table}' AND desc_id = OLD.id);
+            DELETE FROM {COUNTS_TABLE} WHERE tbl = '{table}' AND id = OLD.id;
+        END;""")
+    if exists:
+        return
+    logger.debug(f"Adding {table} to the category hierarchy.")
+    db.cursor.execute(f"""
+        INSERT OR IGNORE INTO {CLOSURE_TABLE} SELECT '{table}', id, '{table}', id, 0 FROM {table}""")
+    db.cursor.execute(f"""
+        INSERT OR IGNORE INTO {COUNTS_TABLE}(tbl, id) SELECT '{table}', id FROM {table}""")
+
+def track_category_links(db : DBCfg, table : str, category : str, col : str) -> None:
+    """Count a relational table's links to categories in the hierarchy.
+
+    Each link is counted for the category and all of its ancestors.
+    Links saved before the triggers existed are counted when they are
+    first created. The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the relational table.
+    category : str
+        The name of the category table it links to.
+    col : str
+        The relational table's category ID column.
+
+    Returns
+    -------
+    None
+    """
+    _create_tables(db)
+    exists = db.cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+        (f"{table}_counts_insert",)).fetchone()
+    for op, ref, step in (("INSERT", "NEW", "+"), ("DELETE", "OLD", "-")):
+        db.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_counts_{op.lower()}
+            AFTER {op} ON {table}
+            BEGIN
+                UPDATE {COUNTS_TABLE} SET items = items {step} 1
+                WHERE (tbl, id) IN ({_above_sql(f"'{category}'", f'{ref}.{col}', False)});
+            END;""")
+    if exists:
+        return
+    db.cursor.execute(f"""
+        UPDATE {COUNTS_TABLE} SET items = items + n.links
+        FROM (SELECT c.anc_tbl, c.anc_id, count(*) AS links
+              FROM {table} l JOIN {CLOSURE_TABLE} c
+                ON c.desc_tbl = '{category}' AND c.desc_id = l.{col}
+              GROUP BY c.anc_tbl, c.anc_id) n
+        WHERE {COUNTS_TABLE}.tbl = n.anc_tbl AND {COUNTS_TABLE}.id = n.anc_id""")
+
+def move(db : DBCfg, node : Node, parent : Node | None, commit : bool=True) -> None:
+    """Move a category, with everything below it, under a new parent.
+
+    Only the closure rows between the moved subtree and its old and new
+    ancestors are changed, along with those ancestors' counts.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    node : tuple
+        The (table, ID) of the category to move.
+    parent : tuple
+        The (table, ID) of the new parent, or None to make it a root.
+    commit : bool, optional(default=True)
+        If false, leave the move in the open transaction.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ValueError if the parent is the category or below it.
+    """
+    if parent is not None and parent in descendants(db, node, include_self=True):
+        raise ValueError(ERROR_CYCLE.format(KEY_NODE=node))
+    logger.debug(f"Moving {node} under {parent}.")
+    # Each statement names the category twice.
+    for sql in _detach_sql("?", "?").split(";"):
+        if sql.strip():
+            db.cursor.execute(sql, node + node)
+    if parent is not None:
+        db.cursor.execute(f"""
+            INSERT INTO {CLOSURE_TABLE}
+            SELECT a.anc_tbl, a.anc_id, d.desc_tbl, d.desc_id, a.depth + d.depth + 1
+            FROM {CLOSURE_TABLE} a, {CLOSURE_TABLE} d
+            WHERE a.desc_tbl = ? AND a.desc_id = ? AND d.anc_tbl = ? AND d.anc_id = ?""",
+            parent + node)
+        db.cursor.execute(f"""
+            UPDATE {COUNTS_TABLE}
+            SET nodes = nodes + (s.n + 1), items = items + s.i
+            FROM (SELECT nodes AS n, items AS i FROM {COUNTS_TABLE} WHERE tbl = ? AND id = ?) s
+            WHERE ({COUNTS_TABLE}.tbl, {COUNTS_TABLE}.id) IN ({_above_sql('?', '?', False)})""",
+            node + parent)
+    if commit:
+        db.conn.commit()
+
+def ancestors(db : DBCfg, node : Node) -> list[Node]:
+    """Get every category above a category, nearest first."""
+    return db.conn.execute(f"""
+        SELECT anc_tbl, anc_id FROM {CLOSURE_TABLE}
+        WHERE desc_tbl = ? AND desc_id = ? AND depth > 0 ORDER BY depth""", node).fetchall()
+
+def descendants(db : DBCfg, node : Node, include_self : bool=False) -> list[Node]:
+    """Get every category below a category, nearest first."""
+    depth = 0 if include_self else 1
+    return db.conn.execute(f"""
+        SELECT desc_tbl, desc_id FROM {CLOSURE_TABLE}
+        WHERE anc_tbl = ? AND anc_id = ? AND depth >= ? ORDER BY depth""",
+        node + (depth,)).fetchall()
+
+def parent(db : DBCfg, node : Node) -> Node | None:
+    """Get the category directly above a category, or None for a root."""
+    return db.conn.execute(f"""
+        SELECT anc_tbl, anc_id FROM {CLOSURE_TABLE}
+        WHERE desc_tbl = ? AND desc_id = ? AND depth = 1""", node).fetchone()
+
+def subtree_counts(db : DBCfg, node : Node) -> tuple[int, int]:
+    """Get the (categories, media links) below and at a category."""
+    row = db.conn.execute(
+        f"SELECT nodes, items FROM {COUNTS_TABLE} WHERE tbl = ? AND id = ?", node).fetchone()
+    return tuple(row) if row else (0, 0)
+
+def under_sql(table : str, category : str, col : str) -> str:
+    """Get the SQL selecting a relational table's links below a category.
+
+    The query takes the category's (table, ID) as parameters and uses
+    the closure table's primary key.
+    """
+    return f"""
+        SELECT l.* FROM {CLOSURE_TABLE} c JOIN {table} l ON l.{col} = c.desc_id
+        WHERE c.anc_tbl = ? AND c.anc_id = ? AND c.desc_tbl = '{category}'"""
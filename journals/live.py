@@ -0,0 +1,321 @@
+"""
+Live Reading
+
+A reading session recorded while it happens.
+
+The session's timer, current page and the quotes captured so far are
+checkpointed to a small local table as it runs, so a crash loses at
+most one checkpoint interval. Checkpoints are coalesced: edits only
+mark the session as changed, and it is written at most once per
+interval however many edits or timer ticks there were. A running timer
+is checkpointed every interval even without edits, so the time read is
+kept too.
+
+Finishing the session writes its Reading, its Quotes and the links
+between them in one transaction, and removes the checkpoint. A
+checkpoint left by a crash is found the next time and resumed, paused
+at the time it was written.
+
+"""
+
+# Package imports
+from dataclasses import dataclass, field, asdict
+from loguru import logger
+import datetime
+import json
+import sqlite3
+import time
+import uuid
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.codecs import from_sql_datetime, SQL_DATE_FORMAT
+from ..database.events import bus, Change, INSERT
+from ..database.schema import ensure_schema
+from .session import Reading, Quote, ReadingQuote
+
+# Constants
+CHECKPOINT_TABLE = "reading_checkpoints"
+CHECKPOINT_INTERVAL = 5.0
+ERROR_NOT_SAVED = "Failed to save the reading session! Could not write {KEY_ITEM}"
+
+def track_checkpoints(db : DBCfg) -> None:
+    """Add the checkpoint table if it does not exist."""
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            key TEXT PRIMARY KEY,
+            saved DATETIME NOT NULL,
+            state TEXT NOT NULL
+            );""")
+
+# ---------------------------------------------------------------------
+# LiveReading Class ---------------------------------------------------
+
+@dataclass
+class LiveQuote():
+    """A quote captured during a live session."""
+    excerpt: str
+    pagenum: int
+    response: str = ""
+
+@dataclass
+class LiveReading():
+    """The state of a reading session in progress.
+
+    Attributes
+    ----------
+    source_id : int
+        The ID of the book being read.
+    source_type : str
+        The media format of the source.
+    start_page : int
+        The page the session started on.
+    page : int
+        The current page.
+    start_time : datetime
+        When the timer was first started, or None if it never was.
+    elapsed : float
+        The seconds timed before the timer was last started.
+    resumed : datetime
+        When the timer was last started, or None while it is paused.
+    quotes : list of LiveQuote
+        The quotes captured so far.
+    key : str
+        Identifies the session's checkpoint.
+    """
+    source_id: int
+    source_type: str = "Book"
+    start_page: int = 0
+    page: int = 0
+    start_time: datetime.datetime | None = None
+    elapsed: float = 0.0
+    resumed: datetime.datetime | None = None
+    quotes: list[LiveQuote] = field(default_factory=list)
+    key: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def __post_init__(self):
+        self.page = self.page or self.start_page
+
+    @property
+    def running(self) -> bool:
+        """Whether the timer is running."""
+        return self.resumed is not None
+
+    def seconds(self, now : datetime.datetime | None=None) -> float:
+        """Get the seconds timed so far."""
+        if not self.running:
+            return self.elapsed
+        return self.elapsed + ((now or datetime.datetime.now()) - self.resumed).total_seconds()
+
+    def start(self, now : datetime.datetime | None=None) -> None:
+        """Start or resume the timer."""
+        if self.running:
+            return
+        self.resumed = now or datetime.datetime.now()
+        self.start_time = self.start_time or self.resumed
+
+    def pause(self, now : datetime.datetime | None=None) -> None:
+        """Pause the timer, keeping the time read so far."""
+        if not self.running:
+            return
+        self.elapsed = self.seconds(now)
+        self.resumed = None
+
+    def add_quote(self, excerpt : str, pagenum : int | None=None, response : str="") -> LiveQuote:
+        """Capture a quote, on the current page unless another is given."""
+        quote = LiveQuote(excerpt, self.page if pagenum is None else pagenum, response)
+        self.quotes.append(quote)
+        return quote
+
+    def to_json(self) -> str:
+        """Get the state as JSON, for a checkpoint."""
+        state = asdict(self)
+        for name in ("start_time", "resumed"):
+            if state[name]:
+                state[name] = state[name].strftime(SQL_DATE_FORMAT)
+        return json.dumps(state, separators=(",", ":"), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text : str):
+        """Rebuild the state from a checkpoint's JSON."""
+        state = json.loads(text)
+        state["quotes"] = [LiveQuote(**i) for i in state["quotes"]]
+        for name in ("start_time", "resumed"):
+            state[name] = from_sql_datetime(state[name]) if state[name] else None
+        return cls(**state)
+
+    # -----------------------------------------------------------------
+    # Checkpoints -----------------------------------------------------
+
+    def checkpoint(self, db : DBCfg, now : datetime.datetime | None=None) -> None:
+        """Write the session's state to its checkpoint and commit."""
+        track_checkpoints(db)
+        db.conn.execute(f"""
+            INSERT INTO {CHECKPOINT_TABLE}(key, saved, state) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET saved = excluded.saved, state = excluded.state""",
+            (self.key, (now or datetime.datetime.now()).strftime(SQL_DATE_FORMAT),
+             self.to_json()))
+        db.conn.commit()
+
+    @classmethod
+    def recover(cls, db : DBCfg):
+        """Load the latest unfinished session, or None if there is none.
+
+        A session that was running when it was checkpointed is paused at
+        the checkpoint's time, so time after a crash isn't counted.
+        """
+        track_checkpoints(db)
+        row = db.conn.execute(
+            f"SELECT saved, state FROM {CHECKPOINT_TABLE} ORDER BY saved DESC LIMIT 1").fetchone()
+        if not row:
+            return None
+        live = cls.from_json(row[1])
+        live.pause(from_sql_datetime(row[0]))
+        logger.debug(f"Recovered reading session {live.key} from {row[0]}.")
+        return live
+
+    def discard(self, db : DBCfg) -> None:
+        """Remove the session's checkpoint without saving it."""
+        track_checkpoints(db)
+        db.conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE key = ?", (self.key,))
+        db.conn.commit()
+
+    # -----------------------------------------------------------------
+    # Finishing -------------------------------------------------------
+
+    def finish(self, db : DBCfg, now : datetime.datetime | None=None) -> Reading:
+        """Stop the timer and save the session, its quotes and their links.
+
+        Everything is written in one transaction with the checkpoint's
+        removal, so either all of it is saved or the checkpoint is kept.
+        A quote already stored is linked rather than saved again. Inside
+        a transaction the caller already has open, the writes are left
+        for the caller to commit.
+
+        Parameters
+        ----------
+        db : DBCfg (Database Config Object)
+            Contains the SQL database interface.
+        now : datetime, optional(default=None)
+            The time to stop the timer at. Defaults to now.
+
+        Returns
+        -------
+        Reading : The saved reading session.
+
+        Raises
+        ------
+        sqlite3.DatabaseError if any of it could not be saved.
+        """
+        self.pause(now)
+        start = (self.start_time or now or datetime.datetime.now()).replace(microsecond=0)
+        reading = Reading(db, start_time=start,
+                          end_time=start + datetime.timedelta(seconds=round(self.elapsed)),
+                          start_page=self.start_page, end_page=self.page,
+                          source_type=self.source_type, _source_id=self.source_id, _quotes=[])
+        ensure_schema(db, [Reading, Quote, ReadingQuote])
+        track_checkpoints(db)
+
+        changes, quotes, linked = [], [], set()
+        owner = not db.conn.in_transaction
+        if owner:
+            db.conn.execute("BEGIN")
+        # A failed save undoes its own writes, not the caller's.
+        db.conn.execute("SAVEPOINT live_finish")
+        try:
+            if not reading.save(commit=False):
+                raise sqlite3.DatabaseError(ERROR_NOT_SAVED.format(KEY_ITEM=reading))
+            changes.append(Change(INSERT, Reading, reading.id))
+            for live in self.quotes:
+                quote = Quote.find(db, live.excerpt, self.source_type)
+                if not quote:
+                    quote = Quote(db, excerpt=live.excerpt, pagenum=live.pagenum,
+                                  response=live.response, sourcetype=self.source_type)
+                    if not quote.save(commit=False):
+                        raise sqlite3.DatabaseError(ERROR_NOT_SAVED.format(KEY_ITEM=live))
+                    changes.append(Change(INSERT, Quote, quote.id))
+                    quotes.append(quote)
+                # The same excerpt captured twice is linked once.
+                if quote.id in linked:
+                    continue
+                linked.add(quote.id)
+                link = ReadingQuote(db)
+                if not link.save((reading.id, quote.id), commit=False):
+                    raise sqlite3.DatabaseError(ERROR_NOT_SAVED.format(KEY_ITEM=live))
+                changes.append(Change(INSERT, ReadingQuote, link.id))
+            db.conn.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE key = ?", (self.key,))
+        except Exception:
+            db.conn.execute("ROLLBACK TO live_finish")
+            db.conn.execute("RELEASE live_finish")
+            if owner:
+                db.conn.rollback()
+            # Their IDs were never committed.
+            for item in [reading] + quotes:
+                item.id = 0
+            raise
+        db.conn.execute("RELEASE live_finish")
+        logger.debug(f"Saved reading session {self.key}: {reading.id} with "
+                     f"{len(self.quotes)} quotes.")
+        if owner:
+            db.conn.commit()
+            bus.publish(changes)
+        return reading
+
+# ---------------------------------------------------------------------
+# Checkpointer Class --------------------------------------------------
+
+class Checkpointer():
+    """Coalesce a live session's checkpoints to at most one per interval.
+
+    Call touch after each edit and flush as often as convenient, such
+    as on every timer tick. A checkpoint is written only when the
+    session changed or its timer is running, and the interval has
+    passed since the last one.
+
+    Attributes
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    live : LiveReading
+        The session to checkpoint.
+    interval : float
+        The least seconds between checkpoints.
+    """
+
+    def __init__(self, db : DBCfg, live : LiveReading, interval : float=CHECKPOINT_INTERVAL):
+        self.db = db
+        self.live = live
+        self.interval = interval
+        self.dirty = False
+        self.last: float | None = None
+        self.written = 0
+
+    def touch(self) -> None:
+        """Mark the session as changed since its last checkpoint."""
+        self.dirty = True
+
+    def flush(self, force : bool=False, clock : float | None=None) -> bool:
+        """Write a checkpoint if one is due.
+
+        Parameters
+        ----------
+        force : bool, optional(default=False)
+            If true, write any pending change without waiting out the
+            interval, such as before closing.
+        clock : float, optional(default=None)
+            The monotonic time. Defaults to now.
+
+        Returns
+        -------
+        bool : True if a checkpoint was written.
+        """
+        clock = time.monotonic() if clock is None else clock
+        if not (self.dirty or self.live.running):
+            return False
+        if not force and self.last is not None and clock - self.last < self.interval:
+            return False
+        self.live.checkpoint(self.db)
+        self.dirty = False
+        self.last = clock
+        self.written += 1
+        return True
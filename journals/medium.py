@@ -8,6 +8,9 @@ from abc import abstractclassmethod
 
 # Parent class
 from ..database.datatable import *
+from .display import track_creator_names, CREATOR_NAMES_TABLE
+from .names import track_name_keys, name_key
+from . import hierarchy
 
 # --------------------------------------------------------------------
 # Medium Class -------------------------------------------------------
@@ -36,6 +39,8 @@ class Creator(DataTable, ABC):
     :lastname:   creator's last name
     :gender:     creator's gender
     :country:    creator's country of association
+    :name_key:   the name with case, punctuation and diacritics folded,
+                 kept up to date on save
     """
     firstname: str = field(default="", metadata={
         'name': 'First Name',
@@ -52,10 +57,37 @@ class Creator(DataTable, ABC):
     country: str = field(default="", metadata={
         'name': 'Country',
         'desc': 'The creator\'s country of origin.'})
+    name_key: str = field(init=False, default="")
+    # Empty name parts add no space.
+    sql_label = ("trim(firstname || ' ' || coalesce(nullif(midname, '') || ' ', '') "
+                 "|| lastname)")
+    search_fields = ("firstname", "midname", "lastname")
     
     def __str__(self):
         return self.last_first
 
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table, the display names kept for it and its name keys."""
+        super().create_schema(db)
+        track_creator_names(db, f"{cls.__name__}s")
+        track_name_keys(db, f"{cls.__name__}s")
+
+    def save(self, update=True, commit=True) -> int:
+        """Store the normalized name key with the rest of the creator."""
+        self.name_key = name_key(self.firstname, self.midname, self.lastname)
+        return super().save(update, commit)
+
+    @classmethod
+    def list_display(cls, db : DBCfg) -> list[tuple[str, int]]:
+        """List every creator as ('last, first middle', ID), in name order.
+
+        Read from the display names in a single query.
+        """
+        return db.conn.execute(f"""
+            SELECT last_first, creator_id FROM {CREATOR_NAMES_TABLE}
+            WHERE tbl = ? ORDER BY last_first""", (f"{cls.__name__}s",)).fetchall()
+
     @property
     def unique_ids(self) -> list[tuple]:
         return [('firstname', self.firstname),
@@ -95,8 +127,60 @@ class MediumCreator(RelTable, ABC):
 
 @dataclass
 class Category(DataTable, ABC):
-    """ A parent class for categorizing media items. """
+    """
+    A parent class for categorizing media items.
+
+    Categories of any kind can be nested under each other. The hierarchy
+    is kept in a closure table, see the hierarchy module.
+    """
     name: str
+    sql_label = "name"
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and its place in the category hierarchy."""
+        super().create_schema(db)
+        hierarchy.track_categories(db, f"{cls.__name__}s")
+
+    @property
+    def node(self) -> hierarchy.Node:
+        """Get the category's (table, ID) in the hierarchy."""
+        return (f"{self.__class__.__name__}s", self.id)
+
+    @property
+    def parent(self) -> hierarchy.Node | None:
+        """Get the (table, ID) of the category directly above this one."""
+        return hierarchy.parent(self.db, self.node)
+
+    @property
+    def ancestors(self) -> list[hierarchy.Node]:
+        """Get the (table, ID) of every category above this one, nearest first."""
+        return hierarchy.ancestors(self.db, self.node)
+
+    @property
+    def descendants(self) -> list[hierarchy.Node]:
+        """Get the (table, ID) of every category below this one, nearest first."""
+        return hierarchy.descendants(self.db, self.node)
+
+    @property
+    def counts(self) -> tuple[int, int]:
+        """Get the number of categories below this one and of media in it or below."""
+        return hierarchy.subtree_counts(self.db, self.node)
+
+    def move_to(self, parent, commit : bool=True) -> None:
+        """Move the category, with everything below it, under another category.
+
+        Parameters
+        ----------
+        parent : Category
+            The new parent, or None to make the category a root.
+        commit : bool, optional(default=True)
+            If false, leave the move in the open transaction.
+        """
+        hierarchy.move(self.db, self.node, parent.node if parent else None, commit)
 
 # --------------------------------------------------------------------
 # Genre Class --------------------------------------------------------
@@ -105,6 +189,10 @@ class Category(DataTable, ABC):
 class Genre(Category):
     """ A genre within the medium (fiction, non-fiction, etc.). """
 
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('name', self.name)]
+
 # --------------------------------------------------------------------
 # Sub-Genre Class ----------------------------------------------------
 
@@ -112,6 +200,10 @@ class Genre(Category):
 class SubGenre(Category):
     """ A sub-genre within a medium (science-fiction, horror, etc.) """
 
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('name', self.name)]
+
 # --------------------------------------------------------------------
 # Subject Class ------------------------------------------------------
 
@@ -122,3 +214,46 @@ class Subject(Category):
     :synonyms:   list of similar key words that might help searching
     """
     synonyms: list[str] = field(default_factory=list)
+
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('name', self.name)]
+    
+# --------------------------------------------------------------------
+# Medium <--> Category Class -----------------------------------------
+
+@dataclass
+class MediumCategory(RelTable, ABC):
+    """
+    Many to many intermediate table to map categories and media.
+
+    Each link is counted in the category hierarchy for the category and
+    everything above it.
+
+    A table: Categories
+    B table: Media
+    """
+
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and the triggers counting its links."""
+        super().create_schema(db)
+        hierarchy.track_category_links(
+            db, cls.table_name, f"{cls.category.__name__}s", f"{cls.a_name}_id")
+
+    @classmethod
+    def get_category_ids(cls, medium_id:int, db) -> list[int]:
+        return cls.lookup_rel_ids(db, medium_id, ("b","a"))
+
+    @classmethod
+    def get_media_ids(cls, category_id:int, db) -> list[int]:
+        return cls.lookup_rel_ids(db, category_id, ("a","b"))
+
+    @classmethod
+    def under_sql(cls) -> str:
+        """Get the SQL selecting the media IDs linked to a category or below it.
+
+        The query takes the category's (table, ID) as parameters.
+        """
+        return (f"SELECT l.{cls.b_name}_id FROM ("
+                f"{hierarchy.under_sql(cls.table_name, f'{cls.category.__name__}s', f'{cls.a_name}_id')}) l")
@@ -0,0 +1,137 @@
+"""
+Names
+
+Normalized name keys and a trigram index for matching creators whose
+names are written differently.
+
+A creator's name key folds case, punctuation and diacritics and puts
+'Last, First' names in first-last order, so "J.R.R. Tolkien" and
+"J. R. R. Tolkien" share the key 'j r r tolkien'. The key is stored on
+each creator and indexed. Each key is also split into trigrams, kept in
+a trigram table by triggers, so names that are only similar can be
+found without comparing every pair.
+
+"""
+
+# Package imports
+from loguru import logger
+import unicodedata
+import re
+
+# Module imports
+from ..database.config import DBCfg
+
+# Constants
+NAME_TRIGRAMS_TABLE = "name_trigrams"
+NAME_KEY_COLUMN = "name_key"
+NAME_WORD = re.compile(r"[^\W_]+")
+
+def name_key(firstname : str, midname : str, lastname : str) -> str:
+    """Get the normalized key of a creator's name.
+
+    Examples
+    --------
+    >>> name_key("J.R.R.", "", "Tolkien")
+    'j r r tolkien'
+    >>> name_key("", "", "Tolkien, John Ronald Reuel")
+    'john ronald reuel tolkien'
+    """
+    name = " ".join(i for i in (firstname, midname, lastname) if i)
+    if "," in name:
+        last, first = name.split(",", 1)
+        name = f"{first} {last}"
+    folded = "".join(c for c in unicodedata.normalize("NFKD", name.casefold())
+                     if not unicodedata.combining(c))
+    return " ".join(NAME_WORD.findall(folded))
+
+def trigrams(key : str) -> set[str]:
+    """Get the trigrams of a name key, as stored in the trigram table."""
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _trigrams_sql(table : str, ref : str) -> str:
+    """Get the SQL that stores the trigrams of a row's name key."""
+    key = f"' ' || {ref}.{NAME_KEY_COLUMN} || ' '"
+    return f"""
+        INSERT OR IGNORE INTO {NAME_TRIGRAMS_TABLE}(tbl, trigram, creator_id)
+        SELECT '{table}', substr({key}, n, 3), {ref}.id FROM (
+            WITH RECURSIVE p(n) AS (
+                SELECT 1 UNION ALL SELECT n + 1 FROM p WHERE n < length({key}) - 2)
+            SELECT n FROM p)
+        WHERE {ref}.{NAME_KEY_COLUMN} <> '';"""
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def track_name_keys(db : DBCfg, table : str) -> None:
+    """Index a creator table's name keys and keep their trigrams.
+
+    Keys missing from rows written before keys were stored (or written
+    outside of Creator.save) are filled in, and the trigrams of every
+    key are kept by triggers. Tables not yet migrated to have a key
+    column are skipped. The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    table : str
+        The name of the creator table.
+
+    Returns
+    -------
+    None
+    """
+    cols = [i[1] for i in db.cursor.execute(f"PRAGMA table_info({table})")]
+    if NAME_KEY_COLUMN not in cols:
+        logger.warning(f"{table} has no {NAME_KEY_COLUMN} column yet, run 'migrate'.")
+        return
+
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {table}_{NAME_KEY_COLUMN}
+            ON {table}({NAME_KEY_COLUMN});""")
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {NAME_TRIGRAMS_TABLE} (
+            tbl TEXT NOT NULL,
+            trigram TEXT NOT NULL,
+            creator_id INTEGER NOT NULL,
+            PRIMARY KEY (tbl, trigram, creator_id)
+            ) WITHOUT ROWID;""")
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {NAME_TRIGRAMS_TABLE}_creator
+            ON {NAME_TRIGRAMS_TABLE}(tbl, creator_id);""")
+
+    forget = f"DELETE FROM {NAME_TRIGRAMS_TABLE} WHERE tbl = '{table}' AND creator_id = OLD.id;"
+    exists = db.cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+        (f"{table}_trigrams_insert",)).fetchone()
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_trigrams_insert
+        AFTER INSERT ON {table}
+        BEGIN {_trigrams_sql(table, 'NEW')} END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_trigrams_update
+        AFTER UPDATE OF {NAME_KEY_COLUMN} ON {table}
+        BEGIN {forget} {_trigrams_sql(table, 'NEW')} END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_trigrams_delete
+        AFTER DELETE ON {table}
+        BEGIN {forget} END;""")
+
+    # Keys are folded in Python, so rows written without one are keyed
+    # here. Their trigrams are added by the update trigger.
+    rows = db.cursor.execute(f"""
+        SELECT id, firstname, midname, lastname FROM {table}
+        WHERE {NAME_KEY_COLUMN} = '' OR {NAME_KEY_COLUMN} IS NULL""").fetchall()
+    keys = [(key, row[0]) for row in rows if (key := name_key(*row[1:]))]
+    if keys:
+        logger.debug(f"Keying {len(keys)} names in {table}.")
+        db.cursor.executemany(f"UPDATE {table} SET {NAME_KEY_COLUMN} = ? WHERE id = ?", keys)
+    if not exists:
+        logger.debug(f"Indexing the trigrams of {table}.")
+        db.cursor.execute(f"DELETE FROM {NAME_TRIGRAMS_TABLE} WHERE tbl = '{table}'")
+        keys = db.cursor.execute(
+            f"SELECT id, {NAME_KEY_COLUMN} FROM {table} WHERE {NAME_KEY_COLUMN} <> ''").fetchall()
+        db.cursor.executemany(
+            f"INSERT OR IGNORE INTO {NAME_TRIGRAMS_TABLE}(tbl, trigram, creator_id) VALUES (?, ?, ?)",
+            [(table, gram, id) for id, key in keys for gram in trigrams(key)])
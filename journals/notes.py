@@ -0,0 +1,203 @@
+"""
+Notes
+
+Chunked storage and revision history for Markdown notes.
+
+A note's text is split into chunks at line ends picked by the content
+of the lines, not by their position, so an edit only changes the chunks
+around it: the text before and after it splits the same way it did
+before. Chunks are stored once, keyed by a hash of their text, and a
+note keeps the ordered list of its chunk hashes. Saving an edit writes
+only the chunks that are new.
+
+Each save also logs a revision, holding the changes that turn the new
+chunk list back into the one it replaced. Earlier versions are rebuilt
+by undoing these from the current list, so the history of an edit
+costs a few hashes plus the chunks it replaced, which are kept.
+
+"""
+
+# Package imports
+from difflib import SequenceMatcher
+from typing import Iterable
+from loguru import logger
+import datetime
+import hashlib
+import json
+import zlib
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.codecs import encode, from_sql_datetime
+
+# Constants
+CHUNK_MIN = 512
+CHUNK_MAX = 16384
+CHUNK_LINES = 16
+CHUNK_HASH_SIZE = 16
+NOTE_STREAM_BATCH = 16
+REVISIONS_TABLE = "note_revisions"
+
+# ---------------------------------------------------------------------
+# Chunking ------------------------------------------------------------
+
+def split_chunks(text : str) -> list[str]:
+    """Split a note's text into chunks at content-defined line ends.
+
+    A chunk ends after a line whose hash is a multiple of CHUNK_LINES,
+    once it holds at least CHUNK_MIN characters, so chunks average about
+    CHUNK_LINES lines. Chunks are cut at CHUNK_MAX characters whatever
+    the lines, for text with few line breaks.
+
+    Parameters
+    ----------
+    text : str
+        The note's Markdown text.
+
+    Returns
+    -------
+    list : The chunks, which join back into the text.
+    """
+    chunks, current, size = [], [], 0
+    for line in (text or "").splitlines(keepends=True):
+        while len(line) > CHUNK_MAX - size:
+            cut = CHUNK_MAX - size
+            current.append(line[:cut])
+            chunks.append("".join(current))
+            current, size, line = [], 0, line[cut:]
+        current.append(line)
+        size += len(line)
+        if size >= CHUNK_MIN and zlib.crc32(line.encode()) % CHUNK_LINES == 0:
+            chunks.append("".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def chunk_hash(text : str) -> str:
+    """Get the hex digest that stores and identifies a chunk."""
+    return hashlib.blake2b(text.encode(), digest_size=CHUNK_HASH_SIZE).hexdigest()
+
+# ---------------------------------------------------------------------
+# Deltas --------------------------------------------------------------
+
+def delta(new : list[str], old : list[str]) -> list[list]:
+    """Get the changes that turn a new chunk list back into an old one.
+
+    Parameters
+    ----------
+    new : list of str
+        The chunk hashes being saved.
+    old : list of str
+        The chunk hashes they replace.
+
+    Returns
+    -------
+    list : [start, end, old hashes] for each changed run of the new
+    list, in order.
+    """
+    ops = SequenceMatcher(None, new, old, autojunk=False).get_opcodes()
+    return [[i1, i2, old[j1:j2]] for tag, i1, i2, j1, j2 in ops if tag != 'equal']
+
+def undo(chunks : list[str], changes : list[list]) -> list[str]:
+    """Apply a delta to a chunk list, giving the list it was made from."""
+    chunks = list(chunks)
+    # Back to front, so the earlier positions still hold.
+    for start, end, old in reversed(changes):
+        chunks[start:end] = old
+    return chunks
+
+# ---------------------------------------------------------------------
+# Revisions -----------------------------------------------------------
+
+def track_revisions(db : DBCfg, notes : str, chunks : str) -> None:
+    """Add the revision table and the note delete trigger if they do not exist.
+
+    Deleting a note deletes its revisions and any chunks no other note
+    or revision uses. The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    notes : str
+        The name of the notes table.
+    chunks : str
+        The name of the chunks table.
+
+    Returns
+    -------
+    None
+    """
+    db.cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {REVISIONS_TABLE} (
+            note_id INTEGER NOT NULL,
+            rev INTEGER NOT NULL,
+            saved DATETIME,
+            delta TEXT NOT NULL,
+            PRIMARY KEY (note_id, rev)
+            ) WITHOUT ROWID;""")
+    replaced = f"""
+        SELECT t.value FROM {REVISIONS_TABLE} r, json_tree(r.delta) t
+        WHERE t.type = 'text' AND r.note_id {{}} OLD.id"""
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {notes}_revisions_delete AFTER DELETE ON {notes}
+        BEGIN
+            DELETE FROM {chunks}
+            WHERE hash IN (SELECT value FROM json_each(OLD.chunks)
+                           UNION {replaced.format('=')})
+              AND hash NOT IN (SELECT j.value FROM {notes} n, json_each(n.chunks) j)
+              AND hash NOT IN ({replaced.format('<>')});
+            DELETE FROM {REVISIONS_TABLE} WHERE note_id = OLD.id;
+        END;""")
+
+def log_revision(db : DBCfg, note_id : int, rev : int, changes : list[list]) -> None:
+    """Store the delta back from a note's revision to the one before it."""
+    db.cursor.execute(
+        f"INSERT OR REPLACE INTO {REVISIONS_TABLE} VALUES (?, ?, ?, ?)",
+        (note_id, rev, encode(datetime.datetime.now().replace(microsecond=0),
+                              datetime.datetime, db.epoch_datetimes),
+         json.dumps(changes, separators=(",", ":"))))
+
+def revisions(db : DBCfg, note_id : int) -> list[tuple[int, datetime.datetime]]:
+    """Get the revision numbers of a note and when each was saved, oldest first."""
+    return [(rev, from_sql_datetime(saved)) for rev, saved in db.conn.execute(
+        f"SELECT rev, saved FROM {REVISIONS_TABLE} WHERE note_id = ? ORDER BY rev",
+        (note_id,))]
+
+def chunks_at(db : DBCfg, note_id : int, chunks : list[str], rev : int) -> list[str]:
+    """Rebuild a note's chunk list at an earlier revision.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    note_id : int
+        The note's ID.
+    chunks : list of str
+        The note's current chunk hashes.
+    rev : int
+        The revision to rebuild. 0 is the empty note before the first save.
+
+    Returns
+    -------
+    list : The chunk hashes of the revision.
+    """
+    cursor = db.conn.execute(
+        f"SELECT delta FROM {REVISIONS_TABLE} WHERE note_id = ? AND rev > ? ORDER BY rev DESC",
+        (note_id, rev))
+    for row in cursor:
+        chunks = undo(chunks, json.loads(row[0]))
+    return chunks
+
+def missing_chunks(db : DBCfg, table : str, hashes : Iterable[str]) -> set[str]:
+    """Get the hashes of a set that have no stored chunk."""
+    hashes = list(dict.fromkeys(hashes))
+    found = set()
+    # In batches, under SQLite's limit on query parameters.
+    for n in range(0, len(hashes), 500):
+        batch = hashes[n:n + 500]
+        found.update(i[0] for i in db.conn.execute(
+            f"SELECT hash FROM {table} WHERE hash IN ({', '.join('?' * len(batch))})", batch))
+    logger.debug(f"{len(hashes) - len(found)} of {len(hashes)} chunks are new.")
+    return set(hashes) - found
@@ -0,0 +1,234 @@
+"""
+Progress
+
+A per-book reading progress summary kept current by triggers on the
+Readings table.
+
+Saving a reading adds its pages and minutes to its book's summary row
+with a single upsert. Editing or deleting a reading recomputes only
+that book's row from its own sessions. Reading a book's progress is a
+single primary key lookup, no matter how many sessions there are.
+
+"""
+
+# Package imports
+from dataclasses import dataclass
+from loguru import logger
+import datetime
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.datatable import from_sql_datetime, sql_epoch
+
+# Constants
+PROGRESS_TABLE = "book_progress"
+READINGS_TABLE = "Readings"
+
+def _minutes_sql(ref : str) -> str:
+    """Get the SQL for the minutes of a reading row reference (NEW, OLD, r)."""
+    return f"({sql_epoch(f'{ref}.end_time')} - {sql_epoch(f'{ref}.start_time')}) / 60.0"
+
+def _recompute_sql(book : str) -> str:
+    """Get the SQL that rebuilds one book's summary from its sessions."""
+    return f"""
+        DELETE FROM {PROGRESS_TABLE} WHERE book_id = {book};
+        INSERT INTO {PROGRESS_TABLE}
+        SELECT r._source_id, total(r.end_page - r.start_page), total({_minutes_sql('r')}),
+               count(*), min(r.start_time), max(r.end_time),
+               (SELECT l.end_page FROM {READINGS_TABLE} l
+                WHERE l._source_id = r._source_id AND l.source_type = 'Book'
+                ORDER BY l.end_time DESC LIMIT 1)
+        FROM {READINGS_TABLE} r
+        WHERE r._source_id = {book} AND r.source_type = 'Book'
+        GROUP BY r._source_id;"""
+
+# ---------------------------------------------------------------------
+# Helper functions ----------------------------------------------------
+
+def track_progress(db : DBCfg) -> None:
+    """Add the progress summary table and its triggers if they do not exist.
+
+    Readings already saved are summarized when the table is first created.
+    The caller commits.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+
+    Returns
+    -------
+    None
+    """
+    exists = db.cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (PROGRESS_TABLE,)).fetchone()
+    if not exists:
+        logger.debug(f"Creating {PROGRESS_TABLE} summary of {READINGS_TABLE}.")
+        db.cursor.execute(f"""
+            CREATE TABLE {PROGRESS_TABLE} (
+                book_id INTEGER PRIMARY KEY,
+                pages INTEGER NOT NULL,
+                minutes REAL NOT NULL,
+                sessions INTEGER NOT NULL,
+                first_session DATETIME,
+                last_session DATETIME,
+                curpage INTEGER
+                );""")
+
+    # The index and triggers are dropped with the Readings table, so
+    # check them every time.
+    db.cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS {READINGS_TABLE}_source
+            ON {READINGS_TABLE}(_source_id, end_time);""")
+
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {PROGRESS_TABLE}_insert
+        AFTER INSERT ON {READINGS_TABLE} WHEN NEW.source_type = 'Book'
+        BEGIN
+            INSERT INTO {PROGRESS_TABLE} VALUES (
+                NEW._source_id, NEW.end_page - NEW.start_page, {_minutes_sql('NEW')},
+                1, NEW.start_time, NEW.end_time, NEW.end_page)
+            ON CONFLICT(book_id) DO UPDATE SET
+                pages = pages + excluded.pages,
+                minutes = minutes + excluded.minutes,
+                sessions = sessions + 1,
+                first_session = min(first_session, excluded.first_session),
+                curpage = CASE WHEN excluded.last_session >= last_session
+                               THEN excluded.curpage ELSE curpage END,
+                last_session = max(last_session, excluded.last_session);
+        END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {PROGRESS_TABLE}_delete
+        AFTER DELETE ON {READINGS_TABLE} WHEN OLD.source_type = 'Book'
+        BEGIN
+            {_recompute_sql('OLD._source_id')}
+        END;""")
+    db.cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {PROGRESS_TABLE}_update
+        AFTER UPDATE ON {READINGS_TABLE}
+        BEGIN
+            {_recompute_sql('OLD._source_id')}
+            {_recompute_sql('NEW._source_id')}
+        END;""")
+
+    # Summarize any readings saved before the table existed.
+    if exists:
+        return
+    db.cursor.execute(f"""
+        INSERT INTO {PROGRESS_TABLE}
+        SELECT r._source_id, total(r.end_page - r.start_page), total({_minutes_sql('r')}),
+               count(*), min(r.start_time), max(r.end_time),
+               (SELECT l.end_page FROM {READINGS_TABLE} l
+                WHERE l._source_id = r._source_id AND l.source_type = 'Book'
+                ORDER BY l.end_time DESC LIMIT 1)
+        FROM {READINGS_TABLE} r WHERE r.source_type = 'Book'
+        GROUP BY r._source_id""")
+
+# ---------------------------------------------------------------------
+# BookProgress Class --------------------------------------------------
+
+@dataclass
+class BookProgress():
+    """The reading progress summary of a book.
+
+    Attributes
+    ----------
+    book_id : int
+        The ID of the book.
+    pages : int
+        The total pages read over every session.
+    minutes : float
+        The total minutes read over every session.
+    sessions : int
+        The number of reading sessions.
+    first_session : datetime
+        The start of the first reading session.
+    last_session : datetime
+        The end of the latest reading session.
+    curpage : int
+        The last page read in the latest session.
+    numpages : int
+        The number of pages in the book, or 0 if unknown.
+
+    Methods
+    -------
+    load
+        Load the progress of a book.
+    load_all
+        Load the progress of every book read.
+    """
+    book_id: int
+    pages: int
+    minutes: float
+    sessions: int
+    first_session: datetime.datetime | None
+    last_session: datetime.datetime | None
+    curpage: int
+    numpages: int = 0
+
+    @property
+    def pages_per_day(self) -> float:
+        """The average pages read per day since the first session."""
+        if not self.first_session:
+            return 0.0
+        days = max((self.last_session - self.first_session).total_seconds() / 86400, 1.0)
+        return self.pages / days
+
+    @property
+    def estimated_finish(self) -> datetime.datetime | None:
+        """The date the book will be finished at the current pace."""
+        remaining = self.numpages - self.curpage
+        if remaining <= 0:
+            return self.last_session
+        if not self.pages_per_day:
+            return None
+        return self.last_session + datetime.timedelta(days=remaining / self.pages_per_day)
+
+    @classmethod
+    def _select(cls, db : DBCfg, where : str, params : tuple) -> list["BookProgress"]:
+        tables = {i[0] for i in db.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if PROGRESS_TABLE not in tables:
+            return []
+        numpages = "b.numpages" if "Books" in tables else "0"
+        join = "LEFT JOIN Books b ON b.id = p.book_id" if "Books" in tables else ""
+        rows = db.conn.execute(f"""
+            SELECT p.book_id, p.pages, p.minutes, p.sessions, p.first_session,
+                   p.last_session, p.curpage, coalesce({numpages}, 0)
+            FROM {PROGRESS_TABLE} p {join} WHERE {where}""", params).fetchall()
+        return [cls(r[0], int(r[1]), r[2], r[3], from_sql_datetime(r[4]),
+                    from_sql_datetime(r[5]), r[6], r[7]) for r in rows]
+
+    @classmethod
+    def load(cls, db : DBCfg, book_id : int) -> "BookProgress | None":
+        """Load the progress of a book.
+
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        book_id : int
+            The ID of the book.
+
+        Returns
+        -------
+        BookProgress : The book's progress, or None if it was never read.
+        """
+        rows = cls._select(db, "p.book_id = ?", (book_id,))
+        return rows[0] if rows else None
+
+    @classmethod
+    def load_all(cls, db : DBCfg) -> dict[int, "BookProgress"]:
+        """Load the progress of every book read, for list views.
+
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+
+        Returns
+        -------
+        dict : The progress of each book by book ID.
+        """
+        return {p.book_id: p for p in cls._select(db, "1", ())}
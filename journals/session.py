@@ -3,12 +3,44 @@ Session
 
 """
 
-# Package imports
-from datetime import datetime, timedelta
-
 # Parent class
 from ..database.datatable import *
 from .medium import Category
+from .progress import track_progress
+from .attachment import Attachment
+from .notes import (split_chunks, chunk_hash, delta, track_revisions, log_revision,
+                    revisions, chunks_at, missing_chunks, NOTE_STREAM_BATCH)
+
+# Package imports (after the star import, which would shadow datetime
+# with the module of the same name)
+from datetime import datetime, timedelta
+import hashlib
+import unicodedata
+
+# Constants
+QUOTE_HASH_SIZE = 16
+
+def quote_hash(excerpt : str, source : str) -> str:
+    """Get the fixed-size key identifying a quote.
+
+    The excerpt is compared with its case, spacing and Unicode forms
+    folded, so a highlight imported again with different line breaks
+    or curly quotes is still found as the same quote.
+
+    Parameters
+    ----------
+    excerpt : str
+        The quoted text.
+    source : str
+        The media format of the quoted source.
+
+    Returns
+    -------
+    str : The hex digest of the normalized excerpt and source.
+    """
+    text = " ".join(unicodedata.normalize("NFKC", excerpt or "").casefold().split())
+    return hashlib.blake2b(f"{source or ''}\x1f{text}".encode(),
+                           digest_size=QUOTE_HASH_SIZE).hexdigest()
 
 @dataclass
 class Quote(DataTable):
@@ -20,27 +52,183 @@ class Quote(DataTable):
     :sourcetype:  the media format of the source (book, magazine, etc.)
     :source_id:   the datable id number of the source
     :category:    subjects the quote applies to
+    :content_hash: hash of the normalized excerpt and source, its unique key
     """
     excerpt: str = field(metadata={
         'name': 'Excerpt',
-        'desc': 'The quoted text excerpt.'})
+        'desc': 'The quoted text excerpt.',
+        'compress': True,
+        'deferred': True})
     pagenum: int = field(metadata={
         'name': 'Page Number',
         'desc': 'The beginning page number of the excerpt.'})
     response: str = field(metadata={
         'name': 'Response',
-        'desc': 'A personal response, opinion, or reflection on the excerpt.'})
+        'desc': 'A personal response, opinion, or reflection on the excerpt.',
+        'compress': True,
+        'deferred': True})
     sourcetype: str = field(metadata={
         'name': 'Media Format',
         'desc': 'The media format of the quoted source.'})
+    content_hash: str = field(init=False, default="")
+    search_fields = ("excerpt", "response")
     
     @property
     def unique_ids(self) -> list[tuple]:
-        return [('excerpt', self.excerpt)]
+        # A small key in place of the whole excerpt, which the unique
+        # index would otherwise store a second copy of.
+        return [('content_hash', self.content_hash)]
+
+    @classmethod
+    def derived_values(cls, values : dict) -> dict:
+        return {'content_hash': quote_hash(values.get('excerpt'), values.get('sourcetype'))}
+
+    def save(self, update=True, commit=True) -> int:
+        """Store the content hash with the rest of the quote."""
+        self.content_hash = quote_hash(self.excerpt, self.sourcetype)
+        return super().save(update, commit)
+
+    @classmethod
+    def find(cls, db : DBCfg, excerpt : str, sourcetype : str):
+        """Load the stored quote with the same content, or 0 if there is none.
+
+        An indexed lookup on the content hash, for checking highlights
+        against the library as they are imported.
+        """
+        return cls.load(db, quote_hash(excerpt, sourcetype), 'content_hash')
+
+@dataclass
+class NoteChunk(DataTable):
+    """
+    A piece of a note's text. Chunks are shared by every note and
+    revision with the same text. It consists of:
+    :hash:  hash of the text, its unique key
+    :text:  the Markdown text of the chunk
+    """
+    hash: str = field(metadata={
+        'name': 'Hash',
+        'desc': 'The hash of the chunk text.'})
+    text: str = field(metadata={
+        'name': 'Text',
+        'desc': 'The Markdown text of the chunk.',
+        'compress': True})
+
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('hash', self.hash)]
 
 @dataclass
 class Note(DataTable):
-    pass
+    """
+    A note is a Markdown document written about books, readings and
+    quotes. Its text is stored in chunks (see notes.py), so saving an
+    edit only writes the chunks it changed. It consists of:
+    :title:     the note title
+    :created:   when the note was started
+    :updated:   when the note was last saved
+    :chunks:    the hashes of the chunks of its text, in order
+    :revision:  the number of times its text was saved
+    """
+    title: str = field(metadata={
+        'name': 'Title',
+        'desc': 'The note title.'})
+    created: datetime = field(default_factory=lambda: datetime.now().replace(microsecond=0),
+                              metadata={
+        'name': 'Created',
+        'desc': 'The date and time the note was started.'})
+    updated: datetime = field(default_factory=lambda: datetime.now().replace(microsecond=0),
+                              metadata={
+        'name': 'Updated',
+        'desc': 'The date and time the note was last saved.'})
+    chunks: list[str] = field(default_factory=list)
+    revision: int = 0
+
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('title', self.title), ('created', self.created)]
+
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table, its revision log and the chunk cleanup on delete."""
+        super().create_schema(db)
+        track_revisions(db, f"{cls.__name__}s", f"{NoteChunk.__name__}s")
+
+    def __str__(self):
+        return self.title
+
+    @property
+    def text(self) -> str:
+        """The whole Markdown text of the note."""
+        return "".join(self.stream())
+
+    def stream(self, batch : int=NOTE_STREAM_BATCH) -> Iterator[str]:
+        """Yield the note's text chunk by chunk, reading a batch of chunks at a time.
+        
+        Parameters
+        ----------
+        batch : int, optional(default=NOTE_STREAM_BATCH)
+            The chunks to read per query.
+        
+        Returns
+        -------
+        iterator of str : The chunk texts, in order.
+        """
+        return self._stream(self.chunks, batch)
+
+    def _stream(self, chunks : list[str], batch : int=NOTE_STREAM_BATCH) -> Iterator[str]:
+        for n in range(0, len(chunks), batch):
+            hashes = chunks[n:n + batch]
+            found = {c.hash : c for c in NoteChunk.load_list(
+                self.db, f"hash IN ({', '.join('?' * len(set(hashes)))})", tuple(set(hashes)))}
+            for h in hashes:
+                yield found[h].text
+
+    def write(self, text : str, commit : bool=True) -> int:
+        """Save new text for the note, writing only the chunks it doesn't have.
+        
+        The change is logged as a new revision. Saving the same text
+        again does nothing.
+        
+        Parameters
+        ----------
+        text : str
+            The note's new Markdown text.
+        commit : bool, optional(default=True)
+            If false, leave the writes in the open transaction so the
+            caller can commit a batch of writes together.
+        
+        Returns
+        -------
+        int : The number of chunks written.
+        """
+        pieces = split_chunks(text)
+        hashes = [chunk_hash(i) for i in pieces]
+        if self.id and hashes == self.chunks:
+            return 0
+        if not self.id and not self.save(commit=False):
+            return 0
+        new = missing_chunks(self.db, f"{NoteChunk.__name__}s", hashes)
+        written = len(new)
+        for h, piece in zip(hashes, pieces):
+            if h in new:
+                NoteChunk(self.db, h, piece).save(commit=False)
+                new.discard(h)
+        log_revision(self.db, self.id, self.revision + 1, delta(hashes, self.chunks))
+        logger.debug(f"Saving revision {self.revision + 1} of Note {self.id}: "
+                     f"{len(hashes)} chunks.")
+        self.chunks = hashes
+        self.revision += 1
+        self.updated = datetime.now().replace(microsecond=0)
+        self.save(commit=commit)
+        return written
+
+    def revisions(self) -> list[tuple[int, datetime]]:
+        """Get the note's revision numbers and when each was saved, oldest first."""
+        return revisions(self.db, self.id)
+
+    def text_at(self, rev : int) -> str:
+        """Get the text of the note as it was saved at a revision."""
+        return "".join(self._stream(chunks_at(self.db, self.id, self.chunks, rev)))
 
 @dataclass
 class Session(DataTable):
@@ -58,6 +246,41 @@ class Session(DataTable):
         'name': 'End Time',
         'desc': 'The session end date and time.'})
     
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and an index for time range lookups."""
+        super().create_schema(db)
+        db.cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS {cls.__name__}s_start_time
+                ON {cls.__name__}s(start_time);""")
+    
+    @classmethod
+    def between(cls, db : DBCfg, start : datetime, end : datetime) -> list:
+        """Load every session that started within a time range.
+        
+        Parameters
+        ----------
+        db : DBCfg (Database Configuration object)
+            Contains the SQL database interface.
+        start : datetime
+            The earliest start time to include.
+        end : datetime
+            The start time to stop before.
+        
+        Returns
+        -------
+        list : The sessions found, in order of start time.
+        """
+        sql = f"""SELECT * FROM {cls.__name__}s
+                  WHERE start_time >= ? AND start_time < ?
+                  ORDER BY start_time"""
+        vals = (get_sql_value(start, db.epoch_datetimes),
+                get_sql_value(end, db.epoch_datetimes))
+        logger.debug(f"Reading {cls.__name__}s from {start} to {end}.")
+        cursor = db.conn.execute(sql, vals)
+        cols = [i[0] for i in cursor.description]
+        return [cls.from_row(db, cols, row) for row in cursor]
+    
     @property
     def duration(self) -> str:
         """
@@ -107,6 +330,12 @@ class Reading(Session):
     def lut(cls) -> dict:
         return {}
     
+    @classmethod
+    def create_schema(cls, db : DBCfg) -> None:
+        """Add the table and the book progress summary it keeps current."""
+        super().create_schema(db)
+        track_progress(db)
+    
     @property
     def unique_ids(self) -> list[tuple]:
         return [('start_time', self.start_time),
@@ -146,8 +375,13 @@ class ReadingQuote(RelTable):
     
     @classmethod
     def get_reading_quotes(cls, reading_id:int, db) -> list[str]:
-        """Return a list of quotes associated with a reading id."""
-        return [Quote.load(db, i) for i in cls.get_reading_quote_ids(reading_id, db)]
+        """Return a list of quotes associated with a reading id.
+
+        Read in one query, without their deferred excerpts and responses.
+        """
+        return Quote.load_list(
+            db, f"id IN (SELECT quote_id FROM {cls.table_name} WHERE reading_id = ?)",
+            (reading_id,))
     
     @classmethod
     def get_quote_reading_ids(cls, quote_id:int, db) -> list[int]:
@@ -157,4 +391,82 @@ class ReadingQuote(RelTable):
     @classmethod
     def get_quote_readings(cls, quote_id:int, db) -> list[str]:
         """Return a list of readings associated with a quote id."""
-        return [Reading.load(db, i).title for i in cls.get_quote_reading_ids(quote_id, db)]
\ No newline at end of file
+        return [Reading.load(db, i).title for i in cls.get_quote_reading_ids(quote_id, db)]
+
+# --------------------------------------------------------------------
+# Notes <-> Readings & Quotes Classes --------------------------------
+
+@dataclass
+class ReadingNote(RelTable):
+    """Many to many intermediate table to map readings and notes."""
+    a_name = "reading"
+    b_name = "note"
+    table_name = "readings_notes"
+    
+    @classmethod
+    def get_reading_note_ids(cls, reading_id:int, db) -> list[int]:
+        """Return a list of note ids associated with a reading id."""
+        return cls.lookup_rel_ids(db, reading_id, ("a","b"))
+    
+    @classmethod
+    def get_reading_notes(cls, reading_id:int, db) -> list[Note]:
+        """Return a list of notes associated with a reading id, read in one query."""
+        return Note.load_list(
+            db, f"id IN (SELECT note_id FROM {cls.table_name} WHERE reading_id = ?)",
+            (reading_id,))
+    
+    @classmethod
+    def get_note_reading_ids(cls, note_id:int, db) -> list[int]:
+        """Return a list of reading ids associated with a note id."""
+        return cls.lookup_rel_ids(db, note_id, ("b","a"))
+
+@dataclass
+class QuoteNote(RelTable):
+    """Many to many intermediate table to map quotes and notes."""
+    a_name = "quote"
+    b_name = "note"
+    table_name = "quotes_notes"
+    
+    @classmethod
+    def get_quote_note_ids(cls, quote_id:int, db) -> list[int]:
+        """Return a list of note ids associated with a quote id."""
+        return cls.lookup_rel_ids(db, quote_id, ("a","b"))
+    
+    @classmethod
+    def get_quote_notes(cls, quote_id:int, db) -> list[Note]:
+        """Return a list of notes associated with a quote id, read in one query."""
+        return Note.load_list(
+            db, f"id IN (SELECT note_id FROM {cls.table_name} WHERE quote_id = ?)",
+            (quote_id,))
+    
+    @classmethod
+    def get_note_quote_ids(cls, note_id:int, db) -> list[int]:
+        """Return a list of quote ids associated with a note id."""
+        return cls.lookup_rel_ids(db, note_id, ("b","a"))
+
+# --------------------------------------------------------------------
+# Readings <-> Attachments Class -------------------------------------
+
+@dataclass
+class ReadingAttachment(RelTable):
+    """Many to many intermediate table to map readings and attachments."""
+    a_name = "reading"
+    b_name = "attachment"
+    table_name = "readings_attachments"
+    
+    @classmethod
+    def get_reading_attachment_ids(cls, reading_id:int, db) -> list[int]:
+        """Return a list of attachment ids associated with a reading id."""
+        return cls.lookup_rel_ids(db, reading_id, ("a","b"))
+    
+    @classmethod
+    def get_reading_attachments(cls, reading_id:int, db) -> list[Attachment]:
+        """Return a list of attachments associated with a reading id, without their data."""
+        return Attachment.load_list(
+            db, f"id IN (SELECT attachment_id FROM {cls.table_name} WHERE reading_id = ?)",
+            (reading_id,))
+    
+    @classmethod
+    def get_attachment_reading_ids(cls, attachment_id:int, db) -> list[int]:
+        """Return a list of reading ids associated with an attachment id."""
+        return cls.lookup_rel_ids(db, attachment_id, ("b","a"))
@@ -0,0 +1,139 @@
+"""
+Similar
+
+Find quotes like a quote, and books whose highlights resemble a book's.
+
+"""
+
+# Package imports
+from loguru import logger
+import os
+
+# Module imports
+from ..database.config import DBCfg
+from ..database.similarity import SimilarityIndex
+from ..database.compress import text_sql
+from ..database.schema import schema_key
+from .book import Book
+from .session import Quote, ReadingQuote
+
+# Constants
+ERROR_NO_INDEX_PATH = "In-memory databases need an explicit index path! {KEY_DB}"
+
+# Open indexes by database and path, so the in-memory state is only read
+# once, and an index is never shared by unrelated in-memory databases.
+_indexes: dict[tuple, SimilarityIndex] = {}
+
+def index_path(db : DBCfg) -> str:
+    """Get the default quote index directory next to a database file.
+
+    Raises
+    ------
+    ValueError if the database is in memory, so has no file to put it next to.
+    """
+    if db.in_memory:
+        error_msg = ERROR_NO_INDEX_PATH.format(KEY_DB=db.db)
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    return f"{os.path.splitext(db.db)[0]}.similar"
+
+def quote_index(db : DBCfg, path : str | None=None) -> SimilarityIndex:
+    """Get the quote similarity index, brought up to date with the database.
+
+    Quotes are grouped by the book they were highlighted in, found
+    through the reading session each quote is linked to.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    path : str, optional(default=None)
+        The index directory. Defaults to '<database>.similar', and is
+        required for in-memory databases.
+
+    Returns
+    -------
+    SimilarityIndex : The refreshed quote index.
+    """
+    path = path or index_path(db)
+    tables = {i[0] for i in db.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    if {ReadingQuote.table_name, "Readings"} <= tables:
+        group_sql = f"""(SELECT r._source_id FROM {ReadingQuote.table_name} rq
+                         JOIN Readings r ON r.id = rq.reading_id
+                         WHERE rq.quote_id = Quotes.id AND r.source_type = 'Book'
+                         LIMIT 1)"""
+    else:
+        group_sql = "NULL"
+    source_sql = f"""SELECT id, {group_sql}, {text_sql('excerpt')}, {text_sql('response')}
+                     FROM Quotes WHERE {{where}} ORDER BY id"""
+    watch = {
+        "Quotes": None,
+        ReadingQuote.table_name:
+            f"SELECT quote_id FROM {ReadingQuote.table_name} WHERE rowid IN ({{ids}})",
+        }
+
+    key = (schema_key(db), os.path.realpath(path))
+    if key not in _indexes:
+        _indexes[key] = SimilarityIndex(path, source_sql, watch)
+    index = _indexes[key]
+    index.source_sql = source_sql
+
+    if "Quotes" in tables:
+        index.refresh(db)
+    return index
+
+def similar_quotes(
+    db : DBCfg,
+    quote_id : int,
+    k : int=10,
+    path : str | None=None
+    ) -> list[tuple[Quote, float]]:
+    """Find the quotes most like a quote.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    quote_id : int
+        The ID of the quote to compare against.
+    k : int, optional(default=10)
+        The number of quotes to return.
+    path : str, optional(default=None)
+        The index directory. Defaults to '<database>.similar'.
+
+    Returns
+    -------
+    list : (quote, cosine similarity) of the best matches, best first.
+    """
+    matches = quote_index(db, path).similar(quote_id, k)
+    logger.debug(f"Found {len(matches)} quotes like quote {quote_id}.")
+    return [(Quote.load(db, i), score) for i, score in matches]
+
+def similar_books(
+    db : DBCfg,
+    book_id : int,
+    k : int=10,
+    path : str | None=None
+    ) -> list[tuple[Book, float]]:
+    """Find the books whose quotes are most like a book's quotes.
+
+    Parameters
+    ----------
+    db : DBCfg (Database Config Object)
+        Contains the SQL database interface.
+    book_id : int
+        The ID of the book to compare against.
+    k : int, optional(default=10)
+        The number of books to return.
+    path : str, optional(default=None)
+        The index directory. Defaults to '<database>.similar'.
+
+    Returns
+    -------
+    list : (book, cosine similarity) of the best matches, best first.
+    """
+    matches = quote_index(db, path).similar_groups(book_id, k)
+    logger.debug(f"Found {len(matches)} books like book {book_id}.")
+    return [(Book.load(db, i), score) for i, score in matches]
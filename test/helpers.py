@@ -0,0 +1,42 @@
+"""
+Test Helpers
+
+Factories shared by the test modules.
+
+"""
+
+# Package imports
+import datetime
+
+# Module imports
+from anthology.journals.book import Book, BookAuthor, Author
+from anthology.journals.session import Reading
+from anthology.database.config import DBCfg
+
+# Book fields the tests don't care about
+BOOK_DEFAULTS = dict(publisher="", publishyear="", publishloc="", edition="First",
+                     numpages=100, formattype="Book")
+
+def new_book(db : DBCfg, title : str, authors : list[Author]=(), save : bool=True,
+             **kwargs) -> Book:
+    """Make a book, saved and linked to its authors unless save is false.
+
+    Keyword arguments override the default book fields.
+    """
+    book = Book(db, title=title, **{**BOOK_DEFAULTS, **kwargs})
+    if save:
+        book.save()
+        for author in authors:
+            BookAuthor(db).save((author.id, book.id))
+    return book
+
+def add_reading(db : DBCfg, start : datetime.datetime, minutes : float, pages : int,
+                book_id : int, start_page : int=10) -> Reading:
+    """Save a reading session of a book."""
+    reading = Reading(db, start_time=start,
+                      end_time=start + datetime.timedelta(minutes=minutes),
+                      start_page=start_page, end_page=start_page + pages, source_type="Book",
+                      _source_id=book_id, _quotes=[])
+    reading.create()
+    reading.save()
+    return reading
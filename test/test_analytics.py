@@ -0,0 +1,75 @@
+
+# Package imports
+import unittest, datetime
+import numpy as np
+
+# Module imports
+from anthology.journals import analytics
+from anthology.database.config import DBCfg
+from anthology.test.helpers import add_reading
+
+class TestAnalytics(unittest.TestCase):
+    """Test the reading analytics module."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        day = datetime.datetime(2023, 12, 30, 20, 0, 0)
+        add_reading(self.db, day, 30, 15, 1)
+        add_reading(self.db, day + datetime.timedelta(hours=2), 60, 30, 2)
+        add_reading(self.db, day + datetime.timedelta(days=1), 45, 20, 1)
+        add_reading(self.db, day + datetime.timedelta(days=2), 15, 5, 1)
+        add_reading(self.db, day + datetime.timedelta(days=5), 60, 40, 2)
+
+    def test_daily_totals(self):
+        """Sessions are summed per day they started on."""
+        daily = analytics.daily_totals(self.db)
+        self.assertEqual(daily.days.astype(str).tolist(),
+                         ["2023-12-30", "2023-12-31", "2024-01-01", "2024-01-04"])
+        np.testing.assert_allclose(daily.minutes, [90, 45, 15, 60])
+        self.assertEqual(daily.pages.tolist(), [45, 20, 5, 40])
+        self.assertEqual(daily.sessions.tolist(), [2, 1, 1, 1])
+
+    def test_pace_and_years(self):
+        """Pace is grouped per book and totals per year."""
+        pace = analytics.book_pace(self.db)
+        self.assertEqual(pace.book_ids.tolist(), [1, 2])
+        np.testing.assert_allclose(pace.pages_per_hour, [40 * 60 / 90, 70 * 60 / 120])
+
+        years = analytics.yearly_totals(self.db)
+        self.assertEqual(years.years.tolist(), [2023, 2024])
+        self.assertEqual(years.books.tolist(), [2, 2])
+        self.assertEqual(years.sessions.tolist(), [3, 2])
+
+    def test_streaks_and_heatmap(self):
+        """Consecutive days form streaks and days fill a calendar grid."""
+        streaks = analytics.streaks(self.db, today=datetime.date(2024, 1, 5))
+        self.assertEqual((streaks.current, streaks.longest), (1, 3))
+        self.assertEqual(streaks.longest_start, datetime.date(2023, 12, 30))
+
+        grid = analytics.heatmap(self.db, 2024)
+        self.assertEqual(grid.shape, (53, 7))
+        self.assertEqual(grid[0, 0], 15)
+        self.assertEqual(grid[0, 3], 60)
+        self.assertTrue(np.isnan(grid[-1, -1]))
+
+    def test_cache(self):
+        """Results are reused until a new reading is saved."""
+        first = analytics.yearly_totals(self.db)
+        self.assertIs(analytics.yearly_totals(self.db), first)
+        add_reading(self.db, datetime.datetime(2024, 2, 1), 10, 1, 3)
+        self.assertEqual(analytics.yearly_totals(self.db).sessions.tolist(), [3, 3])
+
+        # Writes in quick succession are each seen.
+        reading = add_reading(self.db, datetime.datetime(2024, 3, 1), 10, 1, 3)
+        self.assertEqual(analytics.yearly_totals(self.db).pages.tolist(), [65, 47])
+        reading.end_page += 5
+        reading.save()
+        self.assertEqual(analytics.yearly_totals(self.db).pages.tolist(), [65, 52])
+
+        # Another database never sees these results.
+        other = DBCfg(":memory:")
+        self.assertEqual(analytics.yearly_totals(other).years.tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
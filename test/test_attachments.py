@@ -0,0 +1,137 @@
+
+# Package imports
+import io
+import os
+import tempfile
+import unittest
+
+# Module imports
+from anthology.journals.book import BookAttachment
+from anthology.journals.attachment import Attachment, THUMBNAILS_TABLE
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.deferred import DEFERRED
+from anthology.test.helpers import new_book
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 1000
+
+class TestAttachments(unittest.TestCase):
+    """Test storing attachments as BLOBs."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        self.reads = []
+        self.db.conn.set_trace_callback(
+            lambda sql: self.reads.append(sql) if "data" in sql else None)
+
+    def test_round_trip(self):
+        """Files are copied in and out in blocks, and never read by a load."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "scan.pdf")
+            with open(path, "wb") as fp:
+                fp.write(PDF)
+            item = Attachment.add(self.db, path)
+        self.assertEqual((item.name, item.media_type, item.size),
+                         ("scan.pdf", "application/pdf", len(PDF)))
+
+        out = io.BytesIO()
+        self.assertEqual(item.copy_to(out, block_size=1000), len(PDF))
+        self.assertEqual(out.getvalue(), PDF)
+        self.assertEqual([len(i) for i in item.stream(100000)], [100000, 100000, 56009])
+        with item.open() as blob:
+            self.assertEqual(blob.read(4), b"%PDF")
+
+        self.reads.clear()
+        loaded = Attachment.load(self.db, item.id)
+        self.assertIs(loaded.__dict__["data"], DEFERRED)
+        self.assertEqual(loaded, item)
+        self.assertEqual(self.reads, [])
+        self.assertEqual(loaded.data, PDF)
+
+    def test_dedupe(self):
+        """The same bytes are stored once, however many records they are attached to."""
+        first = Attachment.add(self.db, io.BytesIO(PDF), name="a.pdf")
+        second = Attachment.add(self.db, io.BytesIO(PDF), name="b.pdf")
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(second.name, "a.pdf")
+
+        books = []
+        for title in ("One", "Two"):
+            book = new_book(self.db, title)
+            BookAttachment(self.db).save((book.id, first.id))
+            books.append(book.id)
+        self.assertEqual(BookAttachment.get_attachment_book_ids(first.id, self.db), books)
+        self.assertEqual(BookAttachment.get_book_attachments(books[1], self.db), [first])
+        self.assertEqual(self.db.conn.execute("SELECT count(*) FROM Attachments").fetchone(),
+                         (1,))
+
+    def test_failed_add(self):
+        """A file that fails part way through is rolled back, not kept half written."""
+        class Failing(io.BytesIO):
+            read = 0
+            def readinto(self, buf):
+                # Fail once the bytes are being copied, after hashing.
+                if self.read > len(PDF):
+                    raise OSError("disk error")
+                n = super().readinto(buf)
+                self.read += n or 1
+                return n
+
+        with self.assertRaises(OSError):
+            Attachment.add(self.db, Failing(PDF), name="scan.pdf")
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.db.conn.execute("SELECT count(*) FROM Attachments").fetchone(),
+                         (0,))
+        item = Attachment.add(self.db, io.BytesIO(PDF), name="scan.pdf")
+        self.assertEqual(b"".join(item.stream()), PDF)
+
+        # Inside a caller's transaction, only the failed add is undone.
+        book = new_book(self.db, "Kept", save=False)
+        book.save(commit=False)
+        with self.assertRaises(OSError):
+            Attachment.add(self.db, Failing(PDF[1:]), name="other.pdf", commit=False)
+        self.assertTrue(self.db.conn.in_transaction)
+        self.db.conn.commit()
+        self.assertEqual(self.db.conn.execute("SELECT title FROM Books").fetchall(), [("Kept",)])
+        self.assertEqual(self.db.conn.execute("SELECT count(*) FROM Attachments").fetchone(),
+                         (1,))
+
+    def test_not_an_image(self):
+        """Attachments that aren't images have no thumbnail."""
+        item = Attachment.add(self.db, io.BytesIO(PDF), name="scan.pdf")
+        self.assertIsNone(item.thumbnail())
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    def test_thumbnail(self):
+        """Thumbnails are made once and cached until the attachment is deleted."""
+        cover = io.BytesIO()
+        Image.new("RGB", (1200, 800), "navy").save(cover, "JPEG")
+        cover.seek(0)
+        item = Attachment.add(self.db, cover, name="cover.jpg")
+        data = item.thumbnail(100)
+        with Image.open(io.BytesIO(data)) as thumb:
+            self.assertEqual(thumb.size, (100, 67))
+        self.assertEqual(item.thumbnail(100), data)
+
+        # A thumbnail made inside a caller's transaction leaves it open.
+        self.db.conn.execute("BEGIN")
+        item.thumbnail(50)
+        self.assertTrue(self.db.conn.in_transaction)
+        self.db.conn.rollback()
+        self.assertEqual(self.db.conn.execute(
+            f"SELECT count(*) FROM {THUMBNAILS_TABLE}").fetchone(), (1,))
+        item.delete()
+        self.assertEqual(self.db.conn.execute(
+            f"SELECT count(*) FROM {THUMBNAILS_TABLE}").fetchone(), (0,))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+
+# Package imports
+import unittest, datetime
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+
+# Module imports
+from anthology.database.config import DBCfg
+from anthology.database.datatable import DataTable
+from anthology.database.codecs import codec_for, encode, decode, benchmark
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+@dataclass
+class Shelf(DataTable):
+    """A table with collection fields."""
+    name: str
+    tags: list[str] = field(default_factory=list)
+    sizes: dict = field(default_factory=dict)
+    cover: bytes = b""
+
+    @property
+    def unique_ids(self) -> list[tuple]:
+        return [('name', self.name)]
+
+class TestCodecs(unittest.TestCase):
+    """Test storing field values through codecs."""
+
+    def test_round_trip(self):
+        """Collections and other values come back as the types they were."""
+        values = {
+            list[str]: ["physics", "mechanics"],
+            tuple: (1, (2, "three")),
+            set[int]: {1, 2, 3},
+            frozenset: frozenset({"a"}),
+            dict: {"pages": 320, 1: "one", (1, 2): {b"\x00", 4.5}},
+            bytes: b"\x00\xff",
+            complex: 3 - 4j,
+            datetime.datetime: datetime.datetime(2023, 5, 6, 7, 8, 9),
+            bool: True,
+            }
+        for tp, value in values.items():
+            with self.subTest(tp=tp):
+                stored = encode(value, tp)
+                self.assertIsInstance(stored, (str, bytes, int))
+                self.assertEqual(decode(stored, tp), value)
+                self.assertIs(type(decode(stored, tp)), type(value))
+
+    def test_no_eval(self):
+        """Stored text is never executed, and legacy str() lists still load."""
+        self.assertEqual(decode("['a', 'b']", list[str]), ["a", "b"])
+        self.assertEqual(decode("__import__('os').getcwd()", list), "__import__('os').getcwd()")
+        self.assertEqual(decode("2023-01-02 03:04:05", datetime.datetime | None),
+                         datetime.datetime(2023, 1, 2, 3, 4, 5))
+        self.assertEqual(codec_for(datetime.datetime, epoch=True).sql_type, "INTEGER")
+
+    def test_datatable(self):
+        """Collection fields are saved as JSON and loaded without eval."""
+        db = DBCfg(":memory:")
+        shelf = Shelf(db, name="Physics", tags=["mechanics", "optics"],
+                      sizes={(10, 20): 3}, cover=b"\x89PNG")
+        shelf.create()
+        shelf.save()
+        self.assertEqual(db.conn.execute("SELECT tags, typeof(cover) FROM Shelfs").fetchone(),
+                         ('["mechanics","optics"]', "blob"))
+        loaded = Shelf.load(db, shelf.id)
+        self.assertEqual((loaded.tags, loaded.sizes, loaded.cover),
+                         (shelf.tags, shelf.sizes, shelf.cover))
+
+    def test_unsupported(self):
+        """Only saved rows are stored as their IDs; other objects are refused."""
+        db = DBCfg(":memory:")
+        shelf = Shelf(db, name="Physics")
+        shelf.create()
+        shelf.save()
+        self.assertEqual(encode([shelf], list), f"[{shelf.id}]")
+        with self.assertRaises(TypeError):
+            encode([SimpleNamespace(id=1)], list)
+
+    def test_benchmark(self):
+        """The benchmark times both round trips."""
+        times = benchmark(number=10)
+        self.assertEqual(set(times), {"codec", "str_eval"})
+        self.assertTrue(all(t > 0 for t in times.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.session import Quote
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.search import search
+from anthology.database.compress import (compressed_fields, compress_rows, compression_stats,
+                                         COMPRESS_THRESHOLD)
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+LONG_TEXT = "The map is not the territory, and the menu is not the meal. " * 20
+
+def new_quote(db : DBCfg, excerpt : str, response : str="") -> Quote:
+    quote = Quote(db, excerpt=excerpt, pagenum=1, response=response, sourcetype="Book")
+    quote.save()
+    return quote
+
+class TestCompress(unittest.TestCase):
+    """Test compressing large text fields."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+
+    def stored_types(self, quote : Quote) -> tuple:
+        return self.db.conn.execute(
+            "SELECT typeof(excerpt), typeof(response) FROM Quotes WHERE id = ?",
+            (quote.id,)).fetchone()
+
+    def test_round_trip(self):
+        """Large text is stored compressed and only decompressed when read."""
+        self.assertEqual(compressed_fields(Quote),
+                         {"excerpt": COMPRESS_THRESHOLD, "response": COMPRESS_THRESHOLD})
+        quote = new_quote(self.db, LONG_TEXT + "Zebras.", "Short.")
+        self.assertEqual(self.stored_types(quote), ("blob", "text"))
+
+        loaded, = Quote.load_list(self.db, "id = ?", (quote.id,), undefer=["excerpt"])
+        self.assertIsInstance(loaded.__dict__["excerpt"], bytes)
+        self.assertEqual(loaded.excerpt, LONG_TEXT + "Zebras.")
+        self.assertIsInstance(loaded.__dict__["excerpt"], str)
+        self.assertEqual(loaded, quote)
+
+        # Saving an item that was never read keeps its compressed text.
+        loaded = Quote.load(self.db, quote.id)
+        loaded.pagenum = 2
+        loaded.save()
+        self.assertEqual(Quote.load(self.db, quote.id).excerpt, quote.excerpt)
+        self.assertEqual(Quote.load_table(self.db)[0][1], quote.excerpt)
+
+    def test_search(self):
+        """Compressed text is indexed, kept current and shown in snippets."""
+        quote = new_quote(self.db, LONG_TEXT + "Zebras graze.")
+        results = search(self.db, "zebras")
+        self.assertEqual([r.id for r in results], [quote.id])
+        self.assertIn("**Zebras**", results[0].snippet)
+
+        quote.excerpt = LONG_TEXT + "Giraffes browse."
+        quote.save()
+        self.assertEqual(search(self.db, "zebras"), [])
+        self.assertEqual([r.id for r in search(self.db, "giraffes")], [quote.id])
+        quote.delete()
+        self.assertEqual(search(self.db, "giraffes"), [])
+
+    def test_compress_rows(self):
+        """Text stored before compression is compressed in batches and measured."""
+        quotes = [new_quote(self.db, f"{LONG_TEXT} {i}") for i in range(5)]
+        self.db.conn.executemany("UPDATE Quotes SET excerpt = ? WHERE id = ?",
+                                 [(q.excerpt, q.id) for q in quotes])
+        self.assertEqual(self.stored_types(quotes[0]), ("text", "text"))
+
+        self.assertEqual(compress_rows(self.db.conn, "Quotes", compressed_fields(Quote),
+                                       batch_size=2), 5)
+        self.assertEqual(self.stored_types(quotes[0]), ("blob", "text"))
+        self.assertEqual(Quote.load(self.db, quotes[0].id).excerpt, quotes[0].excerpt)
+        self.assertEqual(sorted(r.id for r in search(self.db, "territory")),
+                         [q.id for q in quotes])
+
+        excerpt = compression_stats(self.db.conn, "Quotes", ["excerpt"])[0]
+        self.assertEqual((excerpt.rows, excerpt.compressed), (5, 5))
+        self.assertGreater(excerpt.ratio, 5)
+        self.assertGreater(excerpt.decode_us, 0)
+
+if __name__ == '__main__':
+    unittest.main()
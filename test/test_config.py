@@ -0,0 +1,70 @@
+
+# Package imports
+import unittest, tempfile
+
+# Module imports
+from anthology.journals.book import Author
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.writer import WriteBehind
+
+class TestConfig(unittest.TestCase):
+    """Test the in-memory and snapshot database modes."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/config.db"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def count(self, db : DBCfg) -> int:
+        return db.conn.execute("SELECT COUNT(*) FROM Authors").fetchone()[0]
+
+    def test_memory_isolated(self):
+        """Each in-memory configuration has a database of its own."""
+        a, b = DBCfg(":memory:"), DBCfg(":memory:")
+        create_all(a)
+        create_all(b)
+        Author(a, firstname="Jane", lastname="Austen").save()
+        self.assertTrue(a.in_memory)
+        self.assertEqual(self.count(a), 1)
+        self.assertEqual(self.count(b), 0)
+
+    def test_snapshot_persist(self):
+        """A snapshot loads the file and only writes it back on persist."""
+        disk = DBCfg(self.path)
+        create_all(disk)
+        Author(disk, firstname="Jane", lastname="Austen").save()
+
+        snap = DBCfg(self.path, snapshot=True)
+        self.assertTrue(snap.in_memory)
+        self.assertEqual(self.count(snap), 1)
+        Author(snap, firstname="Emily", lastname="Bronte").save()
+        self.assertEqual(self.count(disk), 1)
+
+        steps = []
+        snap.persist(pages=1, progress=lambda status, remaining, total: steps.append(remaining))
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1], 0)
+        self.assertEqual(self.count(disk), 2)
+        snap.close()
+        disk.close()
+
+    def test_persist_needs_file(self):
+        """A plain in-memory database has no file to persist to."""
+        with self.assertRaises(ValueError):
+            DBCfg(":memory:").persist()
+
+    def test_writer_in_memory(self):
+        """The writer saves to an in-memory database on its connection."""
+        db = DBCfg(":memory:")
+        create_all(db)
+        writer = WriteBehind(db)
+        author = Author(db, firstname="Mary", lastname="Shelley")
+        self.assertEqual(writer.save(author).result(1), author.id)
+        writer.close()
+        self.assertEqual(self.count(db), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor
+from anthology.journals.names import name_key
+from anthology.journals.dedupe import (dedupe, find_clusters, same_person, _candidates,
+                                       DEDUPE_THRESHOLD)
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+def new_author(db : DBCfg, first : str, last : str, mid : str="", country : str="") -> Author:
+    author = Author(db, firstname=first, midname=mid, lastname=last, country=country)
+    author.save()
+    return author
+
+class TestDedupe(unittest.TestCase):
+    """Test finding and merging creators entered more than once."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+
+    def test_name_key(self):
+        """Case, punctuation, diacritics and name order are folded."""
+        self.assertEqual(name_key("J.R.R.", "", "Tolkien"), "j r r tolkien")
+        self.assertEqual(name_key("J. R. R.", "", "Tolkien"), "j r r tolkien")
+        self.assertEqual(name_key("", "", "Tolkien, John Ronald Reuel"),
+                         "john ronald reuel tolkien")
+        self.assertEqual(name_key("Gabriel", "García", "Márquez"), "gabriel garcia marquez")
+        self.assertEqual(new_author(self.db, "Émile", "Zola").name_key, "emile zola")
+
+    def test_same_person(self):
+        self.assertTrue(same_person("j r r tolkien", "john ronald reuel tolkien"))
+        self.assertTrue(same_person("ursula k le guin", "ursula k leguin"))
+        self.assertFalse(same_person("christopher tolkien", "j r r tolkien"))
+        self.assertFalse(same_person("john smith", "jane smith"))
+
+    def test_clusters(self):
+        """Every name in a cluster matches every other."""
+        jrr = new_author(self.db, "J.R.R.", "Tolkien")
+        spaced = new_author(self.db, "J. R. R.", "Tolkien")
+        full = new_author(self.db, "", "Tolkien, John Ronald Reuel", country="UK")
+        new_author(self.db, "Christopher", "Tolkien")
+        j = new_author(self.db, "J.", "Smith")
+        john = new_author(self.db, "John", "Smith")
+        jane = new_author(self.db, "Jane", "Smith")
+        new_book(self.db, "The Hobbit", [spaced])
+        clusters = find_clusters(self.db, Author)
+        self.assertEqual(len(clusters), 2)
+        self.assertEqual(clusters[0][0], spaced.id)
+        self.assertEqual(sorted(clusters[0]), [jrr.id, spaced.id, full.id])
+        # J. Smith joins John or Jane, but not both.
+        self.assertEqual(len(clusters[1]), 2)
+        self.assertIn(j.id, clusters[1])
+        self.assertTrue({john.id, jane.id} & set(clusters[1]))
+
+    def test_candidates(self):
+        """Surnames only pair names with the same first initial."""
+        smiths = [new_author(self.db, first, "Smith") for first in ("Adam", "Bob", "Carl", "J.")]
+        john = new_author(self.db, "John", "Smith")
+        keys = dict(self.db.conn.execute("SELECT id, name_key FROM Authors"))
+        pairs = _candidates(self.db, "Authors", keys, DEDUPE_THRESHOLD)
+        self.assertEqual(pairs, [(smiths[3].id, john.id)])
+
+    def test_merge(self):
+        """Links move to the kept creator in bulk, and details are kept."""
+        jrr = new_author(self.db, "J.R.R.", "Tolkien")
+        full = new_author(self.db, "", "Tolkien, John Ronald Reuel", country="UK")
+        hobbit = new_book(self.db, "The Hobbit", [jrr, full])
+        lotr = new_book(self.db, "The Lord of the Rings", [full])
+        new_book(self.db, "The Silmarillion", [jrr])
+
+        report = dedupe(self.db, Author, dry_run=True)
+        self.assertEqual((report.clusters, report.merged), ([[jrr.id, full.id]], 0))
+        report = dedupe(self.db, Author)
+        self.assertEqual((report.merged, report.links), (1, 1))
+        self.assertEqual(Author.load_column(self.db, "id"), [jrr.id])
+        self.assertEqual(Author.load(self.db, jrr.id).country, "UK")
+        self.assertEqual(BookAuthor.get_creator_ids(hobbit.id, self.db), [jrr.id])
+        self.assertEqual(BookAuthor.get_creator_ids(lotr.id, self.db), [jrr.id])
+        self.assertEqual(lotr.author_display, "J.R.R.  Tolkien")
+        self.assertEqual(dedupe(self.db, Author).clusters, [])
+
+if __name__ == '__main__':
+    unittest.main()
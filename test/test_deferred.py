@@ -0,0 +1,68 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.session import Quote
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.deferred import deferred_fields, DEFERRED
+
+class TestDeferred(unittest.TestCase):
+    """Test loading items without their heavy columns."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        self.quotes = []
+        for i in range(5):
+            quote = Quote(self.db, excerpt=f"Excerpt {i}. " * 40, pagenum=i,
+                          response=f"Response {i}.", sourcetype="Book")
+            quote.save()
+            self.quotes.append(quote)
+        self.reads = []
+        self.db.conn.set_trace_callback(
+            lambda sql: self.reads.append(sql) if "FROM Quotes" in sql else None)
+
+    def test_load(self):
+        """Deferred fields are read from the database when first accessed."""
+        self.assertEqual(deferred_fields(Quote), ["excerpt", "response"])
+        quote = Quote.load(self.db, self.quotes[2].id)
+        self.assertNotIn("excerpt", self.reads[0])
+        self.assertIs(quote.__dict__["excerpt"], DEFERRED)
+        self.assertEqual(quote.pagenum, 2)
+        self.assertEqual(len(self.reads), 1)
+
+        self.assertEqual(quote.excerpt, self.quotes[2].excerpt)
+        self.assertEqual(len(self.reads), 2)
+        self.assertEqual(quote.excerpt, self.quotes[2].excerpt)
+        self.assertEqual(len(self.reads), 2)
+        self.assertEqual(quote, self.quotes[2])
+
+    def test_load_list(self):
+        """A list is read in one query, and undeferred in one more."""
+        quotes = Quote.load_list(self.db, "pagenum >= ?", (1,))
+        self.assertEqual([q.pagenum for q in quotes], [1, 2, 3, 4])
+        self.assertEqual(len(self.reads), 1)
+
+        Quote.undefer(quotes, ["response"])
+        self.assertEqual(len(self.reads), 2)
+        self.assertEqual([q.response for q in quotes], [f"Response {i}." for i in range(1, 5)])
+        self.assertTrue(all(q.__dict__["excerpt"] is DEFERRED for q in quotes))
+        self.assertEqual(len(self.reads), 2)
+
+        quotes = Quote.load_list(self.db, undefer=["excerpt", "response"])
+        self.assertEqual(quotes, self.quotes)
+        self.assertEqual(len(self.reads), 3)
+
+    def test_save(self):
+        """Saving an item keeps deferred fields that were never read."""
+        quote = Quote.load(self.db, self.quotes[0].id)
+        quote.pagenum = 10
+        quote.save()
+        self.assertIs(quote.__dict__["response"], DEFERRED)
+        loaded = Quote.load(self.db, quote.id)
+        self.assertEqual((loaded.pagenum, loaded.response), (10, "Response 0."))
+
+if __name__ == '__main__':
+    unittest.main()
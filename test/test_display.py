@@ -0,0 +1,66 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor
+from anthology.journals.utils import oxford_comma_list
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book
+
+class TestDisplay(unittest.TestCase):
+    """Test the display strings kept for books and creators."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        self.authors = []
+        for first, last in (("Terry", "Pratchett"), ("Neil", "Gaiman"), ("Ann", "Other")):
+            author = Author(self.db, firstname=first, lastname=last)
+            author.save()
+            self.authors.append(author)
+
+    def test_author_display(self):
+        """Stored author lists match the Oxford comma list of the authors."""
+        for n in range(4):
+            book = new_book(self.db, f"Book {n}", self.authors[:n], publishyear="1900",
+                            publishloc="London")
+            self.assertEqual(book.author_display, oxford_comma_list(book.author))
+        self.assertEqual(str(book), "Book 3 by Terry  Pratchett, Neil  Gaiman, and "
+                                    "Ann  Other, London, 1900")
+
+    def test_kept_current(self):
+        """Renames and unlinks refresh the books they touch."""
+        book = new_book(self.db, "Good Omens", self.authors[:2])
+        author = self.authors[0]
+        author.firstname = "Sir Terry"
+        author.save()
+        self.assertEqual(book.author_display, "Sir Terry  Pratchett and Neil  Gaiman")
+        self.db.conn.execute("DELETE FROM books_authors WHERE author_id = ?", (author.id,))
+        self.assertEqual(book.author_display, "Neil  Gaiman")
+        self.authors[1].delete()
+        self.assertEqual(book.author_display, "")
+
+    def test_insert_or_ignore(self):
+        """Links added with INSERT OR IGNORE, as by a sync, refresh their book."""
+        book = new_book(self.db, "Good Omens", self.authors[:1])
+        self.db.conn.execute(
+            "INSERT OR IGNORE INTO books_authors(author_id, book_id) VALUES (?, ?)",
+            (self.authors[1].id, book.id))
+        self.assertEqual(book.author_display, "Terry  Pratchett and Neil  Gaiman")
+
+    def test_list_display(self):
+        """Lists are read in a single query, in author then title order."""
+        new_book(self.db, "Mort", self.authors[:1], publishyear="1900", publishloc="London")
+        new_book(self.db, "Coraline", self.authors[1:2], publishyear="1900", publishloc="London")
+        new_book(self.db, "Anonymous", [], publishyear="1900", publishloc="London")
+        self.assertEqual([label for label, _ in Book.list_display(self.db)],
+                         ["Anonymous by , London, 1900",
+                          "Coraline by Neil  Gaiman, London, 1900",
+                          "Mort by Terry  Pratchett, London, 1900"])
+        self.assertEqual(Author.list_display(self.db),
+                         [(str(a), a.id) for a in sorted(self.authors, key=str)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+
+# Package imports
+import unittest, datetime
+
+# Module imports
+from anthology.journals.session import Reading
+from anthology.journals.progress import BookProgress
+from anthology.database.config import DBCfg
+from anthology.database.migrate import migrate_datetimes
+from anthology.test.helpers import add_reading
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+def add_readings(db : DBCfg, days : int) -> list[Reading]:
+    """Save one hour long reading session per day from 2023-01-01."""
+    start = datetime.datetime(2023, 1, 1, 20, 30)
+    return [add_reading(db, start + datetime.timedelta(days=day), 60, 10, 1, start_page=day * 10)
+            for day in range(days)]
+
+class TestEpoch(unittest.TestCase):
+    """Test storing datetimes as epoch seconds."""
+
+    def test_round_trip(self):
+        """Epoch datetimes are stored as integers and load back unchanged."""
+        db = DBCfg(":memory:", epoch_datetimes=True)
+        saved = add_readings(db, 2)
+        self.assertEqual(db.conn.execute(
+            "SELECT DISTINCT typeof(start_time) FROM Readings").fetchall(), [("integer",)])
+        loaded = Reading.load(db, saved[1].id)
+        self.assertEqual(loaded.start_time, saved[1].start_time)
+        self.assertEqual(loaded.end_time, saved[1].end_time)
+
+    def test_between(self):
+        """Range lookups match on the index in either storage format."""
+        for epoch in (False, True):
+            db = DBCfg(":memory:", epoch_datetimes=epoch)
+            saved = add_readings(db, 5)
+            found = Reading.between(db, datetime.datetime(2023, 1, 2),
+                                    datetime.datetime(2023, 1, 4))
+            self.assertEqual([r.id for r in found], [saved[1].id, saved[2].id])
+            plan = " ".join(str(i) for i in db.conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM Readings WHERE start_time >= 0"))
+            self.assertIn("Readings_start_time", plan)
+
+    def test_migrate(self):
+        """Text datetimes convert to epoch seconds in batches, and back."""
+        db = DBCfg(":memory:")
+        saved = add_readings(db, 7)
+        progress = BookProgress.load(db, 1)
+        steps = []
+        self.assertEqual(migrate_datetimes(
+            db, Reading, batch_size=3, progress=lambda done, total: steps.append(done)), 7)
+        self.assertEqual(steps, [3, 6, 7])
+        self.assertEqual(migrate_datetimes(db, Reading), 0)
+        self.assertEqual(db.conn.execute(
+            "SELECT DISTINCT typeof(end_time) FROM Readings").fetchall(), [("integer",)])
+
+        db.epoch_datetimes = True
+        self.assertEqual(Reading.load(db, saved[3].id).start_time, saved[3].start_time)
+        self.assertEqual(BookProgress.load(db, 1).minutes, progress.minutes)
+
+        self.assertEqual(migrate_datetimes(db, Reading, epoch=False), 7)
+        self.assertEqual(db.conn.execute(
+            "SELECT start_time FROM Readings WHERE id = ?", (saved[0].id,)).fetchone(),
+            ("2023-01-01 20:30:00",))
+
+
+if __name__ == '__main__':
+    unittest.main()
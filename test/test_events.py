@@ -0,0 +1,81 @@
+
+# Package imports
+import unittest, tempfile
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor
+from anthology.database.config import DBCfg
+from anthology.database.events import bus, Change, INSERT, UPDATE, DELETE
+from anthology.database.schema import create_all
+from anthology.database.writer import WriteBehind
+from anthology.tui.widgets.entry import EntryList
+
+class TestEvents(unittest.TestCase):
+    """Test the change feed."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DBCfg(f"{self.tmp.name}/events.db")
+        create_all(self.db)
+        self.changes = []
+        self.unsubscribe = bus.subscribe(self.changes.append, [Author, BookAuthor])
+
+    def tearDown(self):
+        self.unsubscribe()
+        self.db.conn.close()
+        self.tmp.cleanup()
+
+    def test_save_and_delete(self):
+        """Saves and deletes of followed tables are published once committed."""
+        author = Author(self.db, firstname="Mary", lastname="Shelley")
+        author.save()
+        author.country = "England"
+        author.save()
+        Book(self.db, title="Frankenstein", publisher="", publishyear="", publishloc="",
+             edition="", numpages=280, formattype="Book").save()
+        author.save(commit=False)
+        self.db.conn.commit()
+        author.delete()
+        self.assertEqual(self.changes, [Change(INSERT, Author, author.id),
+                                        Change(UPDATE, Author, author.id),
+                                        Change(DELETE, Author, author.id)])
+
+    def test_unsubscribe(self):
+        """Unsubscribed callbacks get nothing more."""
+        self.unsubscribe()
+        Author(self.db, firstname="Ann", lastname="Radcliffe").save()
+        self.assertEqual(self.changes, [])
+
+    def test_writer(self):
+        """The writer publishes its batch after the commit."""
+        writer = WriteBehind(self.db)
+        author = Author(self.db, firstname="Bram", lastname="Stoker")
+        book = Book(self.db, title="Dracula", publisher="", publishyear="", publishloc="",
+                    edition="", numpages=418, formattype="Book")
+        writer.save(author)
+        writer.save(book)
+        writer.link(BookAuthor, author, book)
+        writer.close()
+        self.assertEqual([(c.op, c.table) for c in self.changes],
+                         [(INSERT, Author), (INSERT, BookAuthor)])
+
+    def test_entry_list(self):
+        """Entry lists patch only the changed option."""
+        first = Author(self.db, firstname="Edgar", lastname="Poe")
+        first.save()
+        second = Author(self.db, firstname="Wilkie", lastname="Collins")
+        second.save()
+        entries = EntryList("Author", [], [(str(first), first.id), (str(second), second.id)],
+                            table=Author, db=self.db)
+        first.midname = "Allan"
+        first.save()
+        entries.apply_change(Change(UPDATE, Author, first.id))
+        self.assertEqual(entries._selection, [(str(first), first.id), (str(second), second.id)])
+        self.assertIn("Allan", entries._selection[0][0])
+        second.delete()
+        entries.apply_change(Change(DELETE, Author, second.id))
+        self.assertEqual([i for _, i in entries._selection], [first.id])
+
+
+if __name__ == '__main__':
+    unittest.main()
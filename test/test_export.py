@@ -0,0 +1,82 @@
+
+# Package imports
+import unittest, datetime, json, io
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor
+from anthology.database.config import DBCfg
+from anthology.database.export import export_table
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+def export_lines(db, cls, **kwargs) -> list:
+    """Export a table as JSON lines and parse each line."""
+    fp = io.StringIO()
+    export_table(db, cls, fp, **kwargs)
+    return [json.loads(i) for i in fp.getvalue().splitlines()]
+
+class TestExport(unittest.TestCase):
+    """Test the export module."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        BookAuthor.create(self.db)
+        self.authors = [
+            Author(self.db, firstname="Ursula", midname="K", lastname="Le Guin"),
+            Author(self.db, firstname="Terry", midname="", lastname="Pratchett"),
+            ]
+        for a in self.authors:
+            a.create()
+            a.save()
+        self.books = [
+            Book(self.db, title="The Dispossessed", publisher="Harper",
+                 publishyear="1974", publishloc="New York", edition="First",
+                 numpages=387, formattype="Book"),
+            Book(self.db, title="Mort", publisher="Gollancz",
+                 publishyear="1987", publishloc="London", edition="First",
+                 numpages=243, formattype="Book"),
+            ]
+        for b in self.books:
+            b.create()
+            b.save()
+        BookAuthor(self.db).save((self.authors[0].id, self.books[0].id))
+        BookAuthor(self.db).save((self.authors[1].id, self.books[0].id))
+        BookAuthor(self.db).save((self.authors[1].id, self.books[1].id))
+
+    def test_export_links(self):
+        """Books are exported with their resolved author names."""
+        rows = export_lines(self.db, Book)
+        self.assertEqual([r["title"] for r in rows], ["The Dispossessed", "Mort"])
+        self.assertEqual(rows[0]["authors"], ["Ursula K Le Guin", "Terry Pratchett"])
+        self.assertEqual(rows[1]["authors"], ["Terry Pratchett"])
+
+        rows = export_lines(self.db, BookAuthor)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2], {"author_id": 2, "book_id": 2,
+                                   "author": "Terry Pratchett", "book": "Mort"})
+
+    def test_export_csv(self):
+        """Tables are exported as CSV with a header row."""
+        fp = io.StringIO()
+        count = export_table(self.db, Author, fp, fmt="csv")
+        lines = fp.getvalue().splitlines()
+        self.assertEqual(count, 2)
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith("id,firstname,lastname"))
+
+    def test_export_incremental(self):
+        """Only rows after an ID or changed after a time are exported."""
+        rows = export_lines(self.db, Book, since_id=1)
+        self.assertEqual([r["title"] for r in rows], ["Mort"])
+
+        later = datetime.datetime.utcnow() + datetime.timedelta(seconds=1)
+        self.assertEqual(export_lines(self.db, Book, since=later), [])
+
+        earlier = datetime.datetime.utcnow() - datetime.timedelta(minutes=1)
+        rows = export_lines(self.db, Book, since=earlier)
+        self.assertEqual(len(rows), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor, BookGenre, BookSubGenre
+from anthology.journals.medium import Genre, SubGenre
+from anthology.journals.facets import facet_counts
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book
+
+class TestFacets(unittest.TestCase):
+    """Test faceted browsing of the library."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        authors = []
+        for first, last, gender, country in (("Ursula", "Le Guin", "F", "USA"),
+                                             ("Iain", "Banks", "M", "UK"),
+                                             ("Terry", "Pratchett", "M", "UK")):
+            author = Author(self.db, firstname=first, lastname=last,
+                            gender=gender, country=country)
+            author.save()
+            authors.append(author)
+        le_guin, banks, pratchett = authors
+        fiction = Genre(self.db, name="Fiction")
+        fiction.save()
+        scifi = SubGenre(self.db, name="Science Fiction")
+        scifi.save()
+        scifi.move_to(fiction)
+        self.books = [
+            new_book(self.db, "The Dispossessed", [le_guin], formattype="Paperback",
+                     publishyear="1974", rating=4.5),
+            new_book(self.db, "Excession", [banks], formattype="Ebook",
+                     publishyear="1996", rating=4.0),
+            new_book(self.db, "Good Omens", [pratchett], formattype="Paperback",
+                     publishyear="1990", rating=3.0),
+            new_book(self.db, "Mystery", [banks, pratchett], formattype="Ebook",
+                     publishyear="", rating=0.0),
+            ]
+        BookSubGenre(self.db).save((scifi.id, self.books[0].id))
+        BookSubGenre(self.db).save((scifi.id, self.books[1].id))
+        BookGenre(self.db).save((fiction.id, self.books[2].id))
+
+    def test_unfiltered(self):
+        """Every value is counted once per book."""
+        result = facet_counts(self.db)
+        self.assertEqual(result.total, 4)
+        self.assertEqual(result.counts["format"], [("Ebook", 2), ("Paperback", 2)])
+        self.assertEqual(result.counts["country"], [("UK", 3), ("USA", 1)])
+        self.assertEqual(result.counts["rating"], [(4, 2), (0, 1), (3, 1)])
+        self.assertEqual(result.counts["year"], [("1974", 1), ("1990", 1), ("1996", 1)])
+        self.assertEqual(result.counts["genre"], [("Fiction", 3)])
+
+    def test_filtered(self):
+        """Filters combine with AND, and a facet ignores its own selection."""
+        result = facet_counts(self.db, {"format": ["Ebook"], "country": ["UK"]})
+        self.assertEqual(result.book_ids, [self.books[1].id, self.books[3].id])
+        self.assertEqual(result.counts["format"], [("Ebook", 2), ("Paperback", 1)])
+        self.assertEqual(result.counts["country"], [("UK", 2)])
+        self.assertEqual(result.counts["gender"], [("M", 2)])
+        result = facet_counts(self.db, {"format": ["Ebook", "Paperback"], "genre": ["Fiction"]})
+        self.assertEqual(result.total, 3)
+        self.assertEqual(result.counts["genre"], [("Fiction", 3)])
+
+    def test_text(self):
+        """Typed text narrows the books like any other filter."""
+        result = facet_counts(self.db, {"format": ["Paperback"]}, text="goo")
+        self.assertEqual(result.book_ids, [self.books[2].id])
+        self.assertEqual(result.counts["format"], [("Paperback", 1)])
+
+    def test_refresh(self):
+        """Stored values are rebuilt after the library is written."""
+        self.assertEqual(facet_counts(self.db, {"format": ["Audio"]}).total, 0)
+        new_book(self.db, "Feet of Clay", [], formattype="Audio",
+                 publishyear="1996", rating=5.0)
+        result = facet_counts(self.db, {"format": ["Audio"]})
+        self.assertEqual(result.total, 1)
+        self.assertEqual(result.counts["year"], [("1996", 1)])
+
+    def test_bad_facet(self):
+        with self.assertRaises(ValueError):
+            facet_counts(self.db, {"colour": ["Blue"]})
+
+if __name__ == '__main__':
+    unittest.main()
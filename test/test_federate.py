@@ -0,0 +1,64 @@
+
+# Package imports
+import unittest, tempfile, datetime
+
+# Module imports
+from anthology.journals.book import Book
+from anthology.journals import analytics
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book, add_reading
+
+class TestFederate(unittest.TestCase):
+    """Test queries across attached libraries."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        ada = DBCfg(f"{self.tmp.name}/ada.db")
+        create_all(ada)
+        day = datetime.datetime(2024, 3, 1)
+        add_reading(self.db, day.replace(hour=9), 30, 10, new_book(self.db, "Emma").id)
+        new_book(self.db, "Middlemarch")
+        add_reading(ada, day.replace(hour=10), 30, 25, new_book(ada, "Middlemarch").id)
+        add_reading(ada, day.replace(hour=11), 30, 5, new_book(ada, "Emma").id)
+        add_reading(ada, day.replace(hour=12), 30, 5, Book.load(ada, "Emma", "title").id)
+        new_book(ada, "Ulysses")
+        ada.close()
+        self.db.attach(f"{self.tmp.name}/ada.db", "ada")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_load_sources(self):
+        """Items are streamed from every library, tagged with their source."""
+        books = list(Book.load_sources(self.db, "title <> ?", ("Ulysses",)))
+        self.assertEqual(sorted((src, b.title) for src, b in books),
+                         [("ada", "Emma"), ("ada", "Middlemarch"),
+                          ("main", "Emma"), ("main", "Middlemarch")])
+        self.assertEqual(len(list(Book.load_sources(self.db, sources=["main"]))), 2)
+
+    def test_shared(self):
+        """Books kept in both libraries are matched by their unique columns."""
+        shared = sorted(Book.shared(self.db))
+        self.assertEqual(shared, [(("Emma", "First"), ["main", "ada"]),
+                                  (("Middlemarch", "First"), ["main", "ada"])])
+
+    def test_library_totals(self):
+        """Reading totals are summed per library in one query."""
+        totals = analytics.library_totals(self.db)
+        self.assertEqual(totals.sources.tolist(), ["main", "ada"])
+        self.assertEqual(totals.pages.tolist(), [10, 35])
+        self.assertEqual(totals.sessions.tolist(), [1, 3])
+        self.assertEqual(totals.books.tolist(), [1, 2])
+
+    def test_bad_alias(self):
+        """Aliases must be new identifiers."""
+        for alias in ("main", "ada", "not valid"):
+            with self.assertRaises(ValueError):
+                self.db.attach(f"{self.tmp.name}/ada.db", alias)
+
+if __name__ == '__main__':
+    unittest.main()
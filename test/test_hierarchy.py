@@ -0,0 +1,81 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.book import Book, BookGenre, BookSubGenre, BookSubject
+from anthology.journals.medium import Genre, SubGenre, Subject
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book
+
+class TestHierarchy(unittest.TestCase):
+    """Test the category hierarchy and its counts."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        self.fiction = Genre(self.db, name="Fiction")
+        self.scifi = SubGenre(self.db, name="Science Fiction")
+        self.space = Subject(self.db, name="Space Opera")
+        self.horror = SubGenre(self.db, name="Horror")
+        for category in (self.fiction, self.scifi, self.space, self.horror):
+            category.save()
+        self.scifi.move_to(self.fiction)
+        self.space.move_to(self.scifi)
+        self.horror.move_to(self.fiction)
+        self.dune = new_book(self.db, "Dune")
+        self.carrie = new_book(self.db, "Carrie")
+        BookSubject(self.db).save((self.space.id, self.dune.id))
+        BookSubGenre(self.db).save((self.scifi.id, self.dune.id))
+        BookSubGenre(self.db).save((self.horror.id, self.carrie.id))
+
+    def test_paths(self):
+        """Ancestors and descendants are read nearest first."""
+        self.assertEqual(self.space.ancestors, [self.scifi.node, self.fiction.node])
+        self.assertEqual(sorted(self.fiction.descendants[:2]),
+                         sorted([self.scifi.node, self.horror.node]))
+        self.assertEqual(self.fiction.descendants[2], self.space.node)
+        self.assertEqual(self.space.parent, self.scifi.node)
+        self.assertIsNone(self.fiction.parent)
+
+    def test_counts(self):
+        """Each category counts the categories and links at or below it."""
+        self.assertEqual(self.fiction.counts, (3, 3))
+        self.assertEqual(self.scifi.counts, (1, 2))
+        self.assertEqual(self.space.counts, (0, 1))
+        self.db.conn.execute("DELETE FROM books_subjects")
+        self.assertEqual(self.fiction.counts, (3, 2))
+        self.assertEqual(self.scifi.counts, (1, 1))
+
+    def test_move(self):
+        """Moving a category moves its subtree and its counts."""
+        self.scifi.move_to(self.horror)
+        self.assertEqual(self.space.ancestors,
+                         [self.scifi.node, self.horror.node, self.fiction.node])
+        self.assertEqual(self.horror.counts, (2, 3))
+        self.assertEqual(self.fiction.counts, (3, 3))
+        self.scifi.move_to(None)
+        self.assertEqual(self.fiction.counts, (1, 1))
+        self.assertEqual(self.space.ancestors, [self.scifi.node])
+        with self.assertRaises(ValueError):
+            self.scifi.move_to(self.space)
+
+    def test_delete(self):
+        """Deleting a category makes its children roots."""
+        self.scifi.delete()
+        self.assertIsNone(self.space.parent)
+        self.assertEqual(self.space.counts, (0, 1))
+        self.assertEqual(self.fiction.counts, (1, 1))
+
+    def test_in_category(self):
+        """Books are found through any link below a category."""
+        self.assertEqual(Book.in_category(self.db, self.fiction),
+                         sorted([self.dune.id, self.carrie.id]))
+        self.assertEqual(Book.in_category(self.db, self.scifi), [self.dune.id])
+        self.assertEqual(Book.in_category(self.db, self.space), [self.dune.id])
+        self.assertEqual(sorted(self.dune.category_nodes),
+                         sorted([self.space.node, self.scifi.node]))
+
+if __name__ == '__main__':
+    unittest.main()
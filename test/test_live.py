@@ -0,0 +1,140 @@
+
+# Package imports
+import datetime
+import unittest
+
+# Module imports
+from anthology.journals.session import Quote, Reading, ReadingQuote
+from anthology.journals.live import LiveReading, Checkpointer, CHECKPOINT_TABLE
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book
+
+class TestLiveReading(unittest.TestCase):
+    """Test recording a reading session as it happens."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        self.book = new_book(self.db, "Middlemarch")
+        self.start = datetime.datetime(2024, 3, 1, 21, 0, 0)
+        self.live = LiveReading(self.book.id, start_page=10)
+        self.writes = []
+        self.db.conn.set_trace_callback(
+            lambda sql: self.writes.append(sql) if CHECKPOINT_TABLE in sql
+                        and sql.lstrip().startswith("INSERT") else None)
+
+    def minutes(self, n : float) -> datetime.datetime:
+        return self.start + datetime.timedelta(minutes=n)
+
+    def checkpoints(self) -> int:
+        return self.db.conn.execute(f"SELECT count(*) FROM {CHECKPOINT_TABLE}").fetchone()[0]
+
+    def test_timer(self):
+        """Paused time isn't counted."""
+        self.live.start(self.minutes(0))
+        self.live.pause(self.minutes(20))
+        self.live.start(self.minutes(30))
+        self.assertEqual(self.live.seconds(self.minutes(40)), 1800)
+        self.assertEqual(self.live.start_time, self.start)
+
+    def test_coalesced(self):
+        """Many edits within an interval are written as one checkpoint."""
+        checkpointer = Checkpointer(self.db, self.live, interval=5.0)
+        self.assertFalse(checkpointer.flush(clock=0.0))
+        for page in range(11, 40):
+            self.live.page = page
+            checkpointer.touch()
+            checkpointer.flush(clock=page / 10)
+        self.assertEqual(len(self.writes), 1)
+        self.assertTrue(checkpointer.flush(clock=7.0))
+        self.assertFalse(checkpointer.flush(clock=8.0))
+        self.assertEqual(len(self.writes), 2)
+        self.assertEqual(LiveReading.recover(self.db).page, 39)
+
+        # A running timer is checkpointed every interval without edits.
+        self.live.start()
+        self.assertTrue(checkpointer.flush(clock=12.0))
+        self.assertFalse(checkpointer.flush(clock=13.0))
+        self.assertTrue(checkpointer.flush(clock=17.0))
+
+    def test_recover(self):
+        """A crashed session resumes paused at its last checkpoint."""
+        self.live.start(self.minutes(0))
+        self.live.page = 25
+        self.live.add_quote("To be ignorant of the lives of the most celebrated men.")
+        self.live.checkpoint(self.db, self.minutes(12))
+
+        live = LiveReading.recover(self.db)
+        self.assertFalse(live.running)
+        self.assertEqual(live.elapsed, 720)
+        self.assertEqual((live.key, live.page, live.quotes),
+                         (self.live.key, 25, self.live.quotes))
+        self.assertEqual(live.quotes[0].pagenum, 25)
+
+    def test_finish(self):
+        """Stopping saves the reading, its quotes and links together."""
+        existing = Quote(self.db, excerpt="Known quote.", pagenum=1, response="",
+                         sourcetype="Book")
+        existing.save()
+        self.live.start(self.minutes(0))
+        self.live.page = 30
+        self.live.add_quote("A new quote.", response="Good.")
+        self.live.add_quote("Known quote.")
+        self.live.checkpoint(self.db)
+
+        reading = self.live.finish(self.db, self.minutes(45))
+        self.assertEqual((reading.start_time, reading.end_time, reading.num_pages_read),
+                         (self.start, self.minutes(45), 20))
+        quotes = ReadingQuote.get_reading_quotes(reading.id, self.db)
+        self.assertEqual(len(quotes), 2)
+        self.assertIn(existing, quotes)
+        self.assertEqual(self.checkpoints(), 0)
+
+    def test_duplicate_quote(self):
+        """An excerpt captured twice in a session is saved and linked once."""
+        self.live.start(self.minutes(0))
+        self.live.add_quote("Same words.")
+        self.live.add_quote("Same words.")
+        reading = self.live.finish(self.db, self.minutes(10))
+        self.assertEqual(len(ReadingQuote.get_reading_quote_ids(reading.id, self.db)), 1)
+        self.assertEqual(len(Quote.load_table(self.db)), 1)
+
+    def test_finish_rolled_back(self):
+        """A session that can't be saved leaves nothing behind but its checkpoint."""
+        self.live.start(self.minutes(0))
+        self.live.add_quote("A quote.")
+        self.live.checkpoint(self.db)
+        # The same times as a stored reading break its unique key.
+        LiveReading(self.book.id, start_time=self.start).finish(self.db, self.minutes(0))
+        with self.assertRaises(Exception):
+            self.live.finish(self.db, self.minutes(0))
+        self.assertEqual(len(Reading.load_table(self.db)), 1)
+        self.assertEqual(Quote.load_table(self.db), [])
+        self.assertEqual(self.checkpoints(), 1)
+
+    def test_finish_in_transaction(self):
+        """Inside a caller's transaction, a failed save only undoes its own writes."""
+        self.live.start(self.minutes(0))
+        self.live.add_quote("A quote.")
+        LiveReading(self.book.id, start_time=self.start).finish(self.db, self.minutes(0))
+
+        self.db.conn.execute("BEGIN")
+        new_book(self.db, "Kept", save=False).save(commit=False)
+        with self.assertRaises(Exception):
+            self.live.finish(self.db, self.minutes(0))
+        self.assertTrue(self.db.conn.in_transaction)
+        self.assertEqual(self.db.conn.execute(
+            "SELECT count(*) FROM Books WHERE title = 'Kept'").fetchone(), (1,))
+
+        # A session saved inside it isn't committed for the caller.
+        other = LiveReading(self.book.id, start_time=self.minutes(60))
+        reading = other.finish(self.db, self.minutes(90))
+        self.assertTrue(self.db.conn.in_transaction)
+        self.db.conn.rollback()
+        self.assertFalse(Reading.load(self.db, reading.id))
+        self.assertEqual(self.db.conn.execute(
+            "SELECT count(*) FROM Books WHERE title = 'Kept'").fetchone(), (0,))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+
+# Package imports
+import unittest, tempfile, os
+
+# Module imports
+from anthology.journals.book import Author
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.maintenance import (Maintenance, backup, incremental_vacuum,
+                                            last_runs)
+
+class TestMaintenance(unittest.TestCase):
+    """Test online backups, vacuum and the maintenance schedule."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DBCfg(f"{self.tmp.name}/maint.db")
+        create_all(self.db)
+        for i in range(200):
+            Author(self.db, firstname=f"First {i}", lastname="x" * 500).save(commit=False)
+        self.db.conn.commit()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_backup_steps(self):
+        """Backups are copied in steps into a timestamped file."""
+        steps = []
+        path = backup(self.db, self.tmp.name, pages=5,
+                      progress=lambda status, remaining, total: steps.append(remaining))
+        self.assertTrue(os.path.basename(path).startswith("maint-"))
+        self.assertGreater(len(steps), 1)
+        copy = DBCfg(path)
+        self.assertEqual(copy.conn.execute("SELECT COUNT(*) FROM Authors").fetchone()[0], 200)
+        copy.close()
+
+    def test_incremental_vacuum(self):
+        """New databases free pages incrementally."""
+        self.assertEqual(self.db.conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        self.db.conn.execute("DELETE FROM Authors")
+        self.db.conn.commit()
+        self.assertGreater(incremental_vacuum(self.db, pages=5), 0)
+        self.assertGreater(incremental_vacuum(self.db, pages=0), 0)
+        self.assertEqual(self.db.conn.execute("PRAGMA freelist_count").fetchone()[0], 0)
+
+    def test_due(self):
+        """Tasks fall due after the interval, or early once rows churn."""
+        maint = Maintenance(self.db, interval=3600, churn=3)
+        self.assertEqual(maint.due(), ["vacuum", "analyze"])
+        report = maint.run()
+        self.assertTrue(report.analyzed)
+        self.assertEqual(maint.due(), [])
+        # Writes are counted from the database, whichever connection made them.
+        Author(self.db, firstname="Churn", lastname="").save()
+        other = DBCfg(self.db.db)
+        other.conn.execute("UPDATE Authors SET lastname = 'y' WHERE id <= 2")
+        other.conn.commit()
+        other.close()
+        self.assertEqual(maint.churned(), 3)
+        self.assertEqual(maint.due(), ["vacuum", "analyze"])
+        maint.run()
+        self.assertEqual(maint.churned(), 0)
+        self.assertEqual(set(last_runs(self.db)), {"vacuum", "analyze"})
+        maint.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+
+# Package imports
+import unittest, datetime
+
+# Module imports
+from anthology.journals.book import Book
+from anthology.journals.session import Reading, Quote, ReadingQuote, quote_hash
+from anthology.journals.progress import BookProgress
+from anthology.database.config import DBCfg
+from anthology.database.migrate import (plan_migration, migrate_schema, schema_version,
+                                        MIGRATIONS_TABLE)
+from anthology.database.schema import ensure_schema
+
+class TestMigrate(unittest.TestCase):
+    """Test bringing existing tables up to date with their classes."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+
+    def test_add_columns(self):
+        """New fields are added in place with their defaults."""
+        # A Books table from before the curpage, timesread and rating fields.
+        self.db.conn.execute("""
+            CREATE TABLE Books(id INTEGER PRIMARY KEY, title TEXT, publisher TEXT,
+                publishyear TEXT, publishloc TEXT, edition TEXT, numpages INTEGER,
+                formattype TEXT, UNIQUE (title, edition))""")
+        self.db.conn.execute("""
+            INSERT INTO Books(title, publisher, publishyear, publishloc, edition,
+                numpages, formattype)
+            VALUES ('Dune', 'Chilton', '1965', 'Philadelphia', 'First', 412, 'Book')""")
+
+        planned = migrate_schema(self.db, [Book], dry_run=True)
+        self.assertEqual([(s.action, s.column) for s in planned],
+                         [("add", "curpage"), ("add", "timesread"), ("add", "rating")])
+        self.assertEqual(schema_version(self.db), 0)
+
+        self.assertEqual(migrate_schema(self.db, [Book]), planned)
+        self.assertEqual(plan_migration(self.db, [Book]), [])
+        self.assertEqual(schema_version(self.db), 1)
+        self.assertEqual(self.db.conn.execute(
+            f"SELECT count(*) FROM {MIGRATIONS_TABLE} WHERE version = 1").fetchone(), (3,))
+        self.assertEqual(self.db.conn.execute(
+            "SELECT curpage, timesread, rating FROM Books").fetchone(), (0, 0, 0.0))
+
+    def test_rebuild(self):
+        """Changed column types are rebuilt in batches, converting the values."""
+        book = 1
+        start = datetime.datetime(2023, 3, 1, 9)
+        readings = []
+        for day in range(10):
+            reading = Reading(self.db, start_time=start + datetime.timedelta(days=day),
+                              end_time=start + datetime.timedelta(days=day, minutes=30),
+                              start_page=day * 5, end_page=day * 5 + 5,
+                              source_type="Book", _source_id=book, _quotes=[])
+            reading.create()
+            reading.save()
+            readings.append(reading)
+
+        self.db.epoch_datetimes = True
+        self.assertEqual({(s.action, s.column, s.old_type, s.new_type)
+                          for s in plan_migration(self.db, [Reading])},
+                         {("rebuild", "start_time", "DATETIME", "INTEGER"),
+                          ("rebuild", "end_time", "DATETIME", "INTEGER")})
+        batches = []
+        migrate_schema(self.db, [Reading], memory_budget=1000,
+                       progress=lambda name, done, total: batches.append((name, done, total)))
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(batches[-1], ("Readings", 10, 10))
+
+        self.assertEqual(self.db.conn.execute(
+            "SELECT DISTINCT typeof(start_time) FROM Readings").fetchall(), [("integer",)])
+        self.assertEqual(Reading.load(self.db, readings[4].id).start_time,
+                         readings[4].start_time)
+
+        # The index and progress triggers are back on the new table.
+        self.assertIn(("Readings_start_time",), self.db.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'").fetchall())
+        Reading(self.db, start_time=start + datetime.timedelta(days=20),
+                end_time=start + datetime.timedelta(days=20, hours=1), start_page=50,
+                end_page=60, source_type="Book", _source_id=book, _quotes=[]).save()
+        self.assertEqual(BookProgress.load(self.db, book).pages, 60)
+
+    def test_derived_key(self):
+        """A new hash key is computed for each row, and duplicates under it merged."""
+        # A Quotes table keyed on the whole excerpt.
+        self.db.conn.execute("""
+            CREATE TABLE Quotes(id INTEGER PRIMARY KEY, excerpt TEXT, pagenum INTEGER,
+                response TEXT, sourcetype TEXT, UNIQUE (excerpt))""")
+        self.db.conn.executemany("""
+            INSERT INTO Quotes(excerpt, pagenum, response, sourcetype) VALUES (?, ?, '', 'Book')""",
+            [(f"Quote {i}.", i) for i in range(20)] + [("QUOTE  3.", 99)])
+
+        self.assertEqual([(s.action, s.column) for s in plan_migration(self.db, [Quote])],
+                         [("rebuild", "content_hash")])
+        migrate_schema(self.db, [Quote], memory_budget=500)
+        self.assertEqual(self.db.conn.execute(
+            "SELECT count(*), count(DISTINCT content_hash) FROM Quotes").fetchone(), (20, 20))
+        self.assertEqual(Quote.load(self.db, 4).content_hash, quote_hash("Quote 3.", "Book"))
+        self.assertEqual(Quote.find(self.db, "quote 3.", "Book").pagenum, 3)
+        self.assertNotIn("UNIQUE (excerpt)", self.db.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'Quotes'").fetchone()[0])
+
+    def test_merged_duplicates(self):
+        """Links and details of rows dropped as duplicates move to the row kept."""
+        self.db.conn.execute("""
+            CREATE TABLE Quotes(id INTEGER PRIMARY KEY, excerpt TEXT, pagenum INTEGER,
+                response TEXT, sourcetype TEXT, UNIQUE (excerpt))""")
+        self.db.conn.executemany("""
+            INSERT INTO Quotes(excerpt, pagenum, response, sourcetype) VALUES (?, ?, ?, 'Book')""",
+            [("Quote 3.", 3, ""), ("Other.", 5, ""), ("QUOTE  3.", 99, "Mine.")])
+        ensure_schema(self.db, [ReadingQuote])
+        self.db.conn.executemany("INSERT INTO readings_quotes VALUES (?, ?)",
+                                 [(1, 3), (2, 1), (2, 3)])
+        self.db.conn.commit()
+
+        migrate_schema(self.db, [Quote])
+        quote = Quote.load(self.db, 1)
+        self.assertEqual((quote.pagenum, quote.response), (3, "Mine."))
+        self.assertFalse(Quote.load(self.db, 3))
+        self.assertEqual(self.db.conn.execute(
+            "SELECT * FROM readings_quotes ORDER BY reading_id").fetchall(), [(1, 1), (2, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
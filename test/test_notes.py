@@ -0,0 +1,95 @@
+
+# Package imports
+import random
+import unittest
+
+# Module imports
+from anthology.journals.book import BookNote
+from anthology.journals.session import Note, NoteChunk, Quote, QuoteNote
+from anthology.journals.notes import split_chunks, CHUNK_MAX
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.test.helpers import new_book
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+def long_text(lines : int, seed : int=0) -> str:
+    rand = random.Random(seed)
+    words = "the map is not the territory and the menu is not the meal".split()
+    return "".join(" ".join(rand.choices(words, k=rand.randint(3, 30))) + "\n"
+                   for _ in range(lines))
+
+class TestNotes(unittest.TestCase):
+    """Test chunked note storage and revisions."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        create_all(self.db)
+        self.text = long_text(2000)
+        self.note = Note(self.db, title="Territories")
+        self.note.write(self.text)
+
+    def chunk_count(self) -> int:
+        return self.db.conn.execute("SELECT count(*) FROM NoteChunks").fetchone()[0]
+
+    def test_split(self):
+        """Chunks join back into the text, and long lines are cut."""
+        self.assertEqual("".join(split_chunks(self.text)), self.text)
+        self.assertGreater(len(split_chunks(self.text)), 10)
+        line = "x" * (CHUNK_MAX * 2 + 10)
+        self.assertEqual([len(i) for i in split_chunks(line)], [CHUNK_MAX, CHUNK_MAX, 10])
+        self.assertEqual(split_chunks(""), [])
+
+    def test_edit(self):
+        """A one character edit writes only the chunks around it."""
+        self.assertGreater(len(self.text), 100000)
+        chunks = self.chunk_count()
+        middle = len(self.text) // 2
+        edited = self.text[:middle] + "X" + self.text[middle + 1:]
+        self.assertLessEqual(self.note.write(edited), 2)
+        self.assertLessEqual(self.chunk_count(), chunks + 2)
+        self.assertEqual(self.note.write(edited), 0)
+        self.assertEqual(self.note.revision, 2)
+
+        loaded = Note.load(self.db, self.note.id)
+        self.assertEqual(loaded.text, edited)
+        self.assertEqual("".join(loaded.stream(batch=3)), edited)
+
+    def test_revisions(self):
+        """Earlier versions are rebuilt from the deltas."""
+        versions = ["", self.text, self.text + "# More\n", "# Less\n" + self.text[5000:]]
+        for text in versions[2:]:
+            self.note.write(text)
+        self.assertEqual([rev for rev, _ in self.note.revisions()], [1, 2, 3])
+        for rev, text in enumerate(versions):
+            self.assertEqual(self.note.text_at(rev), text)
+
+    def test_delete(self):
+        """Deleting a note keeps only the chunks other notes use."""
+        self.note.write(self.text + "# More\n")
+        other = Note(self.db, title="Copy")
+        other.write(self.text)
+        self.note.delete()
+        self.assertEqual(self.chunk_count(), len(set(other.chunks)))
+        self.assertEqual(Note.load(self.db, other.id).text, self.text)
+        other.delete()
+        self.assertEqual(self.chunk_count(), 0)
+        self.assertEqual(self.db.conn.execute("SELECT count(*) FROM note_revisions").fetchone(),
+                         (0,))
+
+    def test_links(self):
+        """Notes are linked to books and quotes."""
+        book = new_book(self.db, "Maps")
+        quote = Quote(self.db, excerpt="The map is not the territory.", pagenum=1,
+                      response="", sourcetype="Book")
+        quote.save()
+        BookNote(self.db).save((book.id, self.note.id))
+        QuoteNote(self.db).save((quote.id, self.note.id))
+        self.assertEqual([n.id for n in BookNote.get_book_notes(book.id, self.db)],
+                         [self.note.id])
+        self.assertEqual(BookNote.get_note_book_ids(self.note.id, self.db), [book.id])
+        self.assertEqual(QuoteNote.get_quote_note_ids(quote.id, self.db), [self.note.id])
+
+if __name__ == '__main__':
+    unittest.main()
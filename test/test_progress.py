@@ -0,0 +1,56 @@
+
+# Package imports
+import unittest, datetime
+
+# Module imports
+from anthology.journals.book import Book
+from anthology.journals.progress import BookProgress, PROGRESS_TABLE, track_progress
+from anthology.database.config import DBCfg
+from anthology.test.helpers import add_reading
+
+class TestProgress(unittest.TestCase):
+    """Test the book progress summary."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        self.book = Book(self.db, title="Middlemarch", publisher="", publishyear="1871",
+                         publishloc="", edition="", numpages=400, formattype="Book")
+        self.book.create()
+        self.book.save()
+        self.day = datetime.datetime(2024, 3, 1, 21, 0, 0)
+        self.readings = [
+            add_reading(self.db, self.day, 60, 40, self.book.id, start_page=0),
+            add_reading(self.db, self.day + datetime.timedelta(days=4), 30, 60, self.book.id,
+                        start_page=40),
+            ]
+
+    def test_progress(self):
+        """Saving readings adds to the book's summary."""
+        progress = self.book.progress
+        self.assertEqual((progress.pages, progress.minutes, progress.sessions), (100, 90, 2))
+        self.assertEqual(progress.curpage, 100)
+        self.assertEqual(progress.numpages, 400)
+        self.assertEqual(progress.last_session, self.day + datetime.timedelta(days=4, minutes=30))
+        # 100 pages over four days leaves 300 pages for twelve more days.
+        self.assertEqual(progress.estimated_finish.date(), datetime.date(2024, 3, 17))
+
+    def test_progress_edits(self):
+        """Deleting or editing a reading recomputes only its book."""
+        self.db.cursor.execute("DELETE FROM Readings WHERE id = ?", (self.readings[1].id,))
+        progress = BookProgress.load(self.db, self.book.id)
+        self.assertEqual((progress.pages, progress.sessions, progress.curpage), (40, 1, 40))
+
+        self.db.cursor.execute("UPDATE Readings SET _source_id = 7 WHERE id = ?",
+                               (self.readings[0].id,))
+        self.assertIsNone(BookProgress.load(self.db, self.book.id))
+        self.assertEqual(list(BookProgress.load_all(self.db)), [7])
+
+    def test_backfill(self):
+        """Readings saved before the summary existed are summarized."""
+        self.db.cursor.execute(f"DROP TABLE {PROGRESS_TABLE}")
+        track_progress(self.db)
+        self.assertEqual(BookProgress.load(self.db, self.book.id).pages, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
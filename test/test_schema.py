@@ -0,0 +1,80 @@
+
+# Package imports
+import unittest, tempfile
+
+# Module imports
+from anthology.journals.book import Book, BookAuthor
+from anthology.journals.session import Reading, ReadingQuote
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all, ensure_schema, forget_schema
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+def tables(db : DBCfg) -> set[str]:
+    """Get the names of the tables in a database."""
+    return {i[0] for i in db.conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+class TestSchema(unittest.TestCase):
+    """Test the ensure-schema-once registry."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/schema.db"
+        self.db = DBCfg(self.path)
+
+    def tearDown(self):
+        self.db.conn.close()
+        self.tmp.cleanup()
+
+    def test_create_all(self):
+        """Every table is created at startup, with its indexes and triggers."""
+        names = create_all(self.db)
+        self.assertTrue({"Books", "Readings", "Quotes", "books_authors",
+                         "readings_quotes"} <= set(names))
+        self.assertTrue({"Books", "Readings", "book_progress", "Quotes_fts"} <= tables(self.db))
+        self.assertIn(("Readings_start_time",), self.db.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'").fetchall())
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(create_all(self.db), [])
+        # Abstract bases get no table of their own.
+        self.assertFalse({"Creators", "Categorys", "Mediums"} & tables(self.db))
+
+    def test_create_once(self):
+        """Later create() calls run no SQL, even from another connection."""
+        book = Book(self.db, title="Walden", publisher="", publishyear="1854",
+                    publishloc="Boston", edition="First", numpages=352, formattype="Book")
+        book.create()
+        other = DBCfg(self.path)
+        statements = []
+        other.conn.set_trace_callback(statements.append)
+        Book(other, title="Walden", publisher="", publishyear="", publishloc="",
+             edition="Second", numpages=1, formattype="Book").create()
+        self.assertEqual(statements, ["PRAGMA database_list"])
+        BookAuthor.create(other)
+        self.assertTrue(any("CREATE TABLE" in s for s in statements))
+        statements.clear()
+        BookAuthor.create(other)
+        self.assertEqual(statements, ["PRAGMA database_list"])
+        other.conn.close()
+
+    def test_types_from_fields(self):
+        """Column types come from the field types, not the instance values."""
+        ensure_schema(self.db, [Reading, ReadingQuote])
+        cols = {r[1]: r[2] for r in self.db.conn.execute("PRAGMA table_info(Readings)")}
+        self.assertEqual((cols["start_time"], cols["start_page"], cols["_quotes"]),
+                         ("DATETIME", "INTEGER", "TEXT"))
+
+    def test_forget(self):
+        """Forgotten tables are created again."""
+        ensure_schema(self.db, [Book])
+        self.db.conn.execute("DROP TABLE Books")
+        self.assertEqual(ensure_schema(self.db, [Book]), [])
+        forget_schema(self.db)
+        self.assertEqual(ensure_schema(self.db, [Book]), ["Books"])
+        self.assertIn("Books", tables(self.db))
+
+
+if __name__ == '__main__':
+    unittest.main()
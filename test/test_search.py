@@ -0,0 +1,76 @@
+
+# Package imports
+import unittest
+
+# Module imports
+from anthology.journals.book import Book, Author
+from anthology.journals.session import Quote
+from anthology.database.config import DBCfg
+from anthology.database.search import search, fts_query, index_search
+
+class TestSearch(unittest.TestCase):
+    """Test the full-text search module."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        self.quotes = [
+            Quote(self.db, excerpt="The map is not the territory.", pagenum=58,
+                  response="Models are always simplifications.", sourcetype="Book"),
+            Quote(self.db, excerpt="A journey of a thousand miles begins with a single step.",
+                  pagenum=64, response="Start small.", sourcetype="Book"),
+            ]
+        # The first quote is saved before the index exists.
+        self.quotes[0].create()
+        for op in ("insert", "update", "delete"):
+            self.db.cursor.execute(f"DROP TRIGGER Quotes_fts_{op}")
+        self.db.cursor.execute("DROP TABLE Quotes_fts")
+        self.quotes[0].save()
+        index_search(self.db, "Quotes", Quote.search_fields)
+        self.quotes[1].save()
+
+        self.book = Book(self.db, title="Science and Sanity", publisher="Institute of General Semantics",
+                         publishyear="1933", publishloc="Lakeville", edition="Fifth",
+                         numpages=910, formattype="Book")
+        self.book.create()
+        self.book.save()
+        self.author = Author(self.db, firstname="Alfred", midname="", lastname="Korzybski")
+        self.author.create()
+        self.author.save()
+
+    def test_fts_query(self):
+        """Free text is quoted and the last word matches as a prefix."""
+        self.assertEqual(fts_query("map -is NOT"), '"map" "is" "NOT"*')
+        self.assertEqual(fts_query("  --  "), "")
+
+    def test_search(self):
+        """Matches are found across kinds and highlighted."""
+        results = search(self.db, "territory")
+        self.assertEqual(len(results), 1)
+        self.assertEqual((results[0].kind, results[0].id), ("quote", self.quotes[0].id))
+        self.assertIn("**territory**", results[0].snippet)
+
+        results = search(self.db, "journeys")
+        self.assertEqual([r.id for r in results], [self.quotes[1].id])
+
+        results = search(self.db, "korzyb")
+        self.assertEqual([r.kind for r in results], ["author"])
+
+        results = search(self.db, "semantics", kinds=["quote"])
+        self.assertEqual(results, [])
+        results = search(self.db, "semantics", kinds=["book", "quote"])
+        self.assertEqual([r.kind for r in results], ["book"])
+
+    def test_search_sync(self):
+        """The index follows updates and deletes of the table."""
+        self.db.cursor.execute(
+            "UPDATE Quotes SET response = 'Compasses help.' WHERE id = ?",
+            (self.quotes[1].id,))
+        self.assertEqual(search(self.db, "small"), [])
+        self.assertEqual(len(search(self.db, "compass")), 1)
+
+        self.db.cursor.execute("DELETE FROM Quotes WHERE id = ?", (self.quotes[0].id,))
+        self.assertEqual(search(self.db, "territory"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
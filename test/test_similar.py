@@ -0,0 +1,102 @@
+
+# Package imports
+import unittest, tempfile, datetime
+
+# Module imports
+from anthology.journals.book import Book, BookAuthor
+from anthology.journals.session import Quote, Reading, ReadingQuote
+from anthology.journals.similar import quote_index, similar_quotes, similar_books
+from anthology.database.config import DBCfg
+
+EXCERPTS = {
+    "sea": [
+        "The sea was calm and the sailors rowed the boat toward the distant harbor.",
+        "Storms over the sea tossed the boat and the sailors feared the harbor rocks.",
+        ],
+    "stars": [
+        "Astronomers watched distant stars and galaxies through the great telescope.",
+        "The telescope revealed galaxies beyond the nearest stars.",
+        ],
+    "harbor": [
+        "Sailors in the harbor mended their nets beside the calm sea.",
+        ],
+    }
+
+class TestSimilar(unittest.TestCase):
+    """Test the quote similarity index."""
+
+    def setUp(self):
+        self.db = DBCfg(":memory:")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/similar"
+        ReadingQuote.create(self.db)
+        BookAuthor.create(self.db)
+
+        self.books = {}
+        self.quotes = {}
+        start = datetime.datetime(2023, 1, 1)
+        for n, (name, excerpts) in enumerate(EXCERPTS.items()):
+            book = Book(self.db, title=name, publisher="", publishyear="", publishloc="",
+                        edition="", numpages=100, formattype="Book")
+            book.create()
+            book.save()
+            self.books[name] = book
+            reading = Reading(self.db, start_time=start + datetime.timedelta(days=n),
+                              end_time=start + datetime.timedelta(days=n, hours=1),
+                              start_page=1, end_page=10, source_type="Book",
+                              _source_id=book.id, _quotes=[])
+            reading.create()
+            reading.save()
+            self.quotes[name] = []
+            for i, text in enumerate(excerpts):
+                quote = Quote(self.db, excerpt=text, pagenum=i, response="-", sourcetype="Book")
+                quote.create()
+                quote.save()
+                ReadingQuote(self.db).save((reading.id, quote.id))
+                self.quotes[name].append(quote)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_similar_quotes(self):
+        """The closest quotes share the most distinctive words."""
+        sea = self.quotes["sea"][0].id
+        matches = similar_quotes(self.db, sea, k=2, path=self.path)
+        self.assertEqual([q.id for q, _ in matches],
+                         [self.quotes["harbor"][0].id, self.quotes["sea"][1].id])
+        self.assertTrue(all(0 < score <= 1 for _, score in matches))
+
+    def test_similar_books(self):
+        """Books are compared by the quotes highlighted in them."""
+        matches = similar_books(self.db, self.books["sea"].id, path=self.path)
+        self.assertEqual(matches[0][0].id, self.books["harbor"].id)
+        self.assertGreater(matches[0][1], matches[-1][1])
+
+    def test_incremental(self):
+        """New quotes are indexed without rebuilding, and survive reopening."""
+        index = quote_index(self.db, self.path)
+        self.assertEqual(index.ndocs, 5)
+        quote = Quote(self.db, excerpt="Telescope mirrors gather light from faint stars.",
+                      pagenum=9, response="-", sourcetype="Book")
+        quote.save()
+        self.assertEqual(quote_index(self.db, self.path).refresh(self.db), 0)
+        self.assertEqual(index.ndocs, 6)
+        self.assertIn(quote.id, [i for i, _ in index.query("faint telescope stars", k=3)])
+
+        self.db.cursor.execute("DELETE FROM Quotes WHERE id = ?", (quote.id,))
+        quote_index(self.db, self.path)
+        self.assertEqual(index.ndocs, 5)
+        index.compact()
+        self.assertEqual(index.ndocs, 5)
+        self.assertNotIn(quote.id, [i for i, _ in index.query("faint telescope stars")])
+
+    def test_index_per_database(self):
+        """In-memory databases need a path, and don't share a cached index."""
+        with self.assertRaises(ValueError):
+            quote_index(self.db)
+        other = DBCfg(":memory:")
+        self.assertIsNot(quote_index(self.db, self.path), quote_index(other, self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+
+# Package imports
+import unittest, time
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.sync import sync
+from anthology.test.helpers import new_book
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+def names(db : DBCfg) -> list[tuple]:
+    return db.conn.execute(
+        "SELECT firstname, lastname, country FROM Authors ORDER BY firstname").fetchall()
+
+class TestSync(unittest.TestCase):
+    """Test two-way sync between libraries."""
+
+    def setUp(self):
+        self.laptop = DBCfg(":memory:")
+        self.desktop = DBCfg(":memory:")
+        create_all(self.laptop)
+        create_all(self.desktop)
+
+    def test_exchange(self):
+        """New rows and links go both ways, and are not sent back."""
+        # Different IDs for the same rows in each library.
+        Author(self.desktop, firstname="Zadie", lastname="Smith").save()
+        author = Author(self.laptop, firstname="Ursula", lastname="Le Guin")
+        author.save()
+        book = new_book(self.laptop, "The Dispossessed")
+        BookAuthor(self.laptop).save((author.id, book.id))
+        new_book(self.desktop, "White Teeth")
+
+        report = sync(self.laptop, self.desktop)
+        self.assertEqual((report.sent, report.received, report.conflicts), (3, 2, 0))
+        self.assertEqual(names(self.laptop), names(self.desktop))
+        desktop_author = Author.load(self.desktop, "Ursula", "firstname")
+        desktop_book = Book.load(self.desktop, "The Dispossessed", "title")
+        self.assertEqual(BookAuthor.get_creator_ids(desktop_book.id, self.desktop),
+                         [desktop_author.id])
+
+        report = sync(self.desktop, self.laptop)
+        self.assertEqual((report.sent, report.received), (0, 0))
+
+    def test_delta(self):
+        """Only rows changed since the last sync are exchanged."""
+        for i in range(20):
+            Author(self.laptop, firstname=f"Author {i:02}", lastname="").save()
+        sync(self.laptop, self.desktop)
+        author = Author.load(self.desktop, "Author 07", "firstname")
+        author.country = "Peru"
+        author.save()
+        Author.load(self.desktop, "Author 08", "firstname").delete()
+
+        report = sync(self.laptop, self.desktop)
+        self.assertEqual((report.sent, report.received), (0, 2))
+        self.assertEqual(names(self.laptop), names(self.desktop))
+        self.assertEqual(len(names(self.laptop)), 19)
+
+    def test_conflict(self):
+        """When both libraries change a row, the later change wins."""
+        Author(self.laptop, firstname="Italo", lastname="Calvino").save()
+        sync(self.laptop, self.desktop)
+        for db, country in ((self.laptop, "France"), (self.desktop, "Italy")):
+            # The desktop's edit is made later.
+            time.sleep(0.01)
+            author = Author.load(db, "Italo", "firstname")
+            author.country = country
+            author.save()
+
+        report = sync(self.laptop, self.desktop)
+        self.assertEqual(report.conflicts, 1)
+        self.assertEqual(names(self.laptop), [("Italo", "Calvino", "Italy")])
+        self.assertEqual(names(self.desktop), [("Italo", "Calvino", "Italy")])
+
+if __name__ == '__main__':
+    unittest.main()
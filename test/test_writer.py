@@ -0,0 +1,88 @@
+
+# Package imports
+import unittest, tempfile
+
+# Module imports
+from anthology.journals.book import Book, Author, BookAuthor
+from anthology.database.config import DBCfg
+from anthology.database.schema import create_all
+from anthology.database.writer import WriteBehind
+from anthology.test.helpers import new_book
+
+# --------------------------------------------------------------------
+# Helper functions ---------------------------------------------------
+
+class CountingWriter(WriteBehind):
+    """A writer that records the size of each batch it commits."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    def _write(self, db, batch):
+        self.batches.append(len(batch))
+        super()._write(db, batch)
+
+class TestWriter(unittest.TestCase):
+    """Test the write-behind queue."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DBCfg(f"{self.tmp.name}/writer.db")
+        create_all(self.db)
+        self.writer = CountingWriter(self.db, linger=0.05)
+
+    def tearDown(self):
+        self.writer.close()
+        self.db.conn.close()
+        self.tmp.cleanup()
+
+    def test_save_and_link(self):
+        """Queued objects are saved and linked by the IDs they get."""
+        book = new_book(self.db, "Emma", save=False)
+        author = Author(self.db, firstname="Jane", lastname="Austen")
+        saved = self.writer.save(book)
+        self.writer.save(author)
+        linked = self.writer.link(BookAuthor, author, book)
+        self.writer.flush()
+
+        self.assertEqual(saved.result(), book.id)
+        self.assertTrue(linked.result())
+        self.assertIs(book.db, self.db)
+        self.assertEqual(BookAuthor.get_book_author_ids(book.id, self.db), [author.id])
+
+    def test_batches(self):
+        """Writes queued together are committed in one transaction."""
+        self.writer.save(new_book(self.db, "First", save=False))
+        self.writer.flush()
+        futures = [self.writer.save(new_book(self.db, f"Book {i}", save=False)) for i in range(20)]
+        self.writer.flush()
+        self.assertTrue(all(f.done() and not f.exception() for f in futures))
+        self.assertLess(len(self.writer.batches), 10)
+        self.assertEqual(self.db.conn.execute(
+            "SELECT count(*) FROM row_changes WHERE tbl = 'Books'").fetchone(), (21,))
+
+    def test_failure(self):
+        """A failed write is reported without losing the rest of its batch."""
+        self.writer.save(new_book(self.db, "Duplicate", save=False)).result(5)
+        duplicate = new_book(self.db, "Duplicate", save=False)
+        failed = self.writer.save(duplicate)
+        other = self.writer.save(new_book(self.db, "Other", save=False))
+        self.writer.flush()
+        self.assertIsNotNone(failed.exception())
+        self.assertEqual(duplicate.id, 0)
+        self.assertTrue(other.result())
+
+    def test_close(self):
+        """Closing commits everything queued, then refuses new writes."""
+        book = new_book(self.db, "Persuasion", save=False)
+        future = self.writer.save(book)
+        self.writer.close()
+        self.assertTrue(future.done())
+        self.assertEqual(Book.load_column(self.db, "title"), ["Persuasion"])
+        with self.assertRaises(RuntimeError):
+            self.writer.save(new_book(self.db, "Late", save=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,8 +13,9 @@ from typing import Any
 
 # Module imports
 from ...journals.book import Author, Book, BookAuthor
+from ...database.writer import WriteBehind
 from ..widgets.entry import EntryForm, EntryList
-from ..widgets.common import SaveButton, LabelInput
+from ..widgets.common import SaveButton, LabelInput, Saved, SaveFailed, post_write_result
 
 class AuthorEntry(Static):
     """A widget for entering author info."""
@@ -30,16 +31,23 @@ class AuthorEntry(Static):
         yield EntryList(
             title="Author",
             params=list(Author.lut_aliases()),
-            selection=[(author, author) for author in Author.list_all(self._db)]
+            selection=Author.list_display(self._db),
+            table=Author,
+            db=self._db
         )
 
 class BookEntry(Static):
-    """A widget for entering book info."""
+    """A widget for entering book info.
+    
+    Saves are queued on the writer, so the UI never waits on the disk.
+    """
     
     _db: Any
+    _writer: WriteBehind
     
-    def __init__(self, db:Any):
+    def __init__(self, db:Any, writer:WriteBehind):
         self._db = db
+        self._writer = writer
         super().__init__(
             classes="hor-border")
         
@@ -90,10 +98,7 @@ class BookEntry(Static):
             timesread=int(book_params["TimesRead"]),
             rating=float(book_params["Rating"])
         )
-        new_book.create()
-        book_id = new_book.save()
-        
-        print(new_book, new_book.id)
+        post_write_result(self, self._writer.save(new_book), new_book)
         
         for author in authors:
             new_author = Author(
@@ -102,9 +107,15 @@ class BookEntry(Static):
                 midname=author["MiddleName"],
                 lastname=author["LastName"],
                 gender=author["Gender"],
-                country=["Country"]
+                country=author["Country"]
             )
-            new_author.create()
             author["Author"] = new_author
-            author["ID"] = new_author.save()
-            BookAuthor(self._db).save((new_author.id, new_book.id))
\ No newline at end of file
+            post_write_result(self, self._writer.save(new_author), new_author)
+            self._writer.link(BookAuthor, new_author, new_book)
+
+    def on_saved(self, message: Saved) -> None:
+        self.notify(f"Saved {message.obj.__class__.__name__} {message.obj.id}")
+
+    def on_save_failed(self, message: SaveFailed) -> None:
+        self.notify(f"Could not save {message.obj.__class__.__name__}: {message.error}",
+                    severity="error")
@@ -0,0 +1,188 @@
+"""
+Reading Entry
+
+A screen for recording a reading session as it happens.
+
+"""
+
+# Package imports
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Horizontal, Vertical
+from textual.screen import Screen
+from textual.widgets import Button, Footer, Input, Label, Select, Static
+from typing import Any
+import sqlite3
+
+# Module imports
+from ...journals.book import Book
+from ...journals.live import LiveReading, Checkpointer
+from ..widgets.common import LabelInput
+
+class ReadingEntry(Static):
+    """A widget for timing a reading session and capturing its quotes.
+
+    Progress is checkpointed on a coalescing schedule as the session
+    runs, and the session is saved in one transaction when stopped. An
+    unfinished session left by a crash is resumed, paused.
+    """
+
+    _db: Any
+    _live: LiveReading | None
+    _checkpointer: Checkpointer | None
+
+    def __init__(self, db:Any):
+        self._db = db
+        self._live = None
+        self._checkpointer = None
+        super().__init__(
+            classes="hor-border")
+
+    def compose(self) -> ComposeResult:
+        yield Label("00:00:00", id="reading_timer", classes="common--title")
+        yield Select(Book.list_display(self._db), prompt="Book", id="reading_book")
+        with Vertical(classes="common--entryform"):
+            yield LabelInput(label="Start Page", id="reading_start")
+            yield LabelInput(label="Page", id="reading_page")
+            yield LabelInput(label="Quote", id="reading_excerpt")
+            yield LabelInput(label="Response", id="reading_response")
+        yield Label("No quotes", id="reading_quotes")
+        with Horizontal(classes="common--button-row"):
+            yield Button("Add Quote", id="reading_quote", classes="common--button")
+            yield Button("Start", id="reading_toggle")
+            yield Button("Stop", id="reading_stop")
+
+    def on_mount(self) -> None:
+        live = LiveReading.recover(self._db)
+        if live:
+            self._resume(live)
+            self.notify("Resumed an unfinished reading session.")
+        self.set_interval(1.0, self._tick)
+
+    def _resume(self, live:LiveReading) -> None:
+        self._live = live
+        self._checkpointer = Checkpointer(self._db, live)
+        self.query_one("#reading_book", Select).value = live.source_id
+        self.query_one("#reading_start", Input).value = str(live.start_page)
+        self.query_one("#reading_page", Input).value = str(live.page)
+        self._update()
+
+    def _tick(self) -> None:
+        """Show the time read, and checkpoint if one is due."""
+        if self._live is None:
+            return
+        secs = int(self._live.seconds())
+        self.query_one("#reading_timer", Label).update(
+            f"{secs // 3600:02}:{secs % 3600 // 60:02}:{secs % 60:02}")
+        self._checkpointer.flush()
+
+    def _update(self) -> None:
+        running = self._live is not None and self._live.running
+        self.query_one("#reading_toggle", Button).label = "Pause" if running else "Start"
+        quotes = self._live.quotes if self._live else []
+        self.query_one("#reading_quotes", Label).update(
+            f"{len(quotes)} quote{'s'[:len(quotes)^1]}, last: {quotes[-1].excerpt[:60]}"
+            if quotes else "No quotes")
+        self._tick()
+
+    def _page(self, id:str) -> int:
+        try:
+            return int(self.query_one(f"#{id}", Input).value)
+        except ValueError:
+            return 0
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if self._live is None:
+            return
+        if event.input.id == "reading_page":
+            self._live.page = self._page("reading_page")
+        elif event.input.id == "reading_start":
+            self._live.start_page = self._page("reading_start")
+        else:
+            return
+        # Only marked; the next tick writes it if a checkpoint is due.
+        self._checkpointer.touch()
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "reading_toggle":
+            self.toggle()
+        elif event.button.id == "reading_quote":
+            self.capture_quote()
+        elif event.button.id == "reading_stop":
+            self.stop()
+
+    def toggle(self) -> None:
+        """Start, pause or resume the timer."""
+        if self._live is None:
+            book = self.query_one("#reading_book", Select).value
+            if book == Select.BLANK:
+                self.notify("Choose a book to read first.", severity="warning")
+                return
+            start = self._page("reading_start")
+            self._live = LiveReading(book, start_page=start,
+                                     page=self._page("reading_page") or start)
+            self._checkpointer = Checkpointer(self._db, self._live)
+        if self._live.running:
+            self._live.pause()
+        else:
+            self._live.start()
+        self._checkpointer.touch()
+        self._update()
+
+    def capture_quote(self) -> None:
+        """Add the quote typed in to the session."""
+        excerpt = self.query_one("#reading_excerpt", Input)
+        response = self.query_one("#reading_response", Input)
+        if self._live is None or not excerpt.value.strip():
+            return
+        self._live.add_quote(excerpt.value.strip(), response=response.value.strip())
+        excerpt.value = response.value = ""
+        self._checkpointer.touch()
+        self._update()
+
+    def stop(self) -> None:
+        """Save the session, its quotes and their links together."""
+        if self._live is None:
+            return
+        try:
+            reading = self._live.finish(self._db)
+        except sqlite3.Error as e:
+            self.notify(f"Could not save the reading session: {e}", severity="error")
+            return
+        self.notify(f"Saved Reading {reading.id}: {reading.duration}, "
+                    f"{reading.num_pages_read} pages, {len(self._live.quotes)} quotes")
+        self._live = self._checkpointer = None
+        for id in ("reading_start", "reading_page"):
+            self.query_one(f"#{id}", Input).value = ""
+        self.query_one("#reading_timer", Label).update("00:00:00")
+        self._update()
+
+    def on_unmount(self) -> None:
+        # Keep the latest state of a session closed without stopping it.
+        if self._checkpointer:
+            self._checkpointer.flush(force=True)
+
+class ReadingScreen(Screen):
+    """A screen for recording a reading session."""
+
+    BINDINGS = [
+        Binding("ctrl+t", "toggle", "Start/Pause"),
+        Binding("ctrl+s", "stop", "Stop & save"),
+        Binding("escape", "app.pop_screen", "Close"),
+        ]
+
+    _db: Any
+
+    def __init__(self, db:Any):
+        self._db = db
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield ReadingEntry(self._db)
+        yield Footer()
+
+    def action_toggle(self) -> None:
+        self.query_one(ReadingEntry).toggle()
+
+    def action_stop(self) -> None:
+        self.query_one(ReadingEntry).stop()
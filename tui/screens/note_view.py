@@ -0,0 +1,62 @@
+"""
+Note View
+
+A screen for reading a note.
+
+"""
+
+# Package imports
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.screen import Screen
+from textual.widgets import Footer, Markdown, Static
+from typing import Any
+
+# Module imports
+from ...journals.session import Note
+
+class NoteView(Static):
+    """A widget showing a note's Markdown.
+
+    The note is read and rendered a batch of chunks at a time, so the
+    start of a large note shows while the rest is still loading.
+    """
+
+    _note: Note
+
+    def __init__(self, note:Note):
+        self._note = note
+        super().__init__(
+            classes="hor-border")
+
+    def compose(self) -> ComposeResult:
+        yield Markdown()
+
+    def on_mount(self) -> None:
+        self.border_title = self._note.title
+        self.run_worker(self._stream, exclusive=True, group="note")
+
+    async def _stream(self) -> None:
+        stream = Markdown.get_stream(self.query_one(Markdown))
+        try:
+            for text in self._note.stream():
+                await stream.write(text)
+        finally:
+            await stream.stop()
+
+class NoteScreen(Screen):
+    """A screen for reading a note."""
+
+    BINDINGS = [
+        Binding("escape", "app.pop_screen", "Close"),
+        ]
+
+    _note: Note
+
+    def __init__(self, note:Note):
+        self._note = note
+        super().__init__()
+
+    def compose(self) -> ComposeResult:
+        yield NoteView(self._note)
+        yield Footer()
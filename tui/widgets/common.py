@@ -53,3 +53,36 @@ class SaveButton(Button):
             label="Save",
             classes="common--button"
         )
+
+class Saved(Message):
+    """Posted when a queued write has been committed."""
+    
+    def __init__(self, obj) -> None:
+        self.obj = obj
+        super().__init__()
+
+class SaveFailed(Message):
+    """Posted when a queued write could not be committed."""
+    
+    def __init__(self, obj, error: BaseException) -> None:
+        self.obj = obj
+        self.error = error
+        super().__init__()
+
+def post_write_result(widget, future, obj) -> None:
+    """Post Saved or SaveFailed to a widget once a queued write is done.
+    
+    The writer thread resolves the future, and post_message is thread
+    safe, so the widget handles the result on its own event loop.
+    """
+    def done(f) -> None:
+        error = f.exception()
+        widget.post_message(SaveFailed(obj, error) if error else Saved(obj))
+    future.add_done_callback(done)
+
+class TableChanged(Message):
+    """Posted when a committed change to a followed table is published."""
+    
+    def __init__(self, change) -> None:
+        self.change = change
+        super().__init__()
@@ -8,14 +8,15 @@ Text input classes and functions.
 # Package imports
 from __future__ import annotations
 from dataclasses import field
-from typing import List
+from typing import Any, List
 from textual import on
 from textual.app import ComposeResult
 from textual.containers import Horizontal, Vertical, ScrollableContainer
 from textual.widgets import Static, Button, Select
 
 # Module imports
-from .common import AddButton, SubButton, SaveButton, LabelInput
+from ...database.events import bus, Change, DELETE
+from .common import AddButton, SubButton, SaveButton, LabelInput, TableChanged
 
 class EntryForm(Static):
     """Custom widget to edit and store multiple parameters."""
@@ -82,6 +83,15 @@ class EntryRow(Static):
                 if self._pos > 0:
                     yield self._sub
 
+    def set_selection(self, selection: list) -> None:
+        """Replace the options of the select, keeping the current choice."""
+        self._selection = selection
+        if hasattr(self, "_select"):
+            value = self._select.value
+            self._select.set_options(selection)
+            if any(v == value for _, v in selection):
+                self._select.value = value
+
     @on(Select.Changed)
     def select_changed(self, event: Select.Changed) -> None:
         entryform = self.query_one("EntryForm")
@@ -91,7 +101,12 @@ class EntryRow(Static):
             entryform.display = False
 
 class EntryList(ScrollableContainer):
-    """A vertical container for holding entry rows."""
+    """A vertical container for holding entry rows.
+    
+    Given a table, the selection holds (label, ID) pairs of its rows. It
+    follows the data layer's change feed and patches only the changed
+    options, without querying the whole table again.
+    """
 
     # Title of the entry section
     _title: str
@@ -102,10 +117,19 @@ class EntryList(ScrollableContainer):
     _rows: List = field(default_factory=EntryRow)
     _row_id: int
 
-    def __init__(self, title: str, params: list, selection: list(tuple)):
+    # Followed table
+    _table: Any
+    _db: Any
+    _unsubscribe: Any
+
+    def __init__(self, title: str, params: list, selection: list(tuple),
+                 table: Any = None, db: Any = None):
         self._title = title
         self._params = params
         self._selection = selection
+        self._table = table
+        self._db = db
+        self._unsubscribe = None
         self._row_id = 0
         self._rows = [EntryRow(self._params, self._selection, self._title, self._row_id)]
         super().__init__(
@@ -114,6 +138,32 @@ class EntryList(ScrollableContainer):
 
     def on_mount(self) -> None:
         self._update_title()
+        if self._table is not None:
+            self._unsubscribe = bus.subscribe(
+                lambda change: self.post_message(TableChanged(change)), [self._table])
+
+    def on_unmount(self) -> None:
+        if self._unsubscribe:
+            self._unsubscribe()
+
+    def on_table_changed(self, message: TableChanged) -> None:
+        """Patch the option of the changed row in every entry row."""
+        message.stop()
+        self.apply_change(message.change)
+
+    def apply_change(self, change: Change) -> None:
+        """Add, relabel or remove the option of one changed row."""
+        selection = [(label, i) for label, i in self._selection if i != change.id]
+        if change.op != DELETE:
+            obj = self._table.load(self._db, change.id)
+            if obj:
+                # Keep an updated row's place in the list.
+                pos = next((n for n, (_, i) in enumerate(self._selection)
+                            if i == change.id), len(selection))
+                selection.insert(pos, (str(obj), change.id))
+        self._selection = selection
+        for row in self._rows:
+            row.set_selection(selection)
 
     def compose(self) -> ComposeResult:
         for r in self._rows: